@@ -0,0 +1,105 @@
+"""Country routing table
+
+The table lives in a JSON data file (`settings.COUNTRIES_FILE`, by default
+`app/countries.json`): one row per country with its calling code, the
+allowed lengths of national numbers and an optional preferred provider.
+It is loaded on first use and compiled once into a `CountryIndex`:
+
+- country -> `CountryRule` and country -> international prefix (`"0048"`);
+- country -> range of valid number lengths, so checks are O(1);
+- a digit trie of calling codes for prefix -> country lookups.
+"""
+import json
+from collections import namedtuple
+from functools import lru_cache
+from types import MappingProxyType
+
+from app import settings
+
+
+class CountryRule(namedtuple("CountryRule", "country calling_code min_length max_length preferred_provider")):
+    """Routing rule of one country"""
+    __slots__ = ()
+
+    @property
+    def prefix(self):
+        """International prefix prepended to national numbers"""
+        return "00" + self.calling_code
+
+    @property
+    def lengths(self):
+        """Range of valid national number lengths"""
+        return range(self.min_length, self.max_length + 1)
+
+
+class CountryIndex:
+    """Compiled lookups over a list of `CountryRule`s"""
+
+    def __init__(self, rules):
+        self.rules = MappingProxyType({rule.country: rule for rule in rules})
+        self.prefixes = MappingProxyType({rule.country: rule.prefix for rule in rules})
+        self.lengths = MappingProxyType({rule.country: rule.lengths for rule in rules})
+        self._trie = {}
+        for rule in rules:
+            node = self._trie
+            for digit in rule.calling_code:
+                node = node.setdefault(digit, {})
+            # calling codes shared by several countries (e.g. "1") keep the first one
+            node.setdefault(None, rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def __contains__(self, country):
+        return country in self.rules
+
+    def rule(self, country):
+        """Return the rule of a country, None when it is unknown"""
+        return self.rules.get(country)
+
+    def valid_length(self, country, phone_number):
+        """Check the length of a national number"""
+        lengths = self.lengths.get(country)
+        return lengths is not None and len(phone_number) in lengths
+
+    def match(self, number):
+        """Return the rule of the longest calling code an international number starts with
+
+        `number` may start with `00` or `+`; None is returned when no calling code matches.
+        """
+        number = str(number)
+        if number.startswith("+"):
+            number = number[1:]
+        elif number.startswith("00"):
+            number = number[2:]
+        node, found = self._trie, None
+        for digit in number:
+            node = node.get(digit)
+            if node is None:
+                break
+            found = node.get(None, found)
+        return found
+
+    def split(self, number):
+        """Split an international number into (country, national number), None when no country matches"""
+        rule = self.match(number)
+        if rule is None:
+            return None
+        digits = str(number).lstrip("+")
+        if digits.startswith("00"):
+            digits = digits[2:]
+        return rule.country, digits[len(rule.calling_code):]
+
+
+def load_rules(path):
+    """Read the rules of a data file"""
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    columns = data.get("columns", CountryRule._fields)
+    return [CountryRule(**dict(zip(columns, row))) for row in data["countries"]]
+
+
+@lru_cache(maxsize=None)
+def country_index(path=None):
+    """Return the memoized index of a data file (default `settings.COUNTRIES_FILE`)"""
+    return CountryIndex(load_rules(path or settings.COUNTRIES_FILE))
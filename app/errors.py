@@ -1,3 +1,6 @@
+import enum
+
+
 class BaseError(Exception):
     """Base exception class"""
     pass
@@ -27,3 +30,66 @@ class RecipientNotSet(BaseError):
     """Recipient not set exception"""
     pass
 
+
+class TransportError(BaseError):
+    """Transport (network) error exception"""
+    pass
+
+
+class UnknownTenant(BaseError):
+    """Unknown tenant exception"""
+    pass
+
+
+class QuotaExceeded(BaseError):
+    """Quota exceeded exception"""
+    pass
+
+
+class RecipientSuppressed(BaseError):
+    """Recipient opted out exception"""
+    pass
+
+
+class Overloaded(BaseError):
+    """Message not admitted (or shed) under overload exception"""
+    pass
+
+
+class ValidationCode(enum.IntEnum):
+    """Result codes of the non-raising validation API
+
+    Members are singletons, so checking a result is a plain comparison and
+    nothing is allocated on failure. `OK` is the only falsy member.
+    """
+    OK = 0
+    INVALID_COUNTRY = 1
+    INVALID_PHONE_NUMBER = 2
+    INVALID_CONTENT_LENGTH = 3
+    CONTENT_NOT_SET = 4
+    RECIPIENT_NOT_SET = 5
+
+    @property
+    def exception(self):
+        """Exception class raised by the raising API for this code"""
+        return _EXCEPTIONS[self][0]
+
+    @property
+    def message(self):
+        """Message of the exception raised by the raising API"""
+        return _EXCEPTIONS[self][1]
+
+    def raise_for(self):
+        """Raise the matching exception unless the code is OK"""
+        if self:
+            raise _EXCEPTIONS[self][0](_EXCEPTIONS[self][1])
+
+
+_EXCEPTIONS = {
+    ValidationCode.OK: (None, None),
+    ValidationCode.INVALID_COUNTRY: (InvalidCountryException, "Invalid country code"),
+    ValidationCode.INVALID_PHONE_NUMBER: (InvalidPhoneNumber, "Invalid phone number"),
+    ValidationCode.INVALID_CONTENT_LENGTH: (InvalidContentLength, "Invalid content length"),
+    ValidationCode.CONTENT_NOT_SET: (ContentNotSet, "Content not set"),
+    ValidationCode.RECIPIENT_NOT_SET: (RecipientNotSet, "Recipient not set"),
+}
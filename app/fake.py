@@ -1,6 +1,3 @@
-import uuid
-
-
 def fake_primary_external_api(message):
     """Mock the primary API"""
     result = {"api": "1"}
@@ -16,17 +13,36 @@ def fake_primary_external_api(message):
     return result
 
 
-def fake_secondary_external_api(message):
-    """Mock the secondary API"""
+def fake_secondary_external_api(message, id_generator=None):
+    """Mock the secondary API
+
+    The message ID comes from `id_generator` (see `app.ids`) when given,
+    otherwise it is a random `uuid.UUID` like the real API returns.
+    """
     result = {"api": "2"}
     if message["auth_key"] != "bob":
         result["status"] = "403"
     else:
         result.update(
             {
-                "id": uuid.uuid4(),
+                "id": id_generator() if id_generator is not None else _uuid4(),
                 "status": "OK",
             }
         )
     return result
 
+
+def fake_primary_external_api_batch(messages):
+    """Mock the batch endpoint of the primary API - one result per message, in order"""
+    return [fake_primary_external_api(message) for message in messages]
+
+
+def fake_secondary_external_api_batch(messages, id_generator=None):
+    """Mock the batch endpoint of the secondary API - one result per message, in order"""
+    return [fake_secondary_external_api(message, id_generator) for message in messages]
+
+
+def _uuid4():
+    """Return a random UUID - `uuid` is imported lazily, only the secondary API needs it"""
+    import uuid
+    return uuid.uuid4()
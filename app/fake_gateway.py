@@ -0,0 +1,224 @@
+"""Local stand-in HTTP gateway for the external SMS APIs
+
+Serves the semantics of `fake_primary_external_api` and
+`fake_secondary_external_api` over HTTP so the providers can be load-tested
+with real connections:
+
+    POST /primary          - JSON payload of `PrimarySmsApiProvider`
+    POST /secondary        - JSON payload of `SecondarySmsApiProvider`
+    POST /primary/batch    - JSON list of primary payloads
+    POST /secondary/batch  - JSON list of secondary payloads
+
+Latency, error rate and rate limit are configurable. Run it standalone with
+`python -m app.fake_gateway --port 8025`.
+"""
+import argparse
+import json
+import math
+import random
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from app.fake import (
+    fake_primary_external_api,
+    fake_primary_external_api_batch,
+    fake_secondary_external_api,
+    fake_secondary_external_api_batch,
+)
+
+APIS = {
+    "/primary": fake_primary_external_api,
+    "/secondary": fake_secondary_external_api,
+    "/primary/batch": fake_primary_external_api_batch,
+    "/secondary/batch": fake_secondary_external_api_batch,
+}
+
+
+def constant(seconds):
+    """Latency distribution always returning `seconds`"""
+    return lambda: seconds
+
+
+def uniform(low, high):
+    """Latency distribution uniform between `low` and `high` seconds"""
+    return lambda: random.uniform(low, high)
+
+
+def lognormal(median, sigma):
+    """Log-normal latency distribution with the given median (seconds)"""
+    mu = math.log(median)
+    return lambda: random.lognormvariate(mu, sigma)
+
+
+def pareto(scale, alpha):
+    """Heavy-tailed Pareto latency distribution, `scale` is the minimum (seconds)"""
+    return lambda: scale * random.paretovariate(alpha)
+
+
+LATENCIES = {
+    "constant": constant,
+    "uniform": uniform,
+    "lognormal": lognormal,
+    "pareto": pareto,
+}
+
+
+class TokenBucket:
+    """Thread-safe token bucket rate limiter"""
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Take a token, return False when the bucket is empty"""
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
+
+
+class _Server(ThreadingHTTPServer):
+    """Threading HTTP server accepting many concurrent connections"""
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def handle_error(self, request, client_address):
+        """Clients giving up (timeouts in load tests) are expected - report anything else"""
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """Request handler - the gateway instance is available as `self.server.gateway`"""
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately - avoid the Nagle/delayed ACK stall
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        """Handle a single API call"""
+        gateway = self.server.gateway
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        status, response = gateway.handle(self.path, body)
+        data = json.dumps(response, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):  # pylint: disable=redefined-builtin
+        """Keep the console quiet under load"""
+
+
+class FakeGateway:
+    """HTTP gateway serving the fake external APIs"""
+
+    def __init__(self, host="127.0.0.1", port=0, latency=None, error_rate=0.0, rate_limit=None, seed=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.limiter = TokenBucket(rate_limit) if rate_limit else None
+        self.stats = {"requests": 0, "errors": 0, "throttled": 0}
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = _Server((host, port), _Handler)
+        self._server.gateway = self
+        self._thread = None
+
+    @property
+    def url(self):
+        """Base URL of the running gateway"""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    def handle(self, path, body):
+        """Return (HTTP status, response dict) for a request"""
+        self._count("requests")
+        api = APIS.get(path)
+        if api is None:
+            return 404, {"status": "404"}
+        if self.limiter is not None and not self.limiter.acquire():
+            self._count("throttled")
+            return 429, {"status": "429"}
+        if self.latency is not None:
+            time.sleep(self.latency())
+        if self.error_rate and self._random.random() < self.error_rate:
+            self._count("errors")
+            return 500, {"status": "500"}
+        try:
+            message = json.loads(body)
+            return 200, api(message)
+        except (ValueError, KeyError, TypeError):
+            return 400, {"status": "400"}
+
+    def serve_forever(self):
+        """Serve requests in the current thread until `stop()` is called"""
+        self._server.serve_forever()
+
+    def start(self):
+        """Serve requests in a background thread and return the base URL"""
+        self._thread = threading.Thread(target=self._server.serve_forever, args=(0.05,), daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """Stop serving and close the socket"""
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def parse_latency(spec):
+    """Parse a latency spec like `constant:0.01` or `lognormal:0.02,0.5`"""
+    if not spec:
+        return None
+    name, _, params = spec.partition(":")
+    try:
+        factory = LATENCIES[name]
+    except KeyError:
+        raise ValueError(f"Unknown latency distribution: {name}") from None
+    return factory(*(float(value) for value in params.split(",") if value))
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Run the fake SMS gateway")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8025)
+    parser.add_argument("--latency", help="e.g. constant:0.01, uniform:0.005,0.02, lognormal:0.02,0.5, pareto:0.01,2")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests failing with 500")
+    parser.add_argument("--rate-limit", type=float, help="Requests per second before 429 responses")
+    args = parser.parse_args()
+
+    gateway = FakeGateway(args.host, args.port, parse_latency(args.latency), args.error_rate, args.rate_limit)
+    print(f"Fake SMS gateway listening on {gateway.url}")
+    try:
+        gateway.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""Message ID generators
+
+Generating an ID with `uuid.uuid4()` costs an `os.urandom` syscall per message.
+The generators below are monotonic, draw randomness in batches, and are safe
+to share between threads. After `fork()` a child resets their state, so it
+never repeats the IDs of its parent.
+"""
+import abc
+import os
+import threading
+import time
+import uuid
+import weakref
+
+_CROCKFORD = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# Crockford base32 encodings of all 10-bit values, two characters each
+_CROCKFORD_PAIRS = [high + low for high in _CROCKFORD for low in _CROCKFORD]
+
+
+# generators to reset in forked children, not kept alive by the registration
+_GENERATORS = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    """Call `_reset()` of every live generator - runs in forked children"""
+    for generator in list(_GENERATORS):
+        generator._reset()  # pylint: disable=protected-access
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _encode_pairs(value, pairs):
+    """Encode `value` as `2 * pairs` Crockford base32 characters"""
+    table = _CROCKFORD_PAIRS
+    return "".join([table[(value >> shift) & 1023] for shift in range(10 * pairs - 10, -10, -10)])
+
+
+class IdGenerator(metaclass=abc.ABCMeta):
+    """Base ID generator class"""
+
+    @abc.abstractmethod
+    def new_id(self):
+        """Return a new unique ID"""
+        pass
+
+    def __call__(self):
+        return self.new_id()
+
+
+class UuidGenerator(IdGenerator):
+    """Random UUID4 generator - the behaviour of the external APIs"""
+
+    def new_id(self):
+        """Return a new `uuid.UUID`"""
+        return uuid.uuid4()
+
+
+class UlidGenerator(IdGenerator):
+    """Monotonic ULID generator
+
+    IDs are 26-character Crockford base32 strings: a 48-bit millisecond timestamp
+    followed by 80 random bits. Within one millisecond the random part is
+    incremented, so IDs sort in generation order. Randomness is read from
+    `os.urandom` in batches of `batch_size` IDs.
+    """
+    RANDOM_BITS = 80
+
+    def __init__(self, batch_size=256, clock=time.time_ns):
+        self._batch_size = batch_size
+        self._clock = clock
+        self._reset()
+        _GENERATORS.add(self)
+
+    def _reset(self):
+        """Forget all state - called after fork so a child never repeats the parent's IDs"""
+        self._lock = threading.Lock()
+        self._pool, self._offset = b"", 0
+        self._last_ms, self._last_random = -1, 0
+        self._prefix = (-1, "")
+
+    def _random(self):
+        """Return the next 80 random bits from the pool"""
+        if self._offset >= len(self._pool):
+            self._pool, self._offset = os.urandom(10 * self._batch_size), 0
+        start, self._offset = self._offset, self._offset + 10
+        return int.from_bytes(self._pool[start:self._offset], "big")
+
+    def new_int(self):
+        """Return a new ULID as a 128-bit integer"""
+        now_ms = self._clock() // 1_000_000
+        with self._lock:
+            if now_ms <= self._last_ms:
+                # same millisecond (or the clock went back) - keep the order
+                now_ms = self._last_ms
+                random = self._last_random + 1
+                if random >> self.RANDOM_BITS:
+                    now_ms, random = now_ms + 1, self._random()
+            else:
+                random = self._random()
+            self._last_ms, self._last_random = now_ms, random
+        return (now_ms << self.RANDOM_BITS) | random
+
+    def new_id(self):
+        """Return a new ULID string"""
+        value = self.new_int()
+        now_ms = value >> self.RANDOM_BITS
+        prefix_ms, prefix = self._prefix
+        if prefix_ms != now_ms:
+            # the 10 timestamp characters change at most once per millisecond
+            prefix = _encode_pairs(now_ms, 5)
+            self._prefix = (now_ms, prefix)
+        table = _CROCKFORD_PAIRS
+        high, low = (value >> 40) & 0xFF_FFFF_FFFF, value & 0xFF_FFFF_FFFF
+        return "".join((
+            prefix,
+            table[high >> 30], table[(high >> 20) & 1023], table[(high >> 10) & 1023], table[high & 1023],
+            table[low >> 30], table[(low >> 20) & 1023], table[(low >> 10) & 1023], table[low & 1023],
+        ))
+
+
+class SnowflakeGenerator(IdGenerator):
+    """Snowflake-style 63-bit integer ID generator
+
+    Layout: 41-bit milliseconds since `epoch_ms`, 10-bit worker ID, 12-bit sequence.
+    IDs are unique only while no two processes share a worker ID, so it has to
+    come from the deployment: an int, or a callable returning the worker ID of
+    the current process (e.g. read from the environment or a lease), which is
+    called again in forked children. A child forked from a generator with an
+    int worker ID refuses to generate IDs rather than repeat its parent's.
+    """
+    WORKER_BITS, SEQUENCE_BITS = 10, 12
+    EPOCH_MS = 1_577_836_800_000  # 2020-01-01T00:00:00Z
+
+    def __init__(self, worker_id, epoch_ms=EPOCH_MS, clock=time.time_ns):
+        self._worker_id = worker_id
+        self._epoch_ms = epoch_ms
+        self._clock = clock
+        self._pid = os.getpid()
+        self._reset()
+        _GENERATORS.add(self)
+
+    def _reset(self):
+        """Reset the sequence and pick the worker ID of the current process"""
+        self._lock = threading.Lock()
+        self._last_ms, self._sequence = -1, 0
+        self.worker_id = None
+        if callable(self._worker_id):
+            worker_id = self._worker_id()
+        elif os.getpid() == self._pid:
+            worker_id = self._worker_id
+        else:
+            return
+        if not 0 <= worker_id < 1 << self.WORKER_BITS:
+            raise ValueError("worker_id out of range")
+        self.worker_id = worker_id
+
+    def new_id(self):
+        """Return a new snowflake ID"""
+        if self.worker_id is None:
+            raise RuntimeError("SnowflakeGenerator forked with a fixed worker_id - pass a callable worker_id")
+        with self._lock:
+            now_ms = self._clock() // 1_000_000 - self._epoch_ms
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                self._sequence = (self._sequence + 1) & ((1 << self.SEQUENCE_BITS) - 1)
+                if self._sequence == 0:
+                    # sequence exhausted - borrow the next millisecond
+                    now_ms += 1
+            else:
+                self._sequence = 0
+            self._last_ms = now_ms
+            return (
+                (now_ms << (self.WORKER_BITS + self.SEQUENCE_BITS))
+                | (self.worker_id << self.SEQUENCE_BITS)
+                | self._sequence
+            )
@@ -1,11 +1,65 @@
 """New SMS module"""
-from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new import providers
 
+# Registry of API names to provider class names in `app.new.providers`.
+# Classes are resolved on demand, so only the requested provider module is imported.
+PROVIDERS = {
+    "primary": "PrimarySmsApiProvider",
+    "secondary": "SecondarySmsApiProvider",
+}
 
-def sms_factory(api):
-    """Implement a factory that creates appropriate objects based on the `api` argument. When `api` is unknown, throw NotImplementedError exception."""
-    #
-    # @TODO: Implement it
-    #
-    return
 
+def sms_factory(api, tenant=None, scoped=False):
+    """Implement a factory that creates appropriate objects based on the `api` argument. When `api` is unknown, throw NotImplementedError exception.
+
+    With `tenant`, the provider is bound to that tenant's configuration in `app.new.tenants.TENANTS`.
+    With `scoped`, the instance of the current thread's (or `provider_context()`'s) context
+    in `app.new.contexts` is returned instead of a new one.
+    """
+    if scoped:
+        from app.new.contexts import current_context
+        return current_context().provider(api, tenant)
+    if tenant is not None:
+        from app.new.tenants import TENANTS
+        return TENANTS.provider_class(tenant, api)()
+    try:
+        class_name = PROVIDERS[api]
+    except (KeyError, TypeError):
+        raise NotImplementedError(f"Unknown SMS API: {api!r}") from None
+    return getattr(providers, class_name)()
+
+
+def sms_route(phone_number, content, country_code="PL", preference=None):
+    """Return a provider ready to send the message, or None when no provider accepts it
+
+    Providers are tried in `preference` order; by default the preferred provider
+    of the country in `app.countries` comes first, then registry order. The
+    message is checked once against all providers with `app.new.rules`, so
+    nothing is raised for invalid messages and no validator runs twice.
+    """
+    from app.new.rules import rule_matrix
+    matrix = rule_matrix()
+    mask = matrix.eligible(phone_number, content, country_code)
+    if not mask:
+        return None
+    if not preference:
+        from app.countries import country_index
+        rule = country_index().rule(country_code)
+        preference = matrix.names
+        if rule is not None and rule.preferred_provider in preference:
+            preference = (rule.preferred_provider,) + preference
+    for api in preference:
+        bit = matrix.bits.get(api, 0)
+        if mask & bit:
+            provider = getattr(providers, PROVIDERS[api])()
+            provider.recipient = provider.COUNTRY_CODES[country_code] + str(phone_number)
+            provider.content = content
+            return provider
+    return None
+
+
+def __getattr__(name):
+    """Keep `from app.new import PrimarySmsApiProvider` working without eager imports"""
+    if name in providers.__all__:
+        return getattr(providers, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,258 @@
+"""Quota and spend accounting
+
+Counters are striped per thread: each thread updates its own stripe without
+locking and readers merge the stripes. Quotas hand out leases - a thread
+takes a block of units from the shared pool under a lock and then reserves
+from its lease lock-free, so the lock is taken once per block rather than
+once per message. Leases shrink as the pool runs low, which keeps the
+quota exact to within a few units per thread.
+
+Quotas are enforced per process: an `Accountant` is not shared between
+processes, so with several sender processes each needs its own share of
+the limits (or all sends of a tenant must go through one process).
+"""
+import threading
+import time
+
+from app import errors
+
+
+class Quota:
+    """Limit of one tenant for one day, handed out to threads in leases"""
+
+    def __init__(self, limit, lease_size=64):
+        self.limit = limit
+        self.lease_size = lease_size
+        self._available = limit
+        self._lock = threading.Lock()
+
+    def grant(self, needed):
+        """Take a lease of at least `needed` units from the pool, return its size or 0"""
+        with self._lock:
+            # a smaller lease when the pool runs low - unused leases are stranded quota
+            grant = min(self._available, max(needed, min(self.lease_size, self._available // 8)))
+            if grant < needed:
+                return 0
+            self._available -= grant
+            return grant
+
+    def give_back(self, units):
+        """Return unused leased units to the pool"""
+        with self._lock:
+            self._available += units
+
+
+class _Stripe:
+    """Per-thread accounting state of one (tenant, API) pair for one day"""
+    __slots__ = (
+        "owner", "retired", "tenant", "api", "day", "messages", "segments", "price",
+        "message_lease", "segment_lease", "used_messages", "used_segments", "sent", "sent_segments", "spend",
+    )
+
+    def __init__(self, tenant, api, day, messages, segments, price):
+        self.owner = threading.current_thread()
+        self.retired = False  # replaced by the stripe of a later day, never touched by its owner again
+        self.tenant, self.api, self.day = tenant, api, day
+        self.messages, self.segments, self.price = messages, segments, price
+        self.message_lease = self.segment_lease = 0
+        self.used_messages = self.used_segments = 0
+        self.sent = self.sent_segments = self.spend = 0
+
+
+class Accountant:
+    """Daily per-tenant message and segment quotas with per-provider spend
+
+    `message_limits`/`segment_limits` map tenant IDs to daily limits (missing
+    tenants are unlimited) and `prices` maps API names to the price of a segment.
+    Days are counted in UTC shifted by `utc_offset` seconds.
+
+    Every thread keeps its own stripe per (tenant, API) with its quota leases and
+    counters, so the shared lock is only taken to create a stripe, to take a new
+    lease and to read totals. A thread moves to the stripe of a new day when it
+    reserves; `commit()` and `release()` settle on the stripe the reservation
+    came from. Leases of exited threads are reclaimed by `merge()`, which also
+    runs when a quota looks exhausted.
+    """
+
+    def __init__(self, message_limits=None, segment_limits=None, prices=None, lease_size=64,
+                 utc_offset=0, clock=time.time):
+        self.message_limits = dict(message_limits or {})
+        self.segment_limits = dict(segment_limits or {})
+        self.prices = dict(prices or {})
+        self.lease_size = lease_size
+        self.utc_offset = utc_offset
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._quotas = {}  # (kind, tenant, day) -> Quota
+        self._stripes = []
+        # counters of merged stripes: (tenant, api) -> [sent, sent_segments], api -> spend,
+        # (tenant, day) -> [used messages, used segments]
+        self._merged_sent, self._merged_spend, self._merged_usage = {}, {}, {}
+
+    def _day(self):
+        return int((self._clock() + self.utc_offset) // 86400)
+
+    def _stripe(self, tenant, api):
+        """Return the stripe of the current thread for today, moving on to a new day"""
+        day = self._day()
+        try:
+            stripe = self._local.stripes[(tenant, api)]
+        except AttributeError:
+            self._local.stripes = {}
+            stripe = None
+        except KeyError:
+            stripe = None
+        if stripe is None or stripe.day != day:
+            stripe = self._new_stripe(tenant, api, day, stripe)
+        return stripe
+
+    def _new_stripe(self, tenant, api, day, previous):
+        with self._lock:
+            if previous is not None:
+                self._return_leases(previous)
+                previous.retired = True
+            stripe = _Stripe(
+                tenant, api, day,
+                self._quota_locked("messages", self.message_limits, tenant, day),
+                self._quota_locked("segments", self.segment_limits, tenant, day),
+                self.prices.get(api),
+            )
+            self._stripes.append(stripe)
+        self._local.stripes[(tenant, api)] = stripe
+        return stripe
+
+    def _quota_locked(self, kind, limits, tenant, day):
+        """Return the quota of a tenant for a day, None when unlimited - called with the lock held"""
+        if tenant not in limits:
+            return None
+        key = (kind, tenant, day)
+        quota = self._quotas.get(key)
+        if quota is None:
+            quota = self._quotas[key] = Quota(limits[tenant], self.lease_size)
+        return quota
+
+    @staticmethod
+    def _return_leases(stripe):
+        if stripe.messages is not None:
+            stripe.messages.give_back(stripe.message_lease)
+        if stripe.segments is not None:
+            stripe.segments.give_back(stripe.segment_lease)
+        stripe.message_lease = stripe.segment_lease = 0
+
+    def _current(self, tenant, api):
+        """Return the stripe of the current thread without moving on to a new day"""
+        stripe = getattr(self._local, "stripes", {}).get((tenant, api))
+        return stripe if stripe is not None else self._stripe(tenant, api)
+
+    def _grant(self, quota, needed):
+        """Take a lease from a quota, reclaiming the leases of exited threads once when it runs out"""
+        grant = quota.grant(needed)
+        if not grant:
+            self.merge()
+            grant = quota.grant(needed)
+        return grant
+
+    def reserve(self, tenant, api, segments=1):
+        """Reserve one message of `segments` segments, return False over quota"""
+        stripe = self._stripe(tenant, api)
+        if stripe.messages is not None and stripe.message_lease < 1:
+            grant = self._grant(stripe.messages, 1 - stripe.message_lease)
+            if not grant:
+                return False
+            stripe.message_lease += grant
+        if stripe.segments is not None and stripe.segment_lease < segments:
+            grant = self._grant(stripe.segments, segments - stripe.segment_lease)
+            if not grant:
+                return False
+            stripe.segment_lease += grant
+        stripe.message_lease -= 1
+        stripe.segment_lease -= segments
+        return True
+
+    def commit(self, tenant, api, segments=1):
+        """Record a reserved message as sent"""
+        stripe = self._current(tenant, api)
+        stripe.used_messages += 1
+        stripe.used_segments += segments
+        stripe.sent += 1
+        stripe.sent_segments += segments
+        if stripe.price:
+            stripe.spend += stripe.price * segments
+
+    def release(self, tenant, api, segments=1):
+        """Give back a reservation of a message that was not sent
+
+        The units go back to the day they were reserved from, never to a later one.
+        """
+        stripe = self._current(tenant, api)
+        stripe.message_lease += 1
+        stripe.segment_lease += segments
+
+    def return_leases(self):
+        """Give the unused leases of the current thread back - call it when a sender thread stops"""
+        with self._lock:
+            for stripe in getattr(self._local, "stripes", {}).values():
+                self._return_leases(stripe)
+
+    def merge(self):
+        """Fold the stripes of exited threads and past days, returning their leases - call it periodically"""
+        day = self._day()
+        with self._lock:
+            live = []
+            for stripe in self._stripes:
+                if stripe.owner.is_alive() and not stripe.retired:
+                    live.append(stripe)
+                    continue
+                self._return_leases(stripe)
+                sent = self._merged_sent.setdefault((stripe.tenant, stripe.api), [0, 0])
+                sent[0] += stripe.sent
+                sent[1] += stripe.sent_segments
+                self._merged_spend[stripe.api] = self._merged_spend.get(stripe.api, 0) + stripe.spend
+                if stripe.day == day:
+                    usage = self._merged_usage.setdefault((stripe.tenant, day), [0, 0])
+                    usage[0] += stripe.used_messages
+                    usage[1] += stripe.used_segments
+            self._stripes = live
+            # quotas and usage of past days are no longer needed, unless a live stripe still holds them
+            days = {stripe.day for stripe in live} | {day}
+            self._quotas = {key: quota for key, quota in self._quotas.items() if key[2] in days}
+            self._merged_usage = {key: usage for key, usage in self._merged_usage.items() if key[1] in days}
+
+    def usage(self, tenant):
+        """Return today's {"messages": n, "segments": n} used by a tenant"""
+        day = self._day()
+        with self._lock:
+            messages, segments = self._merged_usage.get((tenant, day), (0, 0))
+            for stripe in self._stripes:
+                if stripe.tenant == tenant and stripe.day == day:
+                    messages += stripe.used_messages
+                    segments += stripe.used_segments
+            return {"messages": messages, "segments": segments}
+
+    def sent(self, tenant, api):
+        """Return the (messages, segments) sent by a tenant through an API since creation"""
+        with self._lock:
+            messages, segments = self._merged_sent.get((tenant, api), (0, 0))
+            for stripe in self._stripes:
+                if stripe.tenant == tenant and stripe.api == api:
+                    messages += stripe.sent
+                    segments += stripe.sent_segments
+            return messages, segments
+
+    def spend(self, api):
+        """Return the total spend of an API since creation"""
+        with self._lock:
+            return self._merged_spend.get(api, 0) + sum(stripe.spend for stripe in self._stripes if stripe.api == api)
+
+
+def tenant_of(provider):
+    """Return the tenant ID of a provider, None for the default tenant"""
+    tenant = getattr(provider, "TENANT", None)
+    return tenant.tenant_id if tenant is not None else None
+
+
+def reserve_or_raise(accountant, provider, segments):
+    """Reserve quota for a provider's message, raising QuotaExceeded when over quota"""
+    if not accountant.reserve(tenant_of(provider), provider.API_NAME, segments):
+        raise errors.QuotaExceeded(f"Quota exceeded for tenant {tenant_of(provider)!r}")
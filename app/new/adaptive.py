@@ -0,0 +1,138 @@
+"""Adaptive batch sizing
+
+`BatchController` tunes the batch size and the in-flight window (batches
+sent concurrently) of one provider from the latency and error rate of the
+batches it has sent. It aims at the highest throughput under a latency
+ceiling, AIMD style:
+
+- a batch slower than `latency_ceiling` halves the batch size (the window
+  when the batch size is already minimal);
+- an error rate above `error_threshold` halves both, as errors are usually
+  the provider throttling;
+- a batch faster than `headroom * latency_ceiling` grows the batch size by
+  `step`, and once it is maximal, the window by one.
+
+Only batches started after the last decrease can cause another one, so the
+batches in flight when the provider slowed down are not all counted against
+it. Senders bracket each batch with `acquire()` and `release()`:
+
+    token = controller.acquire()
+    try:
+        results = provider.send_many(controller-sized batch)
+    finally:
+        controller.release(token, len(batch), errors)
+
+The decisions are published to `app.new.metrics.METRICS` under the
+`provider` label.
+"""
+import threading
+import time
+
+from app.new.metrics import METRICS
+
+DECISIONS = ("increase", "widen", "decrease", "narrow", "backoff", "hold")
+
+
+class BatchController:
+    """AIMD controller of the batch size and in-flight window of one provider"""
+
+    def __init__(
+        self, name="default", latency_ceiling=1.0, min_size=1, max_size=1000, initial_size=10, step=None,
+        decrease=0.5, headroom=0.8, max_window=8, error_threshold=0.05, smoothing=0.3, metrics=METRICS,
+        clock=time.monotonic,
+    ):
+        if not 1 <= min_size <= max_size:
+            raise ValueError("batch sizes must satisfy 1 <= min_size <= max_size")
+        self.name = name
+        self.latency_ceiling = latency_ceiling
+        self.min_size, self.max_size = min_size, max_size
+        self.step = step or max(1, max_size // 50)
+        self.decrease = decrease
+        self.headroom = headroom
+        self.max_window = max_window
+        self.error_threshold = error_threshold
+        self.smoothing = smoothing
+        self.metrics = metrics
+        self.batch_size = min(max(initial_size, min_size), max_size)
+        self.window = 1
+        self.latency = None  # moving average of the batch latency, seconds
+        self.error_rate = 0.0  # moving average of the share of failed messages
+        self.stats = dict.fromkeys(DECISIONS, 0)
+        self._clock = clock
+        self._generation = 0  # incremented on every decrease
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        self._publish()
+
+    def acquire(self, timeout=None):
+        """Wait for a free slot in the window; return a token for `release()`, None on timeout"""
+        with self._condition:
+            if not self._condition.wait_for(lambda: self._in_flight < self.window, timeout):
+                return None
+            self._in_flight += 1
+            return self._generation, self._clock()
+
+    def release(self, token, size, errors=0):
+        """Free the slot of a finished batch of `size` messages, `errors` of which failed
+
+        The None token of a timed-out `acquire()` holds no slot; releasing it
+        does nothing and returns None.
+        """
+        if token is None:
+            return None
+        generation, start = token
+        latency = self._clock() - start
+        with self._condition:
+            self._in_flight -= 1
+            decision = self._decide(generation, size, latency, errors)
+            self.stats[decision] += 1
+            self._publish()
+            self._condition.notify_all()
+        self.metrics.increment("batch_decisions", provider=self.name, decision=decision)
+        return decision
+
+    def _average(self, average, sample):
+        return sample if average is None else average + self.smoothing * (sample - average)
+
+    def _decide(self, generation, size, latency, errors):
+        """Update the averages and the limits - called with the lock held"""
+        self.latency = self._average(self.latency, latency)
+        self.error_rate = self._average(self.error_rate, errors / size if size else 0.0)
+        # batches started before the last decrease already paid for it
+        fresh = generation == self._generation
+        if self.error_rate > self.error_threshold:
+            if not fresh:
+                return "hold"
+            self.batch_size = max(self.min_size, int(self.batch_size * self.decrease))
+            self.window = max(1, int(self.window * self.decrease))
+            self._generation += 1
+            return "backoff"
+        if latency > self.latency_ceiling:
+            if not fresh:
+                return "hold"
+            self._generation += 1
+            if self.batch_size > self.min_size:
+                self.batch_size = max(self.min_size, int(self.batch_size * self.decrease))
+                return "decrease"
+            if self.window > 1:
+                self.window = max(1, int(self.window * self.decrease))
+                return "narrow"
+            return "hold"
+        if latency < self.headroom * self.latency_ceiling and size >= self.batch_size:
+            # only a full batch shows the current size is fast enough
+            if self.batch_size < self.max_size:
+                self.batch_size = min(self.max_size, self.batch_size + self.step)
+                return "increase"
+            if self.window < self.max_window:
+                self.window += 1
+                return "widen"
+        return "hold"
+
+    def _publish(self):
+        labels = {"provider": self.name}
+        self.metrics.set("batch_size", self.batch_size, **labels)
+        self.metrics.set("batch_window", self.window, **labels)
+        self.metrics.set("batch_in_flight", self._in_flight, **labels)
+        self.metrics.set("batch_error_rate", round(self.error_rate, 4), **labels)
+        if self.latency is not None:
+            self.metrics.set("batch_latency_seconds", round(self.latency, 6), **labels)
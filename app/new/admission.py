@@ -0,0 +1,275 @@
+"""Admission control for asynchronous sends
+
+`AdmissionQueue` is a bounded priority queue that decides, when a message is
+offered, whether the senders can still get to it in time. The decision uses
+the queue delay - how long the oldest queued message has waited - in the
+manner of CoDel: a delay over `target` is tolerated for one `interval`, a
+delay above it for longer means a standing queue. Under overload the lowest
+priorities go first:
+
+- `LOW` (bulk) is rejected as soon as the delay exceeds `target`;
+- `NORMAL` is rejected while the delay has been over `target` for a whole
+  `interval`, or while memory is above `memory_high_water`;
+- `HIGH` (OTP) is rejected only when the oldest high-priority message has
+  waited longer than `interval`, i.e. high priority alone overloads the senders.
+
+A full queue (`capacity`) refuses every priority.
+
+Rejections raise `errors.Overloaded` in the submitting thread, so callers
+can defer or reroute the message. Messages dequeued while overloaded that
+already waited longer than `interval` are shed too, except `HIGH` ones.
+
+Memory is read every `memory_interval` seconds (the resident set size by
+default); its high-water mark is kept in `stats["memory_peak"]`. Shedding
+on memory stops once it is back under `memory_low_water`.
+
+`AdmittedSender` puts a worker pool behind the queue: `submit()` validates a
+message, admits it and returns a `Future` of its `SendResult`.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, InvalidStateError
+
+from app import errors
+from app.new.metrics import METRICS
+
+HIGH, NORMAL, LOW = 0, 1, 2
+PRIORITY_NAMES = ("high", "normal", "low")
+
+
+def rss_bytes():
+    """Return the resident set size of the process, None when it cannot be read"""
+    try:
+        with open("/proc/self/statm", "rb") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class AdmissionQueue:
+    """Bounded priority queue rejecting messages early under overload"""
+
+    def __init__(
+        self, capacity=10_000, target=0.005, interval=0.1, memory_high_water=None, memory_low_water=None,
+        memory=rss_bytes, memory_interval=0.05, on_shed=None, name="default", metrics=METRICS,
+        clock=time.monotonic,
+    ):
+        """`on_shed(item, exc)` is called for every message shed after it was admitted
+
+        Exceptions raised by `on_shed` are counted in `stats["callback_errors"]`.
+        """
+        self.capacity = capacity
+        self.target = target
+        self.interval = interval
+        self.memory_high_water = memory_high_water
+        self.memory_low_water = memory_high_water if memory_low_water is None else memory_low_water
+        self.memory_interval = memory_interval
+        self.on_shed = on_shed
+        self.name = name
+        self.metrics = metrics
+        self.stats = {
+            "admitted": 0, "rejected": 0, "shed": 0, "max_depth": 0, "max_delay": 0.0, "memory_peak": 0,
+            "callback_errors": 0,
+        }
+        self._memory = memory
+        self._clock = clock
+        self._queues = tuple(deque() for _ in PRIORITY_NAMES)
+        self._length = 0
+        self._above_since = None  # when the queue delay first exceeded the target
+        self._memory_high = False
+        self._memory_checked = None
+        self._closed = False
+        self._condition = threading.Condition()
+
+    def __len__(self):
+        return self._length
+
+    def delay(self, now=None):
+        """Return how long the oldest queued message has waited"""
+        now = self._clock() if now is None else now
+        oldest = min((queue[0][0] for queue in self._queues if queue), default=now)
+        return now - oldest
+
+    @property
+    def overloaded(self):
+        """True while the queue delay has exceeded the target for a whole interval"""
+        return self._above_since is not None and self._clock() - self._above_since >= self.interval
+
+    def _update(self, now):
+        """Track the queue delay and memory - called with the lock held"""
+        delay = self.delay(now)
+        if delay <= self.target:
+            self._above_since = None
+        elif self._above_since is None:
+            # the oldest message crossed the target before it was noticed
+            self._above_since = now - delay + self.target
+        if self._memory is not None and (
+            self._memory_checked is None or now - self._memory_checked >= self.memory_interval
+        ):
+            self._memory_checked = now
+            memory = self._memory()
+            if memory is not None:
+                self.stats["memory_peak"] = max(self.stats["memory_peak"], memory)
+                if self.memory_high_water is not None:
+                    if memory >= self.memory_high_water:
+                        self._memory_high = True
+                    elif memory < self.memory_low_water:
+                        self._memory_high = False
+                self.metrics.set("admission_memory_bytes", memory, queue=self.name)
+        return delay
+
+    def _refusal(self, priority, now, delay):
+        """Return why a message of the priority is refused, None when it is admitted"""
+        if self._length >= self.capacity:
+            return "full"
+        if priority == HIGH:
+            high = self._queues[HIGH]
+            # high priority alone is more than the senders can handle
+            if high and now - high[0][0] > self.interval:
+                return "standing queue"
+            return None
+        if self._memory_high:
+            return "memory"
+        if priority == LOW and delay > self.target:
+            return "delay"
+        if self._above_since is not None and now - self._above_since >= self.interval:
+            return "standing queue"
+        return None
+
+    def put(self, item, priority=NORMAL):
+        """Admit a message or raise `Overloaded`"""
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("AdmissionQueue is closed")
+            now = self._clock()
+            delay = self._update(now)
+            reason = self._refusal(priority, now, delay)
+            if reason is not None:
+                self.stats["rejected"] += 1
+                self.metrics.increment(
+                    "admission_rejected", queue=self.name, priority=PRIORITY_NAMES[priority], reason=reason
+                )
+                raise errors.Overloaded(f"Message not admitted ({reason})")
+            self._queues[priority].append((now, item))
+            self._length += 1
+            self.stats["admitted"] += 1
+            self.stats["max_depth"] = max(self.stats["max_depth"], self._length)
+            self._condition.notify()
+
+    def get(self, timeout=None):
+        """Return the next (item, priority, queue delay), highest priority first; None on timeout or close"""
+        shed = []
+        try:
+            with self._condition:
+                deadline = None if timeout is None else self._clock() + timeout
+                while True:
+                    while not self._length:
+                        if self._closed:
+                            return None
+                        remaining = None if deadline is None else deadline - self._clock()
+                        if remaining is not None and remaining <= 0:
+                            return None
+                        self._condition.wait(remaining)
+                    now = self._clock()
+                    overloaded = self._above_since is not None and now - self._above_since >= self.interval
+                    for priority, queue in enumerate(self._queues):
+                        if queue:
+                            enqueued, item = queue.popleft()
+                            break
+                    self._length -= 1
+                    waited = now - enqueued
+                    self._update(now)
+                    if overloaded and priority != HIGH and waited > self.interval:
+                        shed.append(item)
+                        continue
+                    self.stats["max_delay"] = max(self.stats["max_delay"], waited)
+                    self.metrics.set("admission_queue_depth", self._length, queue=self.name)
+                    self.metrics.set("admission_queue_delay_seconds", round(waited, 6), queue=self.name)
+                    return item, priority, waited
+        finally:
+            if shed:
+                self._shed(shed)
+
+    def _shed(self, items):
+        with self._condition:
+            self.stats["shed"] += len(items)
+        self.metrics.increment("admission_shed", len(items), queue=self.name)
+        if self.on_shed is not None:
+            exc = errors.Overloaded("Message shed after waiting too long")
+            for item in items:
+                try:
+                    self.on_shed(item, exc)
+                except Exception:  # pylint: disable=broad-except
+                    with self._condition:
+                        self.stats["callback_errors"] += 1
+
+    def close(self):
+        """Refuse new messages and wake up the waiting consumers; queued messages can still be taken"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+
+
+def _fail_future(item, exc):
+    """Fail the future of a shed message, unless it was cancelled meanwhile"""
+    try:
+        item[0].set_exception(exc)
+    except InvalidStateError:
+        pass
+
+
+class AdmittedSender:
+    """Worker pool sending the messages of an `AdmissionQueue`"""
+
+    def __init__(self, api="primary", workers=4, queue=None, tenant=None):
+        from app.new import sms_factory
+        self.api, self.tenant = api, tenant
+        self.queue = queue if queue is not None else AdmissionQueue(name=api)
+        if self.queue.on_shed is None:
+            self.queue.on_shed = _fail_future
+        self._factory = sms_factory
+        self._threads = [
+            threading.Thread(target=self._work, name=f"sms-admitted-{index}", daemon=True) for index in range(workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, phone_number, content, country_code="PL", priority=NORMAL):
+        """Validate and admit a message, return a `Future` of its `SendResult`
+
+        Validation errors and `Overloaded` are raised here, in the caller's thread.
+        """
+        provider = self._factory(self.api, self.tenant, scoped=True)
+        message = provider.prepare_message(phone_number, content, country_code)
+        future = Future()
+        self.queue.put((future, message), priority)
+        return future
+
+    def _work(self):
+        provider = self._factory(self.api, self.tenant, scoped=True)
+        while True:
+            entry = self.queue.get()
+            if entry is None:
+                return
+            (future, (content, recipient)), _, _ = entry
+            if not future.set_running_or_notify_cancel():
+                continue
+            provider.content, provider.recipient = content, recipient
+            try:
+                future.set_result(provider.send())
+            except Exception as exc:  # pylint: disable=broad-except
+                future.set_exception(exc)
+
+    def close(self, timeout=None):
+        """Stop admitting, send what is queued and stop the workers"""
+        self.queue.close()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,115 @@
+"""Micro-batching of messages into batch API requests
+
+Callers submit single messages and get a `concurrent.futures.Future`. A
+background thread collects up to `max_items` messages, or whatever arrived
+within `max_delay_ms` of the first one, sends them in one batch request and
+resolves every caller's future with its own `_process_response` result.
+"""
+import threading
+import time
+from concurrent.futures import Future
+
+from app import errors
+
+
+class MicroBatcher:
+    """Coalesce messages submitted from many threads into batch requests"""
+
+    def __init__(self, provider, max_items=100, max_delay_ms=5.0, clock=time.monotonic):
+        """`provider` is a provider instance used only for validation and `send_batch`"""
+        if max_items < 1:
+            raise ValueError("max_items must be positive")
+        self.provider = provider
+        self.max_items = max_items
+        self.max_delay = max_delay_ms / 1000.0
+        self.stats = {"batches": 0, "messages": 0}
+        self._clock = clock
+        self._pending, self._futures = [], []
+        self._deadline = None
+        self._closed = False
+        self._condition = threading.Condition()
+        self._thread = threading.Thread(target=self._run, name="sms-micro-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, phone_number, content, country_code="PL"):
+        """Validate and queue a message, return a Future of its (success, response) result
+
+        Validation errors are raised here, in the caller's thread.
+        """
+        message = self.provider.prepare_message(phone_number, content, country_code)
+        return self.submit_prepared(message)
+
+    def submit_prepared(self, message):
+        """Queue an already validated (content, recipient) pair"""
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            if not self._pending:
+                self._deadline = self._clock() + self.max_delay
+            self._pending.append(message)
+            self._futures.append(future)
+            if len(self._pending) == 1 or len(self._pending) >= self.max_items:
+                self._condition.notify()
+        return future
+
+    def _take_batch(self):
+        """Wait for a full or expired batch, return (messages, futures) or None when closed"""
+        with self._condition:
+            while True:
+                if self._pending:
+                    if len(self._pending) >= self.max_items or self._closed:
+                        break
+                    remaining = self._deadline - self._clock()
+                    if remaining <= 0:
+                        break
+                    self._condition.wait(remaining)
+                elif self._closed:
+                    return None
+                else:
+                    self._condition.wait()
+            size = min(len(self._pending), self.max_items)
+            messages, self._pending = self._pending[:size], self._pending[size:]
+            futures, self._futures = self._futures[:size], self._futures[size:]
+            # messages left over from a full batch start their own window
+            self._deadline = self._clock() + self.max_delay
+            return messages, futures
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+            # futures cancelled while queued are dropped, the others can no longer be cancelled
+            batch = [(message, future) for message, future in zip(*batch) if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            messages = [message for message, _ in batch]
+            futures = [future for _, future in batch]
+            self.stats["batches"] += 1
+            self.stats["messages"] += len(messages)
+            try:
+                results = self.provider.send_batch(messages)
+                if len(results) != len(futures):
+                    raise errors.TransportError(f"Batch of {len(futures)} messages got {len(results)} results")
+            except BaseException as exc:  # pylint: disable=broad-except
+                for future in futures:
+                    future.set_exception(exc)
+                if not isinstance(exc, Exception):
+                    raise
+                continue
+            for future, result in zip(futures, results):
+                future.set_result(result)
+
+    def close(self, timeout=None):
+        """Flush the pending messages and stop the background thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,61 @@
+"""Interned message content
+
+In a broadcast millions of messages share one content and differ only in the
+recipient. `content_info()` keeps a bounded LRU cache (keyed by the content
+string, whose hash Python computes once and stores) of what the send path
+derives from content: its encoding, encoded length, segment count and the
+JSON-escaped fragment spliced into payloads. Each is computed on first use,
+so a content that is only ever serialized never pays for segmentation.
+"""
+from functools import lru_cache
+from json.encoder import encode_basestring_ascii as _escape
+
+from app.new import segments
+
+CACHE_SIZE = 1024
+
+
+class ContentInfo:
+    """Lazily computed properties of one message content"""
+    __slots__ = ("content", "_encoding", "_length", "_segments", "_fragment")
+
+    def __init__(self, content):
+        self.content = content
+        self._encoding = self._length = self._segments = self._fragment = None
+
+    @property
+    def encoding(self):
+        """Encoding the content is sent with - `segments.GSM7` or `segments.UCS2`"""
+        if self._encoding is None:
+            self._encoding = segments.encoding(self.content)
+        return self._encoding
+
+    @property
+    def length(self):
+        """Length in septets (GSM-7) or UTF-16 code units (UCS-2)"""
+        if self._length is None:
+            self._length = segments.encoded_length(self.content, self.encoding)
+        return self._length
+
+    @property
+    def segments(self):
+        """Number of SMS segments"""
+        if self._segments is None:
+            self._segments = segments.segment_count(self.content, self.encoding)
+        return self._segments
+
+    @property
+    def fragment(self):
+        """JSON string literal of the content as ASCII bytes"""
+        if self._fragment is None:
+            self._fragment = _escape(self.content).encode("ascii")
+        return self._fragment
+
+
+content_info = lru_cache(maxsize=CACHE_SIZE)(ContentInfo)
+content_info.__doc__ = "Return the cached `ContentInfo` of a content"
+
+
+def segment_count(content):
+    """Return the cached number of SMS segments of the content"""
+    return content_info(content).segments
@@ -0,0 +1,114 @@
+"""Per-thread provider contexts
+
+Providers keep the message being sent on the instance (`recipient`,
+`content`), so an instance must not be shared between threads, and a lock
+around a shared one serializes the senders. A `ProviderContext` owns one
+provider instance per (api, tenant) and, optionally, one transport per
+provider; nothing in it is shared, so senders using their own context never
+contend.
+
+`sms_factory(api, scoped=True)` returns the provider of the current context:
+
+- inside `with provider_context():` (a `contextvars` scope, so also per
+  asyncio task) the context of that block;
+- otherwise the context of the current thread, created on first use.
+
+The context of a thread lives as long as the thread and is never closed, so
+it has no transport factory: use `provider_context()` for transports per
+context, they are closed when its block exits.
+"""
+import contextvars
+import threading
+from contextlib import contextmanager
+
+_current = contextvars.ContextVar("sms_provider_context", default=None)
+_local = threading.local()
+
+
+class ProviderContext:
+    """Provider instances and transports owned by one thread or task"""
+
+    def __init__(self, transport_factory=None, preload=()):
+        """`transport_factory()` returns a transport for each provider created in the context
+
+        Without it the providers use their class `TRANSPORT`. The APIs in
+        `preload` are instantiated up front instead of on first use.
+        """
+        self.transport_factory = transport_factory
+        self.transports = []
+        self._providers = {}
+        for api in preload:
+            self.provider(api)
+
+    def provider(self, api, tenant=None):
+        """Return the context's provider instance for the API (and tenant)"""
+        key = (api, tenant)
+        try:
+            provider = self._providers[key]
+        except KeyError:
+            return self._create(key)
+        if tenant is not None:
+            from app.new.tenants import TENANTS
+            # a reloaded tenant configuration gets a new provider class
+            if type(provider) is not TENANTS.provider_class(tenant, api):
+                return self._create(key)
+        return provider
+
+    def _create(self, key):
+        from app.new import sms_factory
+        previous = self._providers.get(key)
+        if previous is not None:
+            self._close_transport(previous)
+        provider = self._providers[key] = sms_factory(*key)
+        if self.transport_factory is not None:
+            transport = self.transport_factory()
+            self.transports.append(transport)
+            provider.TRANSPORT = transport
+        return provider
+
+    def _close_transport(self, provider):
+        """Close the transport the context created for a replaced provider"""
+        transport = vars(provider).get("TRANSPORT")
+        if any(transport is owned for owned in self.transports):
+            self.transports = [owned for owned in self.transports if owned is not transport]
+            transport.close()
+
+    def close(self):
+        """Close the transports of the context and forget its providers"""
+        transports, self.transports = self.transports, []
+        for transport in transports:
+            transport.close()
+        self._providers.clear()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def current_context():
+    """Return the provider context of the current scope or thread
+
+    The context of a thread is never closed; it uses the class transports.
+    """
+    context = _current.get()
+    if context is not None:
+        return context
+    try:
+        return _local.context
+    except AttributeError:
+        context = _local.context = ProviderContext()
+        return context
+
+
+@contextmanager
+def provider_context(transport_factory=None, preload=()):
+    """Run the block with its own `ProviderContext`, closed on exit"""
+    context = ProviderContext(transport_factory, preload)
+    token = _current.set(context)
+    try:
+        yield context
+    finally:
+        _current.reset(token)
+        context.close()
@@ -0,0 +1,325 @@
+"""Bulk dispatch with a graceful shutdown protocol
+
+`Dispatcher` reads messages from a bulk input stream, groups them into
+batches and sends them through the provider's bulk path on worker threads.
+Messages that fail validation are reported with a rejected result instead
+of failing their batch. Its lifecycle is explicit:
+
+- `start()` starts the reader and the workers;
+- `drain(timeout)` stops intake and waits for queued and in-flight batches;
+- `stop(timeout)` drains until the deadline, then drops the batches that
+  have not started and waits for the in-flight ones.
+
+The checkpoint is the stream position before which every message was
+handed to the provider. It only advances over contiguous finished batches,
+so a restart with the same checkpoint resumes where the previous run really
+stopped: finished batches before it are not sent again, and only batches
+that were in flight past the deadline may be. A batch that fails (e.g. a
+`TransportError`) is retried `retries` times with exponential backoff from
+`retry_delay`; when it still fails it is dead-lettered - handed to
+`on_error`, listed in `failed` - and the watermark moves past it. A batch
+still waiting for a retry when `stop()` drops the queue stays below the
+watermark, like the batches that were never started.
+
+`stats["sent"]` counts the messages the API accepted, `stats["rejected"]`
+those refused before reaching it (validation, opt-out) and `stats["failed"]`
+those the API refused or that belonged to a dead-lettered batch.
+
+With a `controller` (`app.new.adaptive.BatchController`) the batch size and
+the number of batches in flight follow the controller instead of the fixed
+`batch_size` and `workers`, which then act as the initial size and the
+upper bound of the window.
+"""
+import os
+import queue
+import threading
+import time
+
+from app import errors
+from app.new.results import SendResult
+
+NEW, RUNNING, DRAINING, STOPPED = "new", "running", "draining", "stopped"
+
+
+class FileCheckpoint:
+    """Stream position persisted in a file, replaced atomically"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def load(self):
+        """Return the saved position, 0 when there is none"""
+        try:
+            with open(self.path, encoding="ascii") as file:
+                return int(file.read().strip() or 0)
+        except FileNotFoundError:
+            return 0
+
+    def save(self, position):
+        """Save the position"""
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="ascii") as file:
+            file.write(str(position))
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temporary, self.path)
+
+
+class Dispatcher:
+    """Send a bulk message stream in batches, with start/drain/stop and checkpoints"""
+
+    def __init__(
+        self, provider, source, checkpoint=None, batch_size=100, workers=4, queue_size=8,
+        checkpoint_interval=1.0, on_result=None, on_error=None, clock=time.monotonic, controller=None,
+        retries=3, retry_delay=0.5,
+    ):
+        """`source` is an iterable of (phone_number, content[, country_code]) messages
+
+        On start the first `checkpoint.load()` messages of the stream are skipped.
+        `on_result(position, message, result)` is called for every sent message and
+        `on_error(position, messages, exc)` when a whole batch failed after its
+        retries. Exceptions raised by the callbacks are counted in
+        `stats["callback_errors"]`.
+        """
+        self.provider = provider
+        self.source = source
+        self.checkpoint = checkpoint
+        self.batch_size = batch_size
+        self.workers = workers
+        self.checkpoint_interval = checkpoint_interval
+        self.on_result = on_result
+        self.on_error = on_error
+        self.controller = controller
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.state = NEW
+        self.stats = {
+            "sent": 0, "rejected": 0, "failed": 0, "batches": 0, "retries": 0, "dropped": 0, "callback_errors": 0,
+        }
+        self.failed = []  # (start, end) stream ranges of the dead-lettered batches
+        self._clock = clock
+        self._queue = queue.Queue(queue_size)
+        self._intake = threading.Event()  # set while the reader may read
+        self._cancel = threading.Event()  # set when queued batches must be dropped
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+        self._pending = 0  # batches queued or in flight
+        self._reading = False
+        self._finished = {}  # batch start -> batch end, for batches past the watermark
+        self._position = self._saved = 0
+        self._saved_at = clock()
+        self._threads = []
+
+    @property
+    def position(self):
+        """Stream position before which every message was handed to the provider"""
+        return self._position
+
+    def start(self):
+        """Start reading and sending"""
+        if self.state != NEW:
+            raise RuntimeError(f"Dispatcher is {self.state}")
+        self._position = self._saved = self.checkpoint.load() if self.checkpoint is not None else 0
+        self.state = RUNNING
+        self._intake.set()
+        self._reading = True
+        self._threads = [threading.Thread(target=self._read, name="sms-dispatch-reader", daemon=True)]
+        self._threads += [
+            threading.Thread(target=self._work, name=f"sms-dispatch-{index}", daemon=True)
+            for index in range(self.workers)
+        ]
+        for thread in self._threads:
+            thread.start()
+        return self
+
+    def _read(self):
+        try:
+            iterator = iter(self.source)
+            for _ in range(self._position):
+                next(iterator, None)
+            position, batch, size = self._position, [], self._batch_size()
+            for message in iterator:
+                batch.append(message)
+                if len(batch) >= size:
+                    if not self._put((position, batch)):
+                        return
+                    position, batch, size = position + len(batch), [], self._batch_size()
+                if not self._intake.is_set():
+                    return
+            if batch:
+                self._put((position, batch))
+        finally:
+            with self._idle:
+                self._reading = False
+                self._idle.notify_all()
+            for _ in range(self.workers):
+                self._queue.put(None)
+
+    def _batch_size(self):
+        return self.batch_size if self.controller is None else self.controller.batch_size
+
+    def _put(self, item):
+        """Queue a batch unless intake is stopped first; return True when queued"""
+        with self._lock:
+            self._pending += 1
+        while self._intake.is_set():
+            try:
+                self._queue.put(item, timeout=0.05)
+                return True
+            except queue.Full:
+                continue
+        with self._idle:
+            self._pending -= 1
+            self._idle.notify_all()
+        return False
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            start, messages = item
+            with self._idle:
+                if self._cancel.is_set():
+                    self.stats["dropped"] += len(messages)
+                    self._pending -= 1
+                    self._idle.notify_all()
+                    continue
+            counts = None
+            try:
+                counts = self._send_with_retries(start, messages)
+            finally:
+                with self._idle:
+                    self._pending -= 1
+                    if counts is None:
+                        # dropped while waiting for a retry: a restart sends it again
+                        self.stats["dropped"] += len(messages)
+                    else:
+                        for key, count in counts.items():
+                            self.stats[key] += count
+                        self.stats["batches"] += 1
+                        self._finish(start, start + len(messages))
+                    self._idle.notify_all()
+
+    def _prepare(self, messages):
+        """Validate the messages of a batch, return (results with a rejection or None, valid messages)"""
+        provider, results, batch = self.provider, [], []
+        for message in messages:
+            try:
+                batch.append(provider.prepare_message(*message))
+            except errors.BaseError as exc:
+                results.append(SendResult.rejected(provider.API_NAME, type(exc).__name__))
+                continue
+            results.append(None)
+        return results, batch
+
+    def _send_with_retries(self, start, messages):
+        """Send one batch, retrying failures; return the stats counts, None when dropped by `stop()`"""
+        delay = self.retry_delay
+        for attempt in range(self.retries + 1):
+            if attempt:
+                if self._cancel.wait(delay):
+                    return None
+                delay *= 2
+                with self._lock:
+                    self.stats["retries"] += 1
+            try:
+                return self._send(start, messages)
+            except Exception as exc:  # pylint: disable=broad-except
+                error = exc
+        with self._lock:
+            self.failed.append((start, start + len(messages)))
+        if self.on_error is not None:
+            self._callback(self.on_error, start, messages, error)
+        return {"failed": len(messages)}
+
+    def _send(self, start, messages):
+        """Send one batch, return the stats counts of its results; errors of the batch propagate"""
+        results, batch = self._prepare(messages)
+        token = None if self.controller is None else self.controller.acquire()
+        try:
+            sent = iter(self.provider.send_batch(batch))
+            results = [result if result is not None else next(sent) for result in results]
+        except Exception:
+            if token is not None:
+                self.controller.release(token, len(batch), len(batch))
+            raise
+        counts = {"sent": 0, "rejected": 0, "failed": 0}
+        for result in results:
+            counts["sent" if result.success else "rejected" if result.refused else "failed"] += 1
+        if token is not None:
+            # refused messages never reached the API, they say nothing about its health
+            self.controller.release(token, len(messages) - counts["rejected"], counts["failed"])
+        if self.on_result is not None:
+            for position, (message, result) in enumerate(zip(messages, results), start):
+                self._callback(self.on_result, position, message, result)
+        return counts
+
+    def _callback(self, callback, *args):
+        """Call a user callback; its errors must not change the outcome of the batch"""
+        try:
+            callback(*args)
+        except Exception:  # pylint: disable=broad-except
+            with self._lock:
+                self.stats["callback_errors"] += 1
+
+    def _finish(self, start, end):
+        """Advance the watermark over contiguous finished batches - called with the lock held"""
+        self._finished[start] = end
+        while self._position in self._finished:
+            self._position = self._finished.pop(self._position)
+        if self.checkpoint is not None and self._clock() - self._saved_at >= self.checkpoint_interval:
+            self._save()
+
+    def _save(self):
+        if self._position != self._saved:
+            self.checkpoint.save(self._position)
+            self._saved = self._position
+        self._saved_at = self._clock()
+
+    def wait(self, timeout=None):
+        """Wait until the whole stream was sent; return False on timeout"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._reading or self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(0.05 if remaining is None else min(remaining, 0.05))
+        return True
+
+    def drain(self, timeout=None):
+        """Stop intake and send what is queued or in flight; return False if the deadline passed first"""
+        if self.state == RUNNING:
+            self.state = DRAINING
+        self._intake.clear()
+        drained = self.wait(timeout)
+        if self.checkpoint is not None:
+            with self._lock:
+                self._save()
+        return drained
+
+    def stop(self, timeout=None):
+        """Drain until the deadline, drop the batches not started yet and stop the threads
+
+        Return True when everything queued was sent. The checkpoint is saved in any case.
+        """
+        if self.state == NEW:
+            self.state = STOPPED
+            return True
+        deadline = None if timeout is None else time.monotonic() + timeout
+        drained = self.drain(timeout)
+        self._cancel.set()
+        for thread in self._threads:
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+        if self.checkpoint is not None:
+            with self._lock:
+                self._save()
+        self.state = STOPPED
+        return drained and not any(thread.is_alive() for thread in self._threads)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
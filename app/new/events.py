@@ -0,0 +1,233 @@
+"""Sampled audit log of sends
+
+Assign an `EventLog` to `provider.EVENT_LOG` to record every send: provider,
+hashed recipient, segment count, status and latency. The send path only
+appends a tuple to a bounded `collections.deque` - atomic under the GIL -
+and takes a short lock to count sampled-out and dropped events; a background
+thread does the hashing, segment counting, JSON encoding and gzip
+compression, writing in batches to size-rotated `<prefix>-NNNNNN.jsonl.gz`
+files.
+
+Failures are always kept. Successes can be sampled: `sample_every=N` keeps
+every Nth one (head sampling) and `slow_ms` keeps every success at least that
+slow (tail sampling).
+
+Recipients are hashed with a keyed BLAKE2b: phone numbers are few enough to
+brute-force an unkeyed hash. Without an explicit `salt`, a random one is
+created once in `<directory>/<prefix>.salt` and reused, so hashes stay
+comparable across restarts. The file is written aside and linked into place,
+so it is never seen partly written; a salt file of the wrong size is an error.
+
+Events that cannot be encoded and batches that cannot be written are counted
+in `stats["failed"]`; the writer thread keeps running.
+"""
+import gzip
+import hashlib
+import itertools
+import os
+import re
+import threading
+import tempfile
+import time
+from collections import deque
+from json.encoder import encode_basestring_ascii as _string
+
+from app.new.content import segment_count
+
+SALT_SIZE = 16
+
+
+class EventLog:
+    """Buffered, sampled, rotating JSONL log of send events"""
+
+    def __init__(
+        self, directory, prefix="sends", max_bytes=64 << 20, max_files=10, sample_every=1, slow_ms=None,
+        capacity=65536, flush_interval=0.5, compresslevel=1, salt=None, clock=time.time,
+    ):
+        if max_files < 1:
+            raise ValueError("max_files must be at least 1")
+        self.directory = directory
+        self.prefix = prefix
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.sample_every = sample_every
+        self.slow = None if slow_ms is None else slow_ms / 1000.0
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+        self.compresslevel = compresslevel
+        self.stats = {"recorded": 0, "sampled_out": 0, "dropped": 0, "failed": 0, "written": 0, "files": 0}
+        self._pattern = re.compile(re.escape(prefix) + r"-(\d{6,})\.jsonl\.gz")
+        self._clock = clock
+        self._buffer = deque()
+        self._counter = itertools.count()
+        self._wake_at = capacity // 2
+        self._wakeup = threading.Event()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._closed = False
+        self._file = self._raw = None
+        self._sequence = self._last_sequence()
+        os.makedirs(directory, exist_ok=True)
+        if salt is None:
+            salt = self._load_salt()
+        elif not salt:
+            raise ValueError("salt must not be empty")
+        self.salt = salt
+        self._thread = threading.Thread(target=self._run, name="sms-event-log", daemon=True)
+        self._thread.start()
+
+    def record(self, provider, recipient, content, status, success, latency):
+        """Queue an event - called from the send path, never blocks"""
+        if success and self.sample_every > 1 and (self.slow is None or latency < self.slow):
+            if next(self._counter) % self.sample_every:
+                with self._stats_lock:
+                    self.stats["sampled_out"] += 1
+                return
+        buffer = self._buffer
+        if len(buffer) >= self.capacity:
+            with self._stats_lock:
+                self.stats["dropped"] += 1
+            return
+        buffer.append((self._clock(), provider, recipient, content, status, success, latency))
+        if len(buffer) >= self._wake_at:
+            self._wakeup.set()
+
+    def _load_salt(self):
+        """Return the salt stored next to the log files, creating it on first use"""
+        path = os.path.join(self.directory, f"{self.prefix}.salt")
+        if not os.path.exists(path):
+            descriptor, temporary = tempfile.mkstemp(suffix=".salt.tmp", dir=self.directory)
+            try:
+                with open(descriptor, "wb") as file:
+                    file.write(os.urandom(SALT_SIZE))
+                    file.flush()
+                    os.fsync(file.fileno())
+                # the complete file appears at once; of two racing processes the first one wins
+                os.link(temporary, path)
+            except FileExistsError:
+                pass
+            finally:
+                os.unlink(temporary)
+        with open(path, "rb") as file:
+            salt = file.read()
+        if len(salt) != SALT_SIZE:
+            raise ValueError(f"Salt file {path} holds {len(salt)} bytes instead of {SALT_SIZE}")
+        return salt
+
+    def _hash(self, recipient):
+        return hashlib.blake2b(str(recipient).encode(), digest_size=8, key=self.salt).hexdigest()
+
+    def _encode(self, event):
+        """Return the JSON line of an event"""
+        timestamp, provider, recipient, content, status, success, latency = event
+        count = "null" if content is None else segment_count(content)
+        return (
+            f'{{"ts":{timestamp:.6f},"provider":{_string(provider)},'
+            f'"recipient":{"null" if recipient is None else _string(self._hash(recipient))},'
+            f'"segments":{count},"status":{"null" if status is None else _string(status)},'
+            f'"success":{"true" if success else "false"},"latency_ms":{latency * 1000:.3f}}}'
+        )
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            self._safe_flush()
+            if self._closed:
+                self._safe_flush()
+                return
+
+    def _safe_flush(self):
+        """Flush from the writer thread - a batch that could not be written is already counted"""
+        try:
+            self.flush()
+        except Exception:  # pylint: disable=broad-except
+            pass
+
+    def flush(self):
+        """Write every buffered event - normally done by the background thread"""
+        with self._write_lock:
+            self._flush()
+
+    def _flush(self):
+        buffer, lines = self._buffer, []
+        while True:
+            try:
+                event = buffer.popleft()
+            except IndexError:
+                break
+            try:
+                lines.append(self._encode(event))
+            except Exception:  # pylint: disable=broad-except
+                self.stats["failed"] += 1
+        if not lines:
+            return
+        try:
+            if self._file is None:
+                self._open()
+            self._file.write(("\n".join(lines) + "\n").encode())
+            self._file.flush()
+        except Exception:
+            self.stats["failed"] += len(lines)
+            # start over with a new file on the next flush
+            self._discard_file()
+            raise
+        self.stats["recorded"] += len(lines)
+        self.stats["written"] = self._raw.tell()
+        if self._raw.tell() >= self.max_bytes:
+            self._close_file()
+
+    def _path(self, sequence):
+        return os.path.join(self.directory, f"{self.prefix}-{sequence:06d}.jsonl.gz")
+
+    def _last_sequence(self):
+        """Return the sequence number of the newest existing file, so a restart does not overwrite it"""
+        return max((int(self._pattern.fullmatch(name).group(1)) for name in self.files()), default=0)
+
+    def files(self):
+        """Return the names of the log files, oldest first - other files in the directory are ignored"""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(
+            (name for name in os.listdir(self.directory) if self._pattern.fullmatch(name)),
+            key=lambda name: int(self._pattern.fullmatch(name).group(1)),
+        )
+
+    def _open(self):
+        self._sequence += 1
+        self._raw = open(self._path(self._sequence), "wb")  # pylint: disable=consider-using-with
+        self._file = gzip.GzipFile(fileobj=self._raw, mode="wb", compresslevel=self.compresslevel)
+        self.stats["files"] += 1
+        for name in self.files()[:-self.max_files]:
+            os.remove(os.path.join(self.directory, name))
+
+    def _close_file(self):
+        self._file.close()
+        self._raw.close()
+        self._file = self._raw = None
+
+    def _discard_file(self):
+        """Drop the current file after a write error, ignoring further errors"""
+        for file in (self._file, self._raw):
+            if file is not None:
+                try:
+                    file.close()
+                except OSError:
+                    pass
+        self._file = self._raw = None
+
+    def close(self):
+        """Write the remaining events and stop the writer thread"""
+        if not self._closed:
+            self._closed = True
+            self._wakeup.set()
+            self._thread.join()
+            with self._write_lock:
+                if self._file is not None:
+                    self._close_file()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
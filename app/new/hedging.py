@@ -0,0 +1,190 @@
+"""Hedged sending for latency-sensitive (OTP) traffic
+
+`HedgedSender` sends through the primary provider and, when it has not
+answered within a percentile of its recent latencies, sends the same message
+through the secondary provider as well. The first successful result wins.
+
+Hedging is limited three ways:
+
+- by a budget: hedges may not exceed `budget` of all requests;
+- by eligibility: the content must pass the secondary provider's rules
+  (e.g. its 160 character limit);
+- by duplicate suppression: a message already in flight is never hedged
+  again.
+
+A losing request that has not started yet is cancelled, and a hedge that
+starts after the primary request succeeded is skipped; both are counted in
+`stats["cancelled"]`. A losing request already sent cannot be recalled.
+When it succeeds as well, it is counted in `stats["duplicates"]` and passed
+to `on_duplicate`.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from app.new import sms_factory
+
+
+def _succeeded(future):
+    """True when a finished future holds a successful result - a skipped hedge holds None"""
+    if not future.done() or future.cancelled() or future.exception() is not None:
+        return False
+    result = future.result()
+    return result is not None and result.success
+
+
+class LatencyTracker:
+    """Sliding window of latencies with a cached percentile"""
+
+    def __init__(self, window=1000, refresh=50):
+        self._samples = deque(maxlen=window)
+        self._refresh = refresh
+        self._since_refresh = 0
+        self._sorted = []
+        self._lock = threading.Lock()
+
+    def add(self, latency):
+        """Record a latency in seconds"""
+        with self._lock:
+            self._samples.append(latency)
+            self._since_refresh += 1
+
+    def __len__(self):
+        return len(self._samples)
+
+    def percentile(self, percent):
+        """Return the percentile of the window, None while it is empty"""
+        with self._lock:
+            # while the window is small every new sample matters
+            if self._since_refresh >= self._refresh or (self._since_refresh and len(self._samples) < self._refresh):
+                self._sorted = sorted(self._samples)
+                self._since_refresh = 0
+            ordered = self._sorted
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100.0))]
+
+
+class HedgedSender:
+    """Send through the primary provider, hedged by the secondary one"""
+
+    def __init__(
+        self, primary=None, secondary=None, percentile=95.0, initial_delay=0.05, min_delay=0.001,
+        min_samples=20, budget=0.05, max_workers=32, on_duplicate=None,
+    ):
+        """`primary` and `secondary` are factories returning fresh provider instances"""
+        self.primary = primary or (lambda: sms_factory("primary"))
+        self.secondary = secondary or (lambda: sms_factory("secondary"))
+        self.percentile = percentile
+        self.initial_delay = initial_delay
+        self.min_delay = min_delay
+        self.min_samples = min_samples
+        self.budget = budget
+        self.on_duplicate = on_duplicate
+        self.latencies = LatencyTracker()
+        self.stats = {
+            "requests": 0, "hedges": 0, "hedge_wins": 0, "duplicates": 0, "cancelled": 0, "over_budget": 0,
+            "not_eligible": 0, "in_flight_skips": 0,
+        }
+        self._lock = threading.Lock()
+        self._hedged = set()  # (phone_number, country_code, content) of messages with a hedge in flight
+        self._pool = ThreadPoolExecutor(max_workers, thread_name_prefix="sms-hedge")
+        # providers only used for their (stateless) validation rules
+        self._primary_rules, self._secondary_rules = self.primary(), self.secondary()
+
+    def hedge_delay(self):
+        """Return how long the primary provider gets before the message is hedged"""
+        if len(self.latencies) < self.min_samples:
+            return self.initial_delay
+        return max(self.min_delay, self.latencies.percentile(self.percentile))
+
+    def _send_one(self, factory, phone_number, content, country_code):
+        return factory().set_recipient(phone_number, country_code).set_content(content).send()
+
+    def _primary(self, phone_number, content, country_code):
+        start = time.perf_counter()
+        try:
+            return self._send_one(self.primary, phone_number, content, country_code)
+        finally:
+            # every primary latency counts, also of requests that lost - the delay must follow the real distribution
+            self.latencies.add(time.perf_counter() - start)
+
+    def _hedge(self, primary, phone_number, content, country_code):
+        """Send the hedge unless the primary request succeeded meanwhile; return None when skipped"""
+        if _succeeded(primary):
+            with self._lock:
+                self.stats["cancelled"] += 1
+            return None
+        return self._send_one(self.secondary, phone_number, content, country_code)
+
+    def _may_hedge(self, key, phone_number, content, country_code):
+        """Check eligibility, duplicates and the budget; reserve a hedge when allowed"""
+        eligible = not self._secondary_rules.check_message(phone_number, content, country_code)
+        with self._lock:
+            if not eligible:
+                self.stats["not_eligible"] += 1
+                return False
+            if key in self._hedged:
+                self.stats["in_flight_skips"] += 1
+                return False
+            if self.stats["hedges"] + 1 > self.budget * self.stats["requests"]:
+                self.stats["over_budget"] += 1
+                return False
+            self.stats["hedges"] += 1
+            self._hedged.add(key)
+            return True
+
+    def send(self, phone_number, content, country_code="PL"):
+        """Send a message, return the first successful `SendResult` (or the primary one when none succeeded)"""
+        self._primary_rules.check_message(phone_number, content, country_code).raise_for()
+        key = (str(phone_number), country_code, content)
+        with self._lock:
+            self.stats["requests"] += 1
+        primary = self._pool.submit(self._primary, phone_number, content, country_code)
+        done, _ = wait((primary,), timeout=self.hedge_delay())
+        if done or not self._may_hedge(key, phone_number, content, country_code):
+            return primary.result()
+        try:
+            secondary = self._pool.submit(self._hedge, primary, phone_number, content, country_code)
+            return self._first_success(primary, secondary).result()
+        finally:
+            with self._lock:
+                self._hedged.discard(key)
+
+    def _first_success(self, primary, secondary):
+        """Return the future of the first successful result, the primary one when neither succeeded"""
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if _succeeded(future):
+                    if future is secondary:
+                        with self._lock:
+                            self.stats["hedge_wins"] += 1
+                    for loser in pending:
+                        if loser.cancel():
+                            with self._lock:
+                                self.stats["cancelled"] += 1
+                        else:
+                            loser.add_done_callback(self._check_duplicate)
+                    return future
+        return primary
+
+    def _check_duplicate(self, future):
+        """Count a losing request that was delivered too"""
+        if _succeeded(future):
+            with self._lock:
+                self.stats["duplicates"] += 1
+            if self.on_duplicate is not None:
+                self.on_duplicate(future.result())
+
+    def close(self):
+        """Wait for outstanding requests and stop the worker threads"""
+        self._pool.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,80 @@
+"""Process-wide metrics
+
+A small registry of counters and gauges identified by a name and labels,
+e.g. `METRICS.set("batch_size", 200, provider="primary")`. Components
+publish to `METRICS` by default; `snapshot()` returns a plain dict for
+logging or an exporter and `render()` the Prometheus text format.
+"""
+import threading
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+class Metrics:
+    """Thread-safe registry of counters and gauges"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}
+        self._gauges = {}
+
+    def increment(self, name, value=1, **labels):
+        """Add `value` to a counter"""
+        key = _key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def set(self, name, value, **labels):
+        """Set a gauge"""
+        key = _key(name, labels)
+        with self._lock:
+            self._gauges[key] = value
+
+    def value(self, name, default=None, **labels):
+        """Return the current value of a counter or gauge"""
+        key = _key(name, labels)
+        return self._gauges.get(key, self._counters.get(key, default))
+
+    def snapshot(self):
+        """Return {"name{label=value,...}": value} of all counters and gauges"""
+        with self._lock:
+            items = list(self._counters.items()) + list(self._gauges.items())
+        return {_format(name, labels): value for (name, labels), value in sorted(items)}
+
+    def render(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        with self._lock:
+            counters, gauges = sorted(self._counters.items()), sorted(self._gauges.items())
+        lines = []
+        for kind, items in (("counter", counters), ("gauge", gauges)):
+            declared = set()
+            for (name, labels), value in items:
+                if name not in declared:
+                    lines.append(f"# TYPE {name} {kind}")
+                    declared.add(name)
+                lines.append(f"{_format(name, labels, quote=True)} {value}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def clear(self):
+        """Remove every metric"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+
+
+def _escape(value):
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(name, labels, quote=False):
+    if not labels:
+        return name
+    if quote:
+        return name + "{" + ",".join(f'{label}="{_escape(value)}"' for label, value in labels) + "}"
+    return name + "{" + ",".join(f"{label}={value}" for label, value in labels) + "}"
+
+
+METRICS = Metrics()
@@ -0,0 +1,171 @@
+#!/usr/bin/env python3
+"""
+Profiling harness: drive a synthetic campaign and record where time and memory go
+
+    python -m app.new.profile --provider secondary --messages 1000000
+
+Each profiler runs in its own pass over the same workload, so they do not
+distort each other:
+
+- `cpu`: cProfile statistics, saved as `<out>/cpu.pstats` (load them with
+  `pstats` or snakeviz) with the top functions printed;
+- `stacks`: a sampling thread records the stack of the campaign thread and
+  writes `<out>/stacks.collapsed` in the collapsed format read by
+  flamegraph.pl, speedscope or inferno;
+- `memory`: tracemalloc top allocators and peak memory in `<out>/memory.txt`,
+  with the campaign keeping every result like a caller collecting them.
+"""
+import argparse
+import cProfile
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+
+from app.new import sms_factory
+
+PASSES = ("cpu", "stacks", "memory")
+
+
+def campaign(api, messages, batch_size=0, content="Your code is 1234", country_code="PL", results=None):
+    """Send `messages` messages the way callers do
+
+    With `batch_size` 0 every message goes through `sms_factory()`, the
+    validating setters and `send()`; otherwise through `send_many()` batches.
+    The results are appended to `results` when it is a list.
+    """
+    keep = results.append if results is not None else (lambda result: None)
+    if not batch_size:
+        for index in range(messages):
+            keep(sms_factory(api).set_recipient(600000000 + index % 100000000, country_code).set_content(content).send())
+        return
+    provider = sms_factory(api)
+    for start in range(0, messages, batch_size):
+        for result in provider.send_many([
+            (600000000 + index % 100000000, content, country_code)
+            for index in range(start, min(start + batch_size, messages))
+        ]):
+            keep(result)
+
+
+def profile_cpu(workload, path, top=25, stream=sys.stdout):
+    """Run the workload under cProfile, save the stats and print the top functions"""
+    profiler = cProfile.Profile()
+    profiler.runcall(workload)
+    profiler.dump_stats(path)
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats("cumulative").print_stats(top)
+    return stats
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+def collapse(frame):
+    """Return the stack of a frame in collapsed form: `outer;...;inner`"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def sample_stacks(workload, path, interval=0.001):
+    """Run the workload while sampling its stack every `interval` seconds, write collapsed stacks
+
+    Return the number of samples.
+    """
+    samples = Counter()
+    target = threading.get_ident()
+    done = threading.Event()
+
+    def sampler():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target)  # pylint: disable=protected-access
+            if frame is not None:
+                samples[collapse(frame)] += 1
+
+    thread = threading.Thread(target=sampler, name="stack-sampler", daemon=True)
+    # the sampler only runs when the workload thread releases the GIL
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(min(switch_interval, interval / 2))
+    thread.start()
+    try:
+        workload()
+    finally:
+        done.set()
+        thread.join()
+        sys.setswitchinterval(switch_interval)
+    with open(path, "w", encoding="utf-8") as file:
+        for stack, count in samples.most_common():
+            file.write(f"{stack} {count}\n")
+    return sum(samples.values())
+
+
+def profile_memory(workload, path, top=15, frames=10):
+    """Run the workload under tracemalloc, write the top allocators and the peak
+
+    What the workload returns stays alive until the snapshot is taken.
+    """
+    tracemalloc.start(frames)
+    try:
+        kept = workload()  # pylint: disable=unused-variable
+        snapshot = tracemalloc.take_snapshot()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    snapshot = snapshot.filter_traces((tracemalloc.Filter(False, tracemalloc.__file__),))
+    lines = [f"current {current / 1024:.1f} KiB, peak {peak / 1024:.1f} KiB", f"top {top} allocators:"]
+    for statistic in snapshot.statistics("traceback")[:top]:
+        lines.append(f"{statistic.size / 1024:10.1f} KiB in {statistic.count:8d} blocks")
+        lines.extend("    " + line for line in statistic.traceback.format(limit=frames, most_recent_first=True))
+    with open(path, "w", encoding="utf-8") as file:
+        file.write("\n".join(lines) + "\n")
+    return current, peak
+
+
+def main(argv=None):
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Profile a synthetic SMS campaign")
+    parser.add_argument("--provider", default="primary", choices=["primary", "secondary"])
+    parser.add_argument("--messages", type=int, default=100_000)
+    parser.add_argument("--batch-size", type=int, default=0, help="Send with send_many in batches (0: single sends)")
+    parser.add_argument("--content", default="Your code is 1234")
+    parser.add_argument("--country", default="PL")
+    parser.add_argument("--passes", default=",".join(PASSES), help=f"Comma-separated subset of {', '.join(PASSES)}")
+    parser.add_argument("--interval", type=float, default=1.0, help="Stack sampling interval in milliseconds")
+    parser.add_argument("--out", default="profile-out", help="Output directory")
+    args = parser.parse_args(argv)
+
+    passes = [name for name in args.passes.split(",") if name]
+    unknown = set(passes) - set(PASSES)
+    if unknown:
+        parser.error(f"unknown passes: {', '.join(sorted(unknown))}")
+    os.makedirs(args.out, exist_ok=True)
+
+    def workload(results=None):
+        campaign(args.provider, args.messages, args.batch_size, args.content, args.country, results)
+        return results
+
+    workload()  # warm up: lazy imports and caches should not show up in the profiles
+    for name in passes:
+        start = time.perf_counter()
+        if name == "cpu":
+            profile_cpu(workload, os.path.join(args.out, "cpu.pstats"))
+            detail = "cpu.pstats"
+        elif name == "stacks":
+            count = sample_stacks(workload, os.path.join(args.out, "stacks.collapsed"), args.interval / 1000)
+            detail = f"stacks.collapsed ({count} samples)"
+        else:
+            _, peak = profile_memory(lambda: workload([]), os.path.join(args.out, "memory.txt"))
+            detail = f"memory.txt (peak {peak / 1024:.1f} KiB)"
+        print(f"{name}: {time.perf_counter() - start:.2f} s -> {os.path.join(args.out, detail)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,27 @@
-"""Providers"""
-from app.new.providers.base import BaseSmsProvider
-from app.new.providers.primary import PrimarySmsApiProvider
-from app.new.providers.secondary import SecondarySmsApiProvider
+"""Providers
 
+Provider modules are imported on first attribute access, so importing the
+package (or `app.new`) only pays for the providers that are actually used.
+"""
+_PROVIDER_MODULES = {
+    "BaseSmsProvider": "app.new.providers.base",
+    "PrimarySmsApiProvider": "app.new.providers.primary",
+    "SecondarySmsApiProvider": "app.new.providers.secondary",
+}
+
+__all__ = list(_PROVIDER_MODULES)
+
+
+def __getattr__(name):
+    """Import the provider module lazily and cache the class on the package"""
+    try:
+        module_name = _PROVIDER_MODULES[name]
+    except KeyError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    value = getattr(__import__(module_name, fromlist=(name,)), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -1,15 +1,57 @@
 import abc
-import copy
+import sys
 from functools import wraps
+from time import perf_counter
 
-from app import settings
+from app.countries import country_index
+from app.errors import RecipientSuppressed, TransportError, ValidationCode
+from app.new.accounting import reserve_or_raise, tenant_of
+from app.new.content import segment_count
+from app.new.recipients import Recipient
+from app.new.results import SendResult
+
+
+class _CountryTable:
+    """Class attribute read from the country routing table when first accessed
+
+    Importing the providers does not load the table. The first access replaces
+    the descriptor with the value, so later lookups are plain class attributes;
+    subclasses (e.g. tenant providers) may still override it with their own mapping.
+    """
+
+    def __init__(self, field):
+        self.field = field
+        self.owner = self.name = None
+
+    def __set_name__(self, owner, name):
+        self.owner, self.name = owner, name
+
+    def __get__(self, obj, owner=None):
+        value = getattr(country_index(), self.field)
+        setattr(self.owner, self.name, value)
+        return value
 
 
 class BaseSmsProvider(metaclass=abc.ABCMeta):
     """Base SMS Provider class"""
     recipient, content = None, None
     SENDER_NAME = "Alice"
-    COUNTRY_CODES = settings.COUNTRY_CODES
+    # country -> international prefix, `settings.COUNTRY_CODES` by default
+    COUNTRY_CODES = _CountryTable("prefixes")
+    # country -> range of valid national number lengths; countries missing here accept any length
+    NUMBER_LENGTHS = _CountryTable("lengths")
+    # Optional `app.ids.IdGenerator` used for message IDs instead of `uuid.uuid4()`
+    ID_GENERATOR = None
+    # Optional `app.new.transports.Transport` used instead of the in-process fakes
+    TRANSPORT = None
+    # Optional `app.new.tracking.DeliveryStore` recording every processed response
+    TRACKER = None
+    # Optional `app.new.accounting.Accountant` enforcing quotas and counting spend
+    ACCOUNTANT = None
+    # Optional `app.new.suppression.SuppressionList` of opted-out numbers never sent to
+    SUPPRESSION = None
+    # Optional `app.new.events.EventLog` receiving an audit event per send
+    EVENT_LOG = None
 
     # pylint: disable-no-self-argument
     def _validation(func):
@@ -17,7 +59,12 @@ class BaseSmsProvider(metaclass=abc.ABCMeta):
         @wraps(func)
         def wrapped(obj, *args, **kwargs):
             # pylint: disable=no-member, not-callable
-            getattr(obj, "_validate_" + func.__name__)(*args)
+            if args and isinstance(args[0], Recipient):
+                # a validated handle skips the rules it already satisfies
+                if not args[0].is_valid_for(obj):
+                    getattr(obj, "_validate_" + func.__name__)(args[0].phone_number, args[0].country_code)
+            else:
+                getattr(obj, "_validate_" + func.__name__)(*args)
             return func(obj, *args, **kwargs)
         return wrapped
 
@@ -27,7 +74,7 @@ class BaseSmsProvider(metaclass=abc.ABCMeta):
         pass
 
     @abc.abstractmethod
-    def _process_response(self, resp):
+    def _process_response(self, resp, recipient=None):
         """Protected abstract method responsible for response processing"""
         pass
 
@@ -36,18 +83,237 @@ class BaseSmsProvider(metaclass=abc.ABCMeta):
         """Protected abstract method responsible for creating payload"""
         pass
 
+    def check_recipient(self, phone_number, country_code="PL"):
+        """Validate a recipient without raising - return a `ValidationCode`"""
+        if country_code not in self.COUNTRY_CODES:
+            return ValidationCode.INVALID_COUNTRY
+        phone_number = str(phone_number)
+        if not phone_number.isdigit():
+            return ValidationCode.INVALID_PHONE_NUMBER
+        lengths = self.NUMBER_LENGTHS.get(country_code)
+        if lengths is not None and len(phone_number) not in lengths:
+            return ValidationCode.INVALID_PHONE_NUMBER
+        return ValidationCode.OK
+
+    def check_content(self, content):
+        """Validate content without raising - return a `ValidationCode`"""
+        if len(content) > self.MAX_CONTENT_LENGTH:
+            return ValidationCode.INVALID_CONTENT_LENGTH
+        return ValidationCode.OK
+
+    def check_message(self, phone_number, content, country_code="PL"):
+        """Validate a whole message without raising - return the first failing `ValidationCode`"""
+        if isinstance(phone_number, Recipient) and phone_number.is_valid_for(self):
+            return self.check_content(content)
+        if isinstance(phone_number, Recipient):
+            phone_number, country_code = phone_number.phone_number, phone_number.country_code
+        return self.check_recipient(phone_number, country_code) or self.check_content(content)
+
+    def check_before_sending(self):
+        """Check if content and recipient are set without raising - return a `ValidationCode`"""
+        if self.content is None:
+            return ValidationCode.CONTENT_NOT_SET
+        if self.recipient is None:
+            return ValidationCode.RECIPIENT_NOT_SET
+        return ValidationCode.OK
+
     @_validation
     def set_content(self, content):
         """Set content and make the method chainable"""
-        #
-        # @TODO: Implement it
-        #
+        self.content = content
+        return self
 
     @_validation
     def set_recipient(self, phone_number, country_code="PL"):
         """Set recipient attribute - remember to add a country code like in the `old.py` file.
-        Make the method chainable"""
-        #
-        # @TODO: Implement it
-        #
+        Make the method chainable. `phone_number` may also be a `Recipient` handle"""
+        if isinstance(phone_number, Recipient):
+            self.recipient = phone_number.address
+        else:
+            self.recipient = self.COUNTRY_CODES[country_code] + str(phone_number)
+        return self
+
+    def _build_payload(self, content, recipient):
+        """Construct the payload of an arbitrary message using `PAYLOAD_FIELDS`"""
+        content_field, recipient_field, sender_field, key_field = self.PAYLOAD_FIELDS
+        return {
+            content_field: content,
+            recipient_field: recipient,
+            sender_field: self.SENDER_NAME,
+            key_field: self.API_KEY,
+        }
+
+    def _track(self, resp, recipient=None):
+        """Record a processed response in `TRACKER`"""
+        self.TRACKER.record_sent(
+            self.API_NAME, resp.get("id"), recipient or resp.get("recipient") or self.recipient, resp.get("status")
+        )
+
+    def suppressed(self, recipient):
+        """Return True when the normalized recipient address opted out"""
+        return self.SUPPRESSION is not None and recipient in self.SUPPRESSION
+
+    def _check_suppressed(self, recipient):
+        """Raise `RecipientSuppressed` when the recipient opted out"""
+        if self.suppressed(recipient):
+            raise RecipientSuppressed(f"Recipient {recipient} opted out")
+
+    def _call_api(self, payload):
+        """Call the external API, return its response"""
+        raise NotImplementedError(f"{type(self).__name__} has no API call")
+
+    def _send(self):
+        """Send the current message through the transport or the external API
+
+        Runs the hooks shared by all providers (opt-out list, quota accounting,
+        event log) around the call.
+        """
+        self._validate_before_sending()  # pylint: disable=no-member
+        self._check_suppressed(self.recipient)
+        accountant, segments = self.ACCOUNTANT, 1
+        if accountant is not None:
+            segments = segment_count(self.content)
+            reserve_or_raise(accountant, self, segments)
+        result, start = None, perf_counter()
+        try:
+            if self.TRANSPORT is not None:
+                result = self._process_response(self.TRANSPORT.send(self), self.recipient)
+            else:
+                result = self._process_response(self._call_api(self._prepare_payload()), self.recipient)
+            return result
+        finally:
+            success = result is not None and result.success
+            if accountant is not None:
+                if success:
+                    accountant.commit(tenant_of(self), self.API_NAME, segments)
+                else:
+                    accountant.release(tenant_of(self), self.API_NAME, segments)
+            if self.EVENT_LOG is not None:
+                status = result.status if result is not None else sys.exc_info()[0].__name__
+                self.EVENT_LOG.record(
+                    self.API_NAME, self.recipient, self.content, status, success, perf_counter() - start
+                )
+
+    def _call_api_many(self, payloads):
+        """Call the batch endpoint of the external API, return one response per payload"""
+        raise NotImplementedError(f"{type(self).__name__} has no batch endpoint")
+
+    def prepare_message(self, phone_number, content, country_code="PL"):
+        """Validate a message for the batch path, return a (content, recipient) pair
+
+        Opted-out recipients are not checked here but by `send_batch()`, which
+        skips them, so one opt-out never fails a whole batch.
+        """
+        # pylint: disable=no-member
+        self._validate_set_content(content)
+        if isinstance(phone_number, Recipient):
+            if not phone_number.is_valid_for(self):
+                self._validate_set_recipient(phone_number.phone_number, phone_number.country_code)
+            recipient = phone_number.address
+        else:
+            self._validate_set_recipient(phone_number, country_code)
+            recipient = self.COUNTRY_CODES[country_code] + str(phone_number)
+        return content, recipient
+
+    def send_batch(self, batch):
+        """Send already validated (content, recipient) pairs in a single API request
+
+        Return a `SendResult` per message, in order. Opted-out recipients are not
+        sent; their result is a `SendResult.rejected()` with the status
+        `"RecipientSuppressed"`. With an `ACCOUNTANT`, quota for the whole batch
+        is reserved up front and `QuotaExceeded` is raised (with nothing sent)
+        when it does not fit. `TransportError` is raised when the API answers
+        with a different number of responses than messages.
+        """
+        if self.SUPPRESSION is not None:
+            return self._send_unsuppressed(batch)
+        return self._send_batch(batch)
+
+    def _send_batch(self, batch):
+        """Send a batch of recipients known not to be suppressed"""
+        if not batch:
+            return []
+        accountant = self.ACCOUNTANT
+        if accountant is not None:
+            segments = self._reserve_batch(accountant, batch)
+        start = perf_counter()
+        try:
+            if self.TRANSPORT is not None:
+                responses = self.TRANSPORT.send_many(self, batch)
+            else:
+                responses = self._call_api_many([self._build_payload(content, recipient) for content, recipient in batch])
+            if len(responses) != len(batch):
+                # which messages the missing responses belong to is unknown
+                raise TransportError(f"Got {len(responses)} responses for a batch of {len(batch)}")
+            results = [
+                self._process_response(response, recipient) for response, (_, recipient) in zip(responses, batch)
+            ]
+        except BaseException as exc:
+            if accountant is not None:
+                self._settle_batch(accountant, segments, [False] * len(batch))
+            if self.EVENT_LOG is not None:
+                self._log_batch(batch, [None] * len(batch), type(exc).__name__, perf_counter() - start)
+            raise
+        if accountant is not None:
+            self._settle_batch(accountant, segments, [result.success for result in results])
+        if self.EVENT_LOG is not None:
+            self._log_batch(batch, results, None, perf_counter() - start)
+        return results
+
+    def _send_unsuppressed(self, batch):
+        """Send the messages of a batch whose recipients did not opt out, reject the others"""
+        suppression, results, kept = self.SUPPRESSION, [], []
+        for message in batch:
+            if message[1] in suppression:
+                results.append(SendResult.rejected(self.API_NAME, RecipientSuppressed.__name__, message[1]))
+            else:
+                results.append(None)
+                kept.append(message)
+        if len(kept) == len(batch):
+            return self._send_batch(batch)
+        sent = iter(self._send_batch(kept))
+        return [result if result is not None else next(sent) for result in results]
+
+    def _log_batch(self, batch, results, error, latency):
+        """Record an event per batch message; all of them share the batch latency"""
+        record = self.EVENT_LOG.record
+        for (content, recipient), result in zip(batch, results):
+            if result is None:
+                record(self.API_NAME, recipient, content, error, False, latency)
+            else:
+                record(self.API_NAME, recipient, content, result.status, result.success, latency)
+
+    def _reserve_batch(self, accountant, batch):
+        """Reserve quota for every message of a batch, return the segment counts"""
+        segments = [segment_count(content) for content, _ in batch]
+        for index, count in enumerate(segments):
+            try:
+                reserve_or_raise(accountant, self, count)
+            except Exception:
+                self._settle_batch(accountant, segments[:index], [False] * index)
+                raise
+        return segments
+
+    def _settle_batch(self, accountant, segments, successes):
+        """Commit the reservations of sent messages and release the others"""
+        tenant = tenant_of(self)
+        for count, success in zip(segments, successes):
+            if success:
+                accountant.commit(tenant, self.API_NAME, count)
+            else:
+                accountant.release(tenant, self.API_NAME, count)
+
+    def send_many(self, messages):
+        """Validate and send many messages in a single API request
+
+        `messages` are (phone_number, content) or (phone_number, content, country_code)
+        tuples; the result is a list of `SendResult`s in the same order.
+        Instance `recipient`/`content` are left untouched.
+        """
+        return self.send_batch([self.prepare_message(*message) for message in messages])
 
+    def serialize_payload(self):
+        """Return the payload encoded as JSON bytes"""
+        from app.new.serializers import serializer_for
+        self._validate_before_sending()
+        return serializer_for(self).encode(self.content, self.recipient)
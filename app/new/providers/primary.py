@@ -1,48 +1,54 @@
-from app import settings, errors
-from app.fake import fake_primary_external_api
+from app import settings
+from app.fake import fake_primary_external_api, fake_primary_external_api_batch
 from app.new.providers.base import BaseSmsProvider
+from app.new.results import SendResult
 
 
 class PrimarySmsApiProvider(BaseSmsProvider):
     """Primary SMS API Provider"""
+    API_NAME = "primary"
     API_KEY = settings.PRIMARY_API_KEY
+    # Payload keys of content, recipient, sender and API key - see `app.new.serializers`
+    PAYLOAD_FIELDS = ("content", "phone", "sender", "api_key")
+    MAX_CONTENT_LENGTH = 70
 
     def _validate_set_recipient(self, *args):
         """Validate recipient using the same logic as defined in `old.py` file. Throw appropriate exception or return a boolean"""
-        #
-        # @TODO: Implement it
-        #
+        self.check_recipient(*args).raise_for()
+        return True
 
     def _validate_set_content(self, *args):
         """Validate content. Throw appropriate exception or return a boolean"""
-        #
-        # @TODO: Implement it
-        #
+        self.check_content(*args).raise_for()
+        return True
 
     def _validate_before_sending(self):
         """Check if content and recipient are set. Throw appropriate exception from `app.errors` module"""
-        #
-        # @TODO: Implement it
-        #
+        self.check_before_sending().raise_for()
 
-    def _process_response(self, resp):
-        """Check response content. Return (boolean, resp)"""
-        #
-        # @TODO: Implement it
-        #
-        return
+    def _process_response(self, resp, recipient=None):
+        """Check response content. Return a `SendResult` unpacking to (boolean, resp)"""
+        if self.TRACKER is not None:
+            self._track(resp, recipient)
+        return SendResult(resp.get("status") == "SENT", self.API_NAME, resp, recipient)
 
     def _prepare_payload(self):
         """Construct and return payload - check `old.py` for the implementation details"""
-        #
-        # @TODO: Implement it
-        #
-        return {}
+        return {
+            "content": self.content,
+            "phone": self.recipient,
+            "sender": self.SENDER_NAME,
+            "api_key": self.API_KEY,
+        }
+
+    def _call_api(self, payload):
+        """Call the external API"""
+        return fake_primary_external_api(payload)
+
+    def _call_api_many(self, payloads):
+        """Call the batch endpoint of the external API"""
+        return fake_primary_external_api_batch(payloads)
 
     def send(self):
         """Send the message"""
-        self._validate_before_sending()
-        payload = self._prepare_payload()
-        response = fake_primary_external_api(payload)
-        return self._process_response(response)
-
+        return self._send()
@@ -1,13 +1,54 @@
 from app import settings
+from app.fake import fake_secondary_external_api, fake_secondary_external_api_batch
 from app.new.providers.base import BaseSmsProvider
+from app.new.results import SendResult
 
 
-class SecondarySmsApiProvider:
-    """
-    Secondary SMS API Provide
-    Write this class from scratch based on `primary.py` and `old.py` files
-    """
-    #
-    # @TODO: Implement it
-    #
+class SecondarySmsApiProvider(BaseSmsProvider):
+    """Secondary SMS API Provider"""
+    API_NAME = "secondary"
+    API_KEY = settings.SECONDARY_API_KEY
+    # Payload keys of content, recipient, sender and API key - see `app.new.serializers`
+    PAYLOAD_FIELDS = ("body", "recipient", "sender_name", "auth_key")
+    MAX_CONTENT_LENGTH = 160
 
+    def _validate_set_recipient(self, *args):
+        """Validate recipient - the rules are shared with the primary API"""
+        self.check_recipient(*args).raise_for()
+        return True
+
+    def _validate_set_content(self, *args):
+        """Validate content - the secondary API accepts up to 160 characters"""
+        self.check_content(*args).raise_for()
+        return True
+
+    def _validate_before_sending(self):
+        """Check if content and recipient are set"""
+        self.check_before_sending().raise_for()
+
+    def _process_response(self, resp, recipient=None):
+        """Check response content. Return a `SendResult` unpacking to (boolean, resp)"""
+        if self.TRACKER is not None:
+            self._track(resp, recipient)
+        return SendResult(resp.get("status") == "OK", self.API_NAME, resp, recipient)
+
+    def _prepare_payload(self):
+        """Construct and return payload using the secondary API field names"""
+        return {
+            "body": self.content,
+            "recipient": self.recipient,
+            "sender_name": self.SENDER_NAME,
+            "auth_key": self.API_KEY,
+        }
+
+    def _call_api(self, payload):
+        """Call the external API"""
+        return fake_secondary_external_api(payload, self.ID_GENERATOR)
+
+    def _call_api_many(self, payloads):
+        """Call the batch endpoint of the external API"""
+        return fake_secondary_external_api_batch(payloads, self.ID_GENERATOR)
+
+    def send(self):
+        """Send the message"""
+        return self._send()
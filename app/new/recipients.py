@@ -0,0 +1,76 @@
+"""Validated recipient handles
+
+`validate_recipient()` runs the recipient rules of the providers once and
+returns a `Recipient` carrying the normalized address and the provider
+classes whose rules it satisfies. `set_recipient()` and the batch path
+accept it and skip revalidation for those providers.
+"""
+from app import errors
+from app.new import PROVIDERS, providers
+
+
+class Recipient:
+    """Pre-validated, normalized recipient"""
+    __slots__ = ("phone_number", "country_code", "address", "providers")
+
+    def __init__(self, phone_number, country_code, address, providers):
+        self.phone_number = phone_number
+        self.country_code = country_code
+        self.address = address
+        self.providers = frozenset(providers)
+
+    def is_valid_for(self, provider):
+        """Check if the rules of the provider (class or instance) were already applied"""
+        return (provider if isinstance(provider, type) else type(provider)) in self.providers
+
+    def __eq__(self, other):
+        if isinstance(other, Recipient):
+            return self.address == other.address
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.address)
+
+    def __str__(self):
+        return self.address
+
+    def __repr__(self):
+        names = ", ".join(sorted(provider.__name__ for provider in self.providers))
+        return f"Recipient({self.address!r}, providers=[{names}])"
+
+
+_PROTOTYPES = {}
+
+
+def _prototype(provider_class):
+    """Return a cached instance used only to run the validators of a provider class"""
+    try:
+        return _PROTOTYPES[provider_class]
+    except KeyError:
+        prototype = _PROTOTYPES[provider_class] = provider_class()
+        return prototype
+
+
+def validate_recipient(phone_number, country_code="PL", provider_classes=None):
+    """Validate a recipient against the rules of the given provider classes
+
+    By default all providers registered in `app.new.PROVIDERS` are checked. The
+    returned `Recipient` records the classes that accepted it; when none did,
+    the validation error of the first provider is raised.
+    """
+    if provider_classes is None:
+        provider_classes = [getattr(providers, name) for name in PROVIDERS.values()]
+    phone_number = str(phone_number)
+    accepted, first_error, address = [], None, None
+    for provider_class in provider_classes:
+        prototype = _prototype(provider_class)
+        try:
+            prototype._validate_set_recipient(phone_number, country_code)  # pylint: disable=protected-access
+        except errors.BaseError as exc:
+            first_error = first_error or exc
+            continue
+        accepted.append(provider_class)
+        address = address or prototype.COUNTRY_CODES[country_code] + phone_number
+    if not accepted:
+        raise first_error
+    return Recipient(phone_number, country_code, address, accepted)
@@ -0,0 +1,74 @@
+"""Normalized send results
+
+Both providers return a `SendResult` instead of their differently shaped
+upstream dicts (`"SENT"` + `recipient` vs `"OK"` + `id`). The result keeps a
+reference to the upstream dict - nothing is copied - and reads the message ID
+and status from it only when asked.
+
+For compatibility with the `(success, response)` tuples returned before, a
+result unpacks, indexes and compares like that pair.
+"""
+
+
+class SendResult:
+    """Outcome of sending one message"""
+    __slots__ = ("success", "provider", "refused", "_recipient", "_raw")
+
+    def __init__(self, success, provider, raw, recipient=None, refused=False):
+        self.success = success
+        self.provider = provider
+        self.refused = refused  # True when the message never reached the API
+        self._raw = raw
+        self._recipient = recipient
+
+    @classmethod
+    def rejected(cls, provider, status, recipient=None):
+        """Return the result of a message refused before it reached the API, `status` says why"""
+        return cls(False, provider, {"status": status}, recipient, refused=True)
+
+    @property
+    def raw(self):
+        """The upstream response dict, as returned by the API"""
+        return self._raw
+
+    @property
+    def message_id(self):
+        """Message ID assigned by the API, None when it assigns none"""
+        return self._raw.get("id")
+
+    @property
+    def status(self):
+        """Raw status string of the API"""
+        return self._raw.get("status")
+
+    @property
+    def recipient(self):
+        """Normalized recipient address"""
+        return self._recipient or self._raw.get("recipient")
+
+    def __iter__(self):
+        yield self.success
+        yield self._raw
+
+    def __len__(self):
+        return 2
+
+    def __getitem__(self, index):
+        return (self.success, self._raw)[index]
+
+    def __eq__(self, other):
+        if isinstance(other, SendResult):
+            return (self.success, self.provider, self._raw, self.recipient) == (
+                other.success, other.provider, other._raw, other.recipient
+            )
+        if isinstance(other, tuple):
+            return (self.success, self._raw) == other
+        return NotImplemented
+
+    __hash__ = None
+
+    def __repr__(self):
+        return (
+            f"SendResult(success={self.success!r}, provider={self.provider!r}, "
+            f"message_id={self.message_id!r}, recipient={self.recipient!r}, status={self.status!r})"
+        )
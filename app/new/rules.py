@@ -0,0 +1,78 @@
+"""Cross-provider validation rule matrix
+
+The matrix is compiled from the metadata the provider classes declare
+(`COUNTRY_CODES`, `NUMBER_LENGTHS` and `MAX_CONTENT_LENGTH`) and checks a message against the
+rules of every registered provider in one pass. The result is a bitmask
+with bit `i` set when the `i`-th provider of `app.new.PROVIDERS` can send
+the message. Nothing is raised for invalid messages - the mask is just 0.
+"""
+
+
+class RuleMatrix:
+    """Eligibility of messages for a list of providers"""
+
+    def __init__(self, names, provider_classes):
+        self.names = tuple(names)
+        self.provider_classes = tuple(provider_classes)
+        self.all_mask = (1 << len(self.provider_classes)) - 1
+        self.bits = {name: 1 << index for index, name in enumerate(self.names)}
+        # _countries[country] is (mask of providers accepting any number length,
+        # list of masks indexed by the length of the phone number)
+        countries = {}
+        for index, provider_class in enumerate(self.provider_classes):
+            for country_code in provider_class.COUNTRY_CODES:
+                any_length, by_length = countries.get(country_code, (0, []))
+                lengths = provider_class.NUMBER_LENGTHS.get(country_code)
+                if lengths is None:
+                    any_length |= 1 << index
+                else:
+                    by_length += [0] * (lengths.stop - len(by_length))
+                    for length in lengths:
+                        by_length[length] |= 1 << index
+                countries[country_code] = (any_length, by_length)
+        self._countries = countries
+        # _length_masks[n] is the mask of providers accepting content of n characters
+        longest = max((provider_class.MAX_CONTENT_LENGTH for provider_class in self.provider_classes), default=0)
+        self._length_masks = [
+            sum(1 << index for index, provider_class in enumerate(self.provider_classes)
+                if length <= provider_class.MAX_CONTENT_LENGTH)
+            for length in range(longest + 1)
+        ]
+
+    def eligible(self, phone_number, content, country_code="PL"):
+        """Return the bitmask of providers accepting the message"""
+        try:
+            any_length, by_length = self._countries[country_code]
+        except KeyError:
+            return 0
+        phone_number = str(phone_number)
+        if not phone_number.isdigit():
+            return 0
+        mask = any_length | (by_length[len(phone_number)] if len(phone_number) < len(by_length) else 0)
+        if not mask:
+            return 0
+        length = len(content)
+        if length >= len(self._length_masks):
+            return 0
+        return mask & self._length_masks[length]
+
+    def names_for(self, mask):
+        """Return the provider names of a bitmask, in registry order"""
+        return tuple(name for index, name in enumerate(self.names) if mask >> index & 1)
+
+
+_MATRICES = {}
+
+
+def rule_matrix(registry=None):
+    """Return the memoized matrix of a name -> class name registry (default `app.new.PROVIDERS`)"""
+    from app.new import PROVIDERS, providers
+    registry = PROVIDERS if registry is None else registry
+    key = tuple(registry.items())
+    try:
+        return _MATRICES[key]
+    except KeyError:
+        matrix = _MATRICES[key] = RuleMatrix(
+            registry, [getattr(providers, class_name) for class_name in registry.values()]
+        )
+        return matrix
@@ -0,0 +1,225 @@
+"""Scheduled sending
+
+`Scheduler` stores future messages in SQLite, indexed by time bucket and due
+time. It never scans the table: the next wake-up time is a single indexed
+MIN() query, the worker sleeps until then (or until something earlier is
+scheduled), and due messages are released in large batches into the
+providers' bulk path. A message is deleted only after its batch was
+handed to the provider, so a crash re-sends at most the batch in flight.
+Messages that became invalid after they were scheduled (an opt-out, a
+tenant or numbering rule change) are not sent: they are deleted and
+reported with a rejected result, so they never hold back their batch.
+
+With a `controller` (`app.new.adaptive.BatchController`) the batch size
+follows the measured latency of the sends instead of `batch_size`.
+
+The clock and the wait function are injectable, so schedules can be tested
+with a simulated clock.
+"""
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from app import errors
+from app.new.results import SendResult
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS scheduled (
+    id INTEGER PRIMARY KEY,
+    bucket INTEGER NOT NULL,
+    due REAL NOT NULL,
+    api TEXT NOT NULL,
+    tenant TEXT,
+    phone_number TEXT NOT NULL,
+    country_code TEXT NOT NULL,
+    content TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS scheduled_bucket_due ON scheduled (bucket, due);
+"""
+
+
+def at_local_time(day, hour, minute=0, timezone="UTC"):
+    """Return the timestamp of `hour:minute` on `day` (a date) in an IANA time zone"""
+    from zoneinfo import ZoneInfo
+    return datetime(day.year, day.month, day.day, hour, minute, tzinfo=ZoneInfo(timezone)).timestamp()
+
+
+class ScheduledMessage:
+    """Message released by the scheduler"""
+    __slots__ = ("id", "due", "api", "tenant", "phone_number", "country_code", "content")
+
+    def __init__(self, id, due, api, tenant, phone_number, country_code, content):  # pylint: disable=redefined-builtin
+        self.id, self.due, self.api, self.tenant = id, due, api, tenant
+        self.phone_number, self.country_code, self.content = phone_number, country_code, content
+
+
+class Scheduler:
+    """Persistent, time-indexed queue of messages to send later"""
+
+    def __init__(
+        self, path=":memory:", bucket_seconds=60, batch_size=1000, clock=time.time, factory=None, controller=None,
+    ):
+        from app.new import sms_factory
+        self.bucket_seconds = bucket_seconds
+        self.batch_size = batch_size
+        self.controller = controller
+        self.stats = {"dispatched": 0, "rejected": 0, "errors": 0}
+        self._clock = clock
+        self._factory = factory or sms_factory
+        self._providers = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def _provider(self, api, tenant):
+        key = (api, tenant)
+        provider = self._providers.get(key)
+        if provider is None:
+            provider = self._providers[key] = self._factory(api) if tenant is None else self._factory(api, tenant)
+        return provider
+
+    def schedule(self, when, phone_number, content, country_code="PL", api="primary", tenant=None):
+        """Schedule a message at timestamp `when`; validation errors are raised now"""
+        return self.schedule_many([(when, phone_number, content, country_code)], api, tenant)
+
+    def schedule_many(self, entries, api="primary", tenant=None):
+        """Schedule (when, phone_number, content[, country_code]) entries in one transaction
+
+        Every entry is validated by the provider first; return the number scheduled.
+        """
+        provider = self._provider(api, tenant)
+        rows = []
+        for entry in entries:
+            when, phone_number, content, country_code = entry if len(entry) == 4 else (*entry, "PL")
+            provider.prepare_message(phone_number, content, country_code)
+            rows.append((int(when // self.bucket_seconds), when, api, tenant, str(phone_number), country_code, content))
+        with self._wakeup:
+            with self._db:
+                self._db.executemany(
+                    "INSERT INTO scheduled (bucket, due, api, tenant, phone_number, country_code, content) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)", rows,
+                )
+            self._wakeup.notify_all()
+        return len(rows)
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM scheduled").fetchone()[0]
+
+    def next_due(self):
+        """Return the earliest due timestamp, or None when nothing is scheduled"""
+        with self._lock:
+            return self._next_due_locked()
+
+    def _next_due_locked(self):
+        row = self._db.execute(
+            "SELECT due FROM scheduled WHERE bucket = (SELECT MIN(bucket) FROM scheduled) ORDER BY due LIMIT 1"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _take_due(self, now):
+        """Return up to `batch_size` messages due at `now`, oldest first"""
+        bucket = int(now // self.bucket_seconds)
+        limit = self.batch_size if self.controller is None else self.controller.batch_size
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT id, due, api, tenant, phone_number, country_code, content FROM scheduled "
+                "WHERE bucket <= ? AND due <= ? ORDER BY bucket, due LIMIT ?",
+                (bucket, now, limit),
+            ).fetchall()
+        return [ScheduledMessage(*row) for row in rows]
+
+    def _delete(self, messages):
+        with self._lock, self._db:
+            self._db.executemany("DELETE FROM scheduled WHERE id = ?", [(message.id,) for message in messages])
+
+    def dispatch_due(self, now=None, on_result=None):
+        """Send every message due at `now` through the bulk path, return the number released
+
+        `on_result(message, result)` is called with each `_process_response` result,
+        and with a `SendResult.rejected()` for messages that no longer validate.
+        A batch the provider fails to send raises and stays scheduled.
+        """
+        now = self._clock() if now is None else now
+        dispatched = 0
+        while True:
+            messages = self._take_due(now)
+            if not messages:
+                return dispatched
+            groups = {}
+            for message in messages:
+                groups.setdefault((message.api, message.tenant), []).append(message)
+            for (api, tenant), group in groups.items():
+                results = self._send(api, tenant, group)
+                self._delete(group)
+                dispatched += len(group)
+                self.stats["dispatched"] += len(group)
+                if on_result is not None:
+                    for message, result in zip(group, results):
+                        on_result(message, result)
+
+    def _send(self, api, tenant, group):
+        """Send a group of messages, return a result per message"""
+        provider = self._provider(api, tenant)
+        results, batch, indexes = [None] * len(group), [], []
+        for index, message in enumerate(group):
+            try:
+                batch.append(provider.prepare_message(message.phone_number, message.content, message.country_code))
+            except errors.BaseError as exc:
+                results[index] = SendResult.rejected(api, type(exc).__name__)
+                self.stats["rejected"] += 1
+                continue
+            indexes.append(index)
+        if batch:
+            for index, result in zip(indexes, self._send_batch(provider, batch)):
+                results[index] = result
+        return results
+
+    def _send_batch(self, provider, batch):
+        if self.controller is None:
+            return provider.send_batch(batch)
+        token, failed = self.controller.acquire(), len(batch)
+        try:
+            results = provider.send_batch(batch)
+            failed = sum(not result.success for result in results)
+            return results
+        finally:
+            self.controller.release(token, len(batch), failed)
+
+    def run(self, stop_event, on_result=None, max_idle=60.0, retry_delay=1.0, on_error=None):
+        """Dispatch due messages until `stop_event` is set
+
+        The worker sleeps until the next due time; scheduling an earlier message
+        or setting `stop_event` (followed by `wake()`) wakes it up. A failed
+        dispatch (e.g. a `TransportError`) is counted in `stats["errors"]`,
+        passed to `on_error(exc)` and retried after `retry_delay` seconds.
+        """
+        while not stop_event.is_set():
+            failed = False
+            try:
+                self.dispatch_due(on_result=on_result)
+            except Exception as exc:  # pylint: disable=broad-except
+                failed = True
+                self.stats["errors"] += 1
+                if on_error is not None:
+                    on_error(exc)
+            with self._wakeup:
+                if stop_event.is_set():
+                    return
+                next_due = self._next_due_locked()
+                timeout = max_idle if next_due is None else min(max_idle, next_due - self._clock())
+                if failed:
+                    timeout = retry_delay
+                if timeout > 0:
+                    self._wakeup.wait(timeout)
+
+    def wake(self):
+        """Wake up a waiting `run()` loop"""
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+    def close(self):
+        """Close the SQLite connection"""
+        self._db.close()
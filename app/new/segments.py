@@ -0,0 +1,40 @@
+"""SMS encoding and segmentation
+
+Content that fits the GSM 03.38 alphabet is sent as GSM-7 (160 septets in
+a single message, 153 per part of a concatenated one), anything else as
+UCS-2 (70 code units, 67 per part).
+"""
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+_GSM7_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# characters sent as an escape sequence - two septets each
+_GSM7_EXTENDED = frozenset("^{}\\[~]|€\f")
+_GSM7_CHARS = _GSM7_BASIC | _GSM7_EXTENDED
+_LIMITS = {GSM7: (160, 153), UCS2: (70, 67)}
+
+
+def encoding(content):
+    """Return the encoding the content is sent with"""
+    return GSM7 if _GSM7_CHARS.issuperset(content) else UCS2
+
+
+def encoded_length(content, content_encoding=None):
+    """Return the length in septets (GSM-7) or UTF-16 code units (UCS-2)"""
+    content_encoding = content_encoding or encoding(content)
+    if content_encoding == GSM7:
+        return len(content) + sum(1 for char in content if char in _GSM7_EXTENDED)
+    return len(content.encode("utf-16-le")) // 2
+
+
+def segment_count(content, content_encoding=None):
+    """Return the number of SMS segments needed to send the content"""
+    content_encoding = content_encoding or encoding(content)
+    length = encoded_length(content, content_encoding)
+    single, multi = _LIMITS[content_encoding]
+    if length <= single:
+        return 1
+    return -(-length // multi)
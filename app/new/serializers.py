@@ -0,0 +1,69 @@
+"""Payload serializers
+
+Encode provider payloads straight to JSON bytes. The constant part of a
+payload (field names, sender and API key) is rendered once per provider
+class, so per message only the recipient is escaped; the escaped content
+comes from the `app.new.content` cache, shared by every payload with the
+same content. In bulk payloads consecutive messages with the same content
+(broadcasts) also reuse the rendered prefix. The output is byte-for-byte
+identical to `json.dumps(provider._prepare_payload()).encode()`.
+"""
+from json.encoder import encode_basestring_ascii as _escape
+
+from app.new.content import content_info
+
+
+class PayloadSerializer:
+    """JSON serializer for a single payload layout"""
+    __slots__ = ("_head", "_middle", "_tail")
+
+    def __init__(self, fields, sender, api_key):
+        """`fields` are the payload keys of content, recipient, sender and API key, in payload order"""
+        content_field, recipient_field, sender_field, key_field = fields
+        self._head = f"{{{_escape(content_field)}: ".encode("ascii")
+        self._middle = f", {_escape(recipient_field)}: ".encode("ascii")
+        self._tail = (
+            f", {_escape(sender_field)}: {_escape(sender)}, {_escape(key_field)}: {_escape(api_key)}}}"
+        ).encode("ascii")
+
+    def encode(self, content, recipient):
+        """Return the JSON bytes of a single payload"""
+        return b"".join((
+            self._head, content_info(content).fragment,
+            self._middle, _escape(recipient).encode("ascii"),
+            self._tail,
+        ))
+
+    def encode_many(self, messages):
+        """Return the JSON bytes of a list of payloads for bulk endpoints
+
+        `messages` is an iterable of (content, recipient) pairs.
+        """
+        middle, tail = self._middle, self._tail
+        buffer = bytearray(b"[")
+        previous = prefix = None
+        for content, recipient in messages:
+            if content is not previous:
+                # head + content + middle, rebuilt only when the content changes
+                prefix = b"".join((self._head, content_info(content).fragment, middle))
+                previous = content
+            if len(buffer) > 1:
+                buffer += b", "
+            buffer += prefix
+            buffer += _escape(recipient).encode("ascii")
+            buffer += tail
+        buffer += b"]"
+        return bytes(buffer)
+
+
+_SERIALIZERS = {}
+
+
+def serializer_for(provider):
+    """Return the cached serializer of a provider class or instance"""
+    key = (provider.PAYLOAD_FIELDS, provider.SENDER_NAME, provider.API_KEY)
+    try:
+        return _SERIALIZERS[key]
+    except KeyError:
+        serializer = _SERIALIZERS[key] = PayloadSerializer(*key)
+        return serializer
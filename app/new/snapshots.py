@@ -0,0 +1,326 @@
+"""Recipient list snapshots for recurring campaigns
+
+A recurring campaign imports nearly the same contact list every time.
+`ListSnapshot` keeps the last imported list of a campaign as a sorted file
+of fixed-size records - the recipient key (the normalized address as an
+integer, like `app.new.suppression`) and a 64-bit hash of the remaining
+fields - 16 bytes per contact. A new list is compared with it in one
+streaming merge pass:
+
+- the new rows are read in chunks of `chunk_size`, each chunk sorted by
+  key and spilled to a temporary run file (an external sort);
+- the runs and the old snapshot are merged, yielding `added`, `changed`
+  and `removed` contacts and writing the new snapshot alongside.
+
+Memory is bounded by one chunk, whatever the size of the list. The new
+snapshot replaces the old one only when the whole update succeeded, without
+the contacts whose message failed, so the next update sends them again:
+
+    snapshot = ListSnapshot.for_campaign("snapshots", "daily-digest")
+    with snapshot.update(read_contacts("contacts.csv")) as changes:
+        send_changes(sms_factory("secondary"), changes)
+"""
+import csv
+import heapq
+import os
+import pickle
+import struct
+import tempfile
+from collections import namedtuple
+from contextlib import contextmanager
+from hashlib import blake2b
+from operator import itemgetter
+
+from app import errors, settings
+from app.new.suppression import suppression_key
+
+_RECORD = struct.Struct("<QQ")
+_READ_SIZE = _RECORD.size * 4096
+_SEPARATOR = "\x1f"
+_RUN_BLOCK = 64  # entries per pickled block of a run file
+
+
+class Change(namedtuple("Change", "kind key row")):
+    """A contact `added`, `changed` or `removed` since the last snapshot
+
+    `row` is the (phone_number, country_code, *fields) row of the new list,
+    None for removed contacts.
+    """
+    __slots__ = ()
+
+    @property
+    def recipient(self):
+        """Normalized address of the contact"""
+        return f"00{self.key}"
+
+
+class Changes:
+    """Iterator of the `Change`s of an update, remembering the contacts to send again
+
+    The keys to retry are kept like the new list: in chunks of `chunk_size`,
+    each sorted and spilled to a run file in `directory`.
+    """
+
+    def __init__(self, changes, chunk_size, directory):
+        self._changes = changes
+        self._chunk_size = chunk_size
+        self._directory = directory
+        self._retry, self._runs = [], []
+        self.retried = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self._changes)
+
+    def retry(self, change):
+        """Leave the contact out of the new snapshot, so the next update yields it as `added` again"""
+        self._retry.append(change.key)
+        self.retried += 1
+        if len(self._retry) >= self._chunk_size:
+            self._retry.sort()
+            self._runs.append(_write_run(self._retry, self._directory))
+            self._retry = []
+
+    def retry_keys(self):
+        """Yield the keys passed to `retry()` in key order"""
+        self._retry.sort()
+        return heapq.merge(self._retry, *(_read_run(path) for path in self._runs))
+
+
+def _fields_hash(fields):
+    return int.from_bytes(blake2b(_SEPARATOR.join(fields).encode(), digest_size=8).digest(), "little")
+
+
+def read_contacts(path):
+    """Yield (phone_number, country_code, *fields) rows of a CSV contact file, skipping empty lines"""
+    with open(path, newline="", encoding="utf-8") as file:
+        for row in csv.reader(file):
+            if row:
+                yield tuple(row)
+
+
+class ListSnapshot:
+    """Sorted, hashed snapshot of a campaign's last imported contact list"""
+
+    def __init__(self, path, chunk_size=100_000, country_codes=None, tmpdir=None):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.country_codes = settings.COUNTRY_CODES if country_codes is None else country_codes
+        self.tmpdir = tmpdir
+        self.stats = {}
+
+    @classmethod
+    def for_campaign(cls, directory, campaign, **kwargs):
+        """Return the snapshot of a campaign stored in `directory`"""
+        os.makedirs(directory, exist_ok=True)
+        return cls(os.path.join(directory, f"{campaign}.snapshot"), **kwargs)
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self.path) // _RECORD.size
+        except FileNotFoundError:
+            return 0
+
+    def records(self):
+        """Yield the (key, fields hash) records of the snapshot in key order"""
+        try:
+            file = open(self.path, "rb")  # pylint: disable=consider-using-with
+        except FileNotFoundError:
+            return
+        with file:
+            while True:
+                data = file.read(_READ_SIZE)
+                if not data:
+                    return
+                yield from _RECORD.iter_unpack(data)
+
+    def _entry(self, row):
+        """Return the (key, fields hash, row) entry of a row, None when the recipient is malformed"""
+        if len(row) < 2:
+            return None
+        phone_number, country_code, *fields = row
+        prefix = self.country_codes.get(country_code)
+        phone_number = str(phone_number)
+        if prefix is None or not phone_number.isdigit():
+            return None
+        return suppression_key(prefix + phone_number), _fields_hash(fields), row
+
+    def _sorted_entries(self, rows, directory):
+        """Sort the entries of the rows chunk by chunk, return an iterator merging the chunks"""
+        chunk, runs = [], []
+        for row in rows:
+            entry = self._entry(row)
+            if entry is None:
+                self.stats["invalid"] += 1
+                continue
+            chunk.append(entry)
+            if len(chunk) >= self.chunk_size:
+                runs.append(self._spill(chunk, directory))
+                chunk = []
+        if not runs:
+            chunk.sort(key=itemgetter(0))
+            return iter(chunk)
+        if chunk:
+            runs.append(self._spill(chunk, directory))
+        return heapq.merge(*(_read_run(path) for path in runs), key=itemgetter(0))
+
+    def _spill(self, chunk, directory):
+        """Write a sorted chunk to a run file, return its path"""
+        chunk.sort(key=itemgetter(0))
+        path = _write_run(chunk, directory)
+        self.stats["runs"] += 1
+        return path
+
+    def _merge(self, entries, write):
+        """Merge the sorted entries with the old snapshot, write the new records and yield the changes"""
+        stats = self.stats
+        old = self.records()
+        current = next(old, None)
+        previous = None
+        for key, fields_hash, row in entries:
+            if key == previous:
+                stats["duplicates"] += 1
+                continue
+            previous = key
+            while current is not None and current[0] < key:
+                stats["removed"] += 1
+                yield Change("removed", current[0], None)
+                current = next(old, None)
+            if current is not None and current[0] == key:
+                changed = current[1] != fields_hash
+                current = next(old, None)
+                if not changed:
+                    stats["unchanged"] += 1
+                    write(_RECORD.pack(key, fields_hash))
+                    continue
+                stats["changed"] += 1
+                yield Change("changed", key, tuple(row))
+            else:
+                stats["added"] += 1
+                yield Change("added", key, tuple(row))
+            write(_RECORD.pack(key, fields_hash))
+        while current is not None:
+            stats["removed"] += 1
+            yield Change("removed", current[0], None)
+            current = next(old, None)
+
+    @contextmanager
+    def update(self, rows):
+        """Compare `rows` with the snapshot; yield the `Changes` iterator, in key order
+
+        Rows are (phone_number, country_code, *fields); a contact is `changed`
+        when its fields differ. Rows without a country, with an unknown country
+        or a non-numeric phone number are counted in `stats["invalid"]` and
+        dropped, repeated recipients in `stats["duplicates"]` (the first row
+        wins). When the block exits normally the rest of the changes are
+        consumed and the new snapshot, less the contacts passed to
+        `Changes.retry()`, replaces the old one; when it raises, the old
+        snapshot is kept.
+        """
+        self.stats = dict.fromkeys(("added", "changed", "removed", "unchanged", "duplicates", "invalid", "runs"), 0)
+        with tempfile.TemporaryDirectory(dir=self.tmpdir) as runs_directory:
+            temporary = self.path + ".tmp"
+            with open(temporary, "wb") as file:
+                try:
+                    changes = Changes(
+                        self._merge(self._sorted_entries(rows, runs_directory), file.write),
+                        self.chunk_size, runs_directory,
+                    )
+                    yield changes
+                    for _ in changes:
+                        pass
+                except BaseException:
+                    file.close()
+                    os.unlink(temporary)
+                    raise
+            if changes.retried:
+                _drop_records(temporary, changes.retry_keys())
+            os.replace(temporary, self.path)
+
+
+def _drop_records(path, keys):
+    """Rewrite a snapshot file without the records of the keys, both in key order"""
+    keys = iter(keys)
+    drop = next(keys, None)
+    filtered = path + ".filtered"
+    with open(path, "rb") as source, open(filtered, "wb") as target:
+        while True:
+            data = source.read(_READ_SIZE)
+            if not data:
+                break
+            kept = []
+            for key, fields_hash in _RECORD.iter_unpack(data):
+                while drop is not None and drop < key:
+                    drop = next(keys, None)
+                if key != drop:
+                    kept.append(_RECORD.pack(key, fields_hash))
+            target.write(b"".join(kept))
+    os.replace(filtered, path)
+
+
+def _write_run(items, directory):
+    """Write sorted items to a run file in blocks, return its path"""
+    descriptor, path = tempfile.mkstemp(suffix=".run", dir=directory)
+    with open(descriptor, "wb") as file:
+        for start in range(0, len(items), _RUN_BLOCK):
+            pickle.dump(items[start:start + _RUN_BLOCK], file, pickle.HIGHEST_PROTOCOL)
+    return path
+
+
+def _read_run(path):
+    """Yield the entries of a run file, one block in memory at a time"""
+    with open(path, "rb") as file:
+        while True:
+            try:
+                yield from pickle.load(file)
+            except EOFError:
+                return
+
+
+def send_changes(provider, changes, content=None, batch_size=1000, kinds=("added", "changed"), on_result=None):
+    """Send the changes of the given kinds through the provider's bulk path
+
+    The message is `content`, or else the first field of the row. Messages the
+    provider rejects (validation, opt-out) are counted and skipped instead of
+    failing their batch. Failed messages are passed to `changes.retry()` when
+    `changes` is the `Changes` of an update, so they stay out of the new
+    snapshot. `on_result(change, result)` is called per sent message.
+    Return the counts of sent, failed and rejected messages.
+    """
+    stats = {"sent": 0, "failed": 0, "rejected": 0}
+    batch, pending = [], []
+    retry = getattr(changes, "retry", None)
+
+    def flush():
+        for change, result in zip(pending, provider.send_batch(batch)):
+            stats["sent" if result.success else "failed"] += 1
+            if not result.success and retry is not None:
+                retry(change)
+            if on_result is not None:
+                on_result(change, result)
+        batch.clear()
+        pending.clear()
+
+    for change in changes:
+        if change.kind not in kinds:
+            continue
+        phone_number, country_code, *fields = change.row
+        try:
+            message = provider.prepare_message(
+                phone_number, content if content is not None else fields[0], country_code
+            )
+        except (errors.BaseError, IndexError):
+            stats["rejected"] += 1
+            continue
+        if provider.suppressed(message[1]):
+            stats["rejected"] += 1
+            continue
+        batch.append(message)
+        pending.append(change)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return stats
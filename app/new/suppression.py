@@ -0,0 +1,218 @@
+"""Opt-out (suppression) list
+
+Suppressed numbers are kept as a sorted array of 64-bit integers - the
+normalized address `0048600123456` becomes `48600123456` - and looked up
+with binary search, so a million entries take 8 MB instead of the ~60 MB of
+a set of ints. The array can be saved to a file and memory-mapped back, so
+several processes share one copy of a large list.
+
+An optional Bloom filter answers most misses without touching the array,
+which helps when the array is memory-mapped and its pages are cold.
+Additions and removals go to small delta sets, merged into a new array when
+they grow past `compact_threshold`; readers never take a lock.
+"""
+import mmap
+import random
+import threading
+from array import array
+from bisect import bisect_left
+from math import log
+
+from app import settings
+
+_MASK = (1 << 64) - 1
+_PATTERN_BITS = 10
+
+
+def suppression_key(number):
+    """Return the integer key of a normalized address (`0048...`, `+48...` or an int)"""
+    return int(number)
+
+
+class BloomFilter:
+    """Blocked Bloom filter over 64-bit integer keys
+
+    Each key sets `hashes` bits of a single 64-bit word, taken from a table
+    of precomputed bit patterns, so a lookup is two multiplications and one
+    word test.
+    """
+
+    def __init__(self, capacity, bits_per_entry=10):
+        words = max(1, capacity * bits_per_entry // 64)
+        self._bits = (words - 1).bit_length()
+        self.hashes = max(1, round(bits_per_entry * log(2)))
+        self._words = array("Q", bytes(8 << self._bits))
+        rng = random.Random(0)
+        self._patterns = array("Q", [
+            sum(1 << bit for bit in rng.sample(range(64), self.hashes)) for _ in range(1 << _PATTERN_BITS)
+        ])
+
+    def _slot(self, key):
+        return (
+            (key * 0x9E3779B97F4A7C15 & _MASK) >> (64 - self._bits),
+            self._patterns[(key * 0xBF58476D1CE4E5B9 & _MASK) >> (64 - _PATTERN_BITS)],
+        )
+
+    def add(self, key):
+        """Add a key"""
+        index, pattern = self._slot(key)
+        self._words[index] |= pattern
+
+    def update(self, keys):
+        """Add many keys"""
+        for key in keys:
+            self.add(key)
+
+    def __contains__(self, key):
+        index, pattern = self._slot(key)
+        return self._words[index] & pattern == pattern
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self._words.__sizeof__() + self._patterns.__sizeof__()
+
+
+def _contains(keys, key):
+    """Binary search in a sorted array or memory map"""
+    index = bisect_left(keys, key)
+    return index < len(keys) and keys[index] == key
+
+
+def _merge(base, added, removed):
+    """Return a new sorted array: `base` plus `added` minus `removed`"""
+    merged, start = array("Q"), 0
+    for key in sorted(added | removed):
+        index = bisect_left(base, key, start)
+        merged.frombytes(base[start:index].tobytes())
+        if key in added:
+            merged.append(key)
+        start = index + 1 if index < len(base) and base[index] == key else index
+    merged.frombytes(base[start:].tobytes())
+    return merged
+
+
+class SuppressionList:
+    """Set of opted-out numbers consulted before sending"""
+
+    def __init__(self, numbers=(), bloom_bits=0, compact_threshold=4096):
+        self.bloom_bits = bloom_bits
+        self.compact_threshold = compact_threshold
+        self._lock = threading.Lock()
+        self._mmap = self._view = None
+        base = array("Q", sorted({suppression_key(number) for number in numbers}))
+        # (base, bloom, added, removed) is replaced as a whole on compaction
+        self._state = (base, self._bloom_for(base), set(), set())
+
+    @classmethod
+    def from_lines(cls, lines, **kwargs):
+        """Load a list from text lines with one number each, e.g. an open file"""
+        return cls((line.strip() for line in lines if line.strip()), **kwargs)
+
+    @classmethod
+    def open(cls, path, **kwargs):
+        """Memory-map a list written by `save()`"""
+        suppression = cls(**kwargs)
+        with open(path, "rb") as file:
+            try:
+                suppression._mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:  # empty file
+                return suppression
+        base = suppression._view = memoryview(suppression._mmap).cast("Q")
+        suppression._state = (base, suppression._bloom_for(base), set(), set())
+        return suppression
+
+    def _bloom_for(self, base):
+        if not self.bloom_bits:
+            return None
+        bloom = BloomFilter(len(base) + self.compact_threshold, self.bloom_bits)
+        bloom.update(base)
+        return bloom
+
+    def __contains__(self, number):
+        base, bloom, added, removed = self._state
+        key = int(number)
+        if key in added:
+            return True
+        if bloom is not None and key not in bloom:
+            return False
+        return _contains(base, key) and key not in removed
+
+    def __len__(self):
+        base, _, added, removed = self._state
+        return len(base) + len(added) - len(removed)
+
+    def add(self, number):
+        """Suppress a number"""
+        self.update((number,))
+
+    def update(self, numbers):
+        """Suppress many numbers"""
+        with self._lock:
+            base, _, added, removed = self._state
+            for key in map(suppression_key, numbers):
+                if key in removed:
+                    removed.discard(key)
+                elif not _contains(base, key):
+                    added.add(key)
+            self._maybe_compact()
+
+    def discard(self, number):
+        """Remove a number from the list, e.g. after the recipient opted back in"""
+        key = suppression_key(number)
+        with self._lock:
+            base, _, added, removed = self._state
+            if key in added:
+                added.discard(key)
+            elif _contains(base, key):
+                removed.add(key)
+            self._maybe_compact()
+
+    def _maybe_compact(self):
+        _, _, added, removed = self._state
+        if len(added) + len(removed) > self.compact_threshold:
+            self._compact()
+
+    def compact(self):
+        """Merge pending additions and removals into the sorted array"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        base, _, added, removed = self._state
+        if added or removed:
+            base = _merge(base, added, removed)
+            self._state = (base, self._bloom_for(base), set(), set())
+
+    def filter(self, messages, country_codes=None):
+        """Yield the (phone_number, content[, country_code]) messages whose recipient is not suppressed
+
+        Messages with an unknown country or a non-numeric phone number are
+        passed through for the provider's validation to reject.
+        """
+        country_codes = settings.COUNTRY_CODES if country_codes is None else country_codes
+        for message in messages:
+            prefix = country_codes.get(message[2] if len(message) > 2 else "PL")
+            phone_number = str(message[0])
+            if prefix is None or not phone_number.isdigit() or prefix + phone_number not in self:
+                yield message
+
+    def save(self, path):
+        """Write the list as raw native-endian 64-bit integers for `open()`"""
+        self.compact()
+        with open(path, "wb") as file:
+            file.write(self._state[0].tobytes())
+
+    def memory_usage(self):
+        """Return the bytes used by the array (0 when memory-mapped) and the Bloom filter"""
+        base, bloom, added, removed = self._state
+        size = 0 if base is self._view else len(base) * base.itemsize
+        size += 0 if bloom is None else bloom.__sizeof__()
+        return size + added.__sizeof__() + removed.__sizeof__()
+
+    def close(self):
+        """Release the memory map"""
+        if self._mmap is not None:
+            if self._state[0] is self._view:
+                self._state = (array("Q"), None, set(), set())
+            self._view.release()
+            self._mmap.close()
+            self._mmap = self._view = None
@@ -0,0 +1,100 @@
+"""Multi-tenant provider configuration
+
+Each tenant has its own API keys, sender name and allowed countries. The
+registry resolves a tenant's configuration once into a provider subclass
+with those values as class attributes - the same attributes the providers
+already read - so sending a message does no configuration lookups.
+
+`load()` swaps the whole configuration atomically: providers created before
+a reload keep sending with the configuration they were built with, and the
+cached classes of unchanged tenants are reused.
+"""
+import threading
+from collections import namedtuple
+from types import MappingProxyType
+
+from app import errors, settings
+
+
+class TenantConfig(namedtuple("TenantConfig", "tenant_id api_keys sender_name allowed_countries")):
+    """Frozen tenant configuration
+
+    `api_keys` maps API names (`"primary"`, `"secondary"`) to keys, and
+    `allowed_countries` limits `settings.COUNTRY_CODES` (None allows all).
+    """
+    __slots__ = ()
+
+    def __new__(cls, tenant_id, api_keys, sender_name="Alice", allowed_countries=None):
+        if allowed_countries is not None:
+            allowed_countries = frozenset(allowed_countries)
+        return super().__new__(cls, tenant_id, tuple(sorted(dict(api_keys).items())), sender_name, allowed_countries)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a config from a plain dict, e.g. loaded from JSON"""
+        return cls(data["tenant_id"], data["api_keys"], data.get("sender_name", "Alice"), data.get("allowed_countries"))
+
+    def country_codes(self):
+        """Return the read-only country code table of the tenant"""
+        return MappingProxyType({
+            country: prefix for country, prefix in settings.COUNTRY_CODES.items()
+            if self.allowed_countries is None or country in self.allowed_countries
+        })
+
+
+class TenantRegistry:
+    """Registry of tenant configurations and their cached provider classes"""
+
+    def __init__(self, configs=()):
+        self._lock = threading.Lock()
+        # (configs, classes) is replaced as a whole, so readers never need the lock
+        self._state = ({}, {})
+        self.load(configs)
+
+    def load(self, configs):
+        """Replace all tenant configurations (hot reload)"""
+        configs = {config.tenant_id: config for config in configs}
+        with self._lock:
+            old_configs, old_classes = self._state
+            classes = {
+                key: provider_class for key, provider_class in old_classes.items()
+                if old_configs.get(key[0]) == configs.get(key[0])
+            }
+            self._state = (configs, classes)
+
+    def get(self, tenant_id):
+        """Return the configuration of a tenant"""
+        try:
+            return self._state[0][tenant_id]
+        except KeyError:
+            raise errors.UnknownTenant(f"Unknown tenant: {tenant_id!r}") from None
+
+    def provider_class(self, tenant_id, api):
+        """Return the provider class bound to a tenant's configuration"""
+        configs, classes = self._state
+        try:
+            return classes[(tenant_id, api)]
+        except KeyError:
+            pass
+        from app.new import PROVIDERS, providers
+        config = self.get(tenant_id)
+        try:
+            base = getattr(providers, PROVIDERS[api])
+        except (KeyError, TypeError):
+            raise NotImplementedError(f"Unknown SMS API: {api!r}") from None
+        api_keys = dict(config.api_keys)
+        provider_class = type(f"{base.__name__}[{tenant_id}]", (base,), {
+            "__module__": base.__module__,
+            "TENANT": config,
+            "API_KEY": api_keys.get(api, base.API_KEY),
+            "SENDER_NAME": config.sender_name,
+            "COUNTRY_CODES": config.country_codes(),
+        })
+        with self._lock:
+            # only cache when no reload happened in the meantime
+            if self._state[0] is configs:
+                self._state[1][(tenant_id, api)] = provider_class
+        return provider_class
+
+
+TENANTS = TenantRegistry()
@@ -0,0 +1,189 @@
+"""Delivery receipt (DLR) tracking
+
+`DeliveryStore` remembers sent messages and their delivery status. Records
+live in memory, indexed by provider message ID and by recipient; when more
+than `max_memory` records are held, the least recently updated ones spill
+to SQLite in bulk, where the same indexes exist. Delivery receipts are
+ingested in bulk and records idle for longer than a given age are evicted.
+
+Assign a store to `provider.TRACKER` to record every `_process_response`.
+"""
+import itertools
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS deliveries (
+    key TEXT PRIMARY KEY,
+    message_id TEXT,
+    provider TEXT,
+    recipient TEXT,
+    status TEXT,
+    sent_at REAL,
+    updated_at REAL
+);
+CREATE INDEX IF NOT EXISTS deliveries_recipient ON deliveries (recipient);
+CREATE INDEX IF NOT EXISTS deliveries_updated_at ON deliveries (updated_at);
+"""
+
+
+class DeliveryRecord:
+    """Tracked message"""
+    __slots__ = ("key", "message_id", "provider", "recipient", "status", "sent_at", "updated_at")
+
+    def __init__(self, key, message_id, provider, recipient, status, sent_at, updated_at):
+        self.key = key
+        self.message_id = message_id
+        self.provider = provider
+        self.recipient = recipient
+        self.status = status
+        self.sent_at = sent_at
+        self.updated_at = updated_at
+
+    def as_row(self):
+        """Return the SQLite row of the record"""
+        return (self.key, self.message_id, self.provider, self.recipient, self.status, self.sent_at, self.updated_at)
+
+    def __repr__(self):
+        return f"DeliveryRecord(message_id={self.message_id!r}, recipient={self.recipient!r}, status={self.status!r})"
+
+
+class DeliveryStore:
+    """In-memory delivery tracking store with SQLite spill"""
+
+    def __init__(self, path=":memory:", max_memory=1_000_000, spill_fraction=0.1, clock=time.time):
+        self.max_memory = max_memory
+        self._spill_size = max(1, int(max_memory * spill_fraction))
+        self._clock = clock
+        self._records = OrderedDict()  # key -> record, least recently updated first
+        self._by_recipient = {}  # recipient -> {key: None}
+        self._local_keys = itertools.count(1)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(_SCHEMA)
+
+    def __len__(self):
+        with self._lock:
+            (spilled,) = self._db.execute("SELECT COUNT(*) FROM deliveries").fetchone()
+            return len(self._records) + spilled
+
+    @property
+    def in_memory(self):
+        """Number of records held in memory"""
+        return len(self._records)
+
+    def record_sent(self, provider, message_id, recipient, status):
+        """Record a sent message, return its record
+
+        Messages without a provider message ID (the primary API) are tracked by recipient only.
+        """
+        now = self._clock()
+        message_id = None if message_id is None else str(message_id)
+        key = message_id if message_id is not None else f"#{next(self._local_keys)}"
+        record = DeliveryRecord(key, message_id, provider, recipient, status, now, now)
+        with self._lock:
+            previous = self._records.get(key)
+            if previous is not None:
+                # a repeated message ID replaces the record, also in the recipient index
+                self._unindex(key, previous.recipient)
+            elif message_id is not None:
+                # or the spilled row of an earlier record - committed with the next write
+                self._db.execute("DELETE FROM deliveries WHERE key = ?", (key,))
+            self._records[key] = record
+            self._records.move_to_end(key)
+            self._by_recipient.setdefault(recipient, {})[key] = None
+            if len(self._records) > self.max_memory:
+                self._spill(self._spill_size)
+        return record
+
+    def _unindex(self, key, recipient):
+        """Remove a key from the recipient index - called with the lock held"""
+        keys = self._by_recipient[recipient]
+        del keys[key]
+        if not keys:
+            del self._by_recipient[recipient]
+
+    def _spill(self, count):
+        """Move the `count` least recently updated records to SQLite"""
+        rows = []
+        for _ in range(min(count, len(self._records))):
+            key, record = self._records.popitem(last=False)
+            self._unindex(key, record.recipient)
+            rows.append(record.as_row())
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO deliveries VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def get(self, message_id):
+        """Return the record of a provider message ID, or None"""
+        key = str(message_id)
+        with self._lock:
+            record = self._records.get(key)
+            if record is not None:
+                return record
+            row = self._db.execute("SELECT * FROM deliveries WHERE key = ?", (key,)).fetchone()
+        return DeliveryRecord(*row) if row else None
+
+    def status(self, message_id):
+        """Return the delivery status of a provider message ID, or None"""
+        record = self.get(message_id)
+        return record.status if record is not None else None
+
+    def for_recipient(self, recipient):
+        """Return all records of a recipient, oldest first"""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT * FROM deliveries WHERE recipient = ? ORDER BY sent_at", (recipient,)
+            ).fetchall()
+            in_memory = [self._records[key] for key in self._by_recipient.get(recipient, ())]
+        records = [DeliveryRecord(*row) for row in rows] + in_memory
+        records.sort(key=lambda record: record.sent_at)
+        return records
+
+    def ingest_receipts(self, receipts):
+        """Apply delivery receipts in bulk, return the number of records updated
+
+        `receipts` is an iterable of (message_id, status) pairs. Receipts of
+        spilled records are applied to SQLite in a single transaction.
+        """
+        now = self._clock()
+        updated, spilled = 0, []
+        with self._lock:
+            for message_id, status in receipts:
+                key = str(message_id)
+                record = self._records.get(key)
+                if record is None:
+                    spilled.append((status, now, key))
+                    continue
+                record.status, record.updated_at = status, now
+                self._records.move_to_end(key)
+                updated += 1
+            if spilled:
+                with self._db:
+                    before = self._db.total_changes
+                    self._db.executemany("UPDATE deliveries SET status = ?, updated_at = ? WHERE key = ?", spilled)
+                    updated += self._db.total_changes - before
+        return updated
+
+    def evict_idle(self, max_age):
+        """Drop records not updated for `max_age` seconds, return the number dropped"""
+        cutoff = self._clock() - max_age
+        evicted = 0
+        with self._lock:
+            while self._records:
+                key, record = next(iter(self._records.items()))
+                if record.updated_at >= cutoff:
+                    break
+                del self._records[key]
+                self._unindex(key, record.recipient)
+                evicted += 1
+            with self._db:
+                evicted += self._db.execute("DELETE FROM deliveries WHERE updated_at < ?", (cutoff,)).rowcount
+        return evicted
+
+    def close(self):
+        """Close the SQLite connection"""
+        with self._lock:
+            self._db.commit()
+            self._db.close()
@@ -0,0 +1,135 @@
+"""Transports
+
+By default providers call the in-process fakes from `app.fake`. Assigning a
+transport to `provider.TRANSPORT` sends the messages through it instead,
+e.g. over HTTP to `app.fake_gateway` for load tests, or through
+`FakeTransport` to inject latency and failures in-process.
+"""
+import abc
+import http.client
+import json
+import threading
+import time
+from urllib.parse import urlsplit
+
+from app import errors
+from app.new.serializers import serializer_for
+
+
+class Transport(metaclass=abc.ABCMeta):
+    """Base transport class"""
+
+    @abc.abstractmethod
+    def send(self, provider):
+        """Deliver the current message of `provider` and return the API response dict"""
+        pass
+
+    def send_many(self, provider, messages):
+        """Deliver (content, recipient) pairs in one request, return the list of response dicts"""
+        raise NotImplementedError(f"{type(self).__name__} does not support batches")
+
+    def close(self):
+        """Release the resources held by the transport"""
+
+
+class FakeTransport(Transport):
+    """In-process transport calling the provider's fakes after an injected delay
+
+    `latency` is a number of seconds or a callable returning one, e.g. a
+    distribution from `app.fake_gateway`, and `per_message` seconds are added
+    for every message of a batch. `fail` is an optional callable returning
+    True when a request should raise `TransportError`.
+    """
+
+    def __init__(self, latency=0.0, fail=None, sleep=time.sleep, per_message=0.0):
+        self.latency = latency if callable(latency) else (lambda: latency)
+        self.fail = fail
+        self.per_message = per_message
+        self._sleep = sleep
+
+    def _request(self, count=1):
+        delay = self.latency() + self.per_message * count
+        if delay > 0:
+            self._sleep(delay)
+        if self.fail is not None and self.fail():
+            raise errors.TransportError("Injected failure")
+
+    def send(self, provider):
+        """Deliver the current message of `provider` to its fake API"""
+        self._request()
+        return provider._call_api(provider._prepare_payload())  # pylint: disable=protected-access
+
+    def send_many(self, provider, messages):
+        """Deliver (content, recipient) pairs to the batch fake of the provider"""
+        self._request(len(messages))
+        # pylint: disable=protected-access
+        return provider._call_api_many([provider._build_payload(content, recipient) for content, recipient in messages])
+
+
+class HttpTransport(Transport):
+    """JSON over HTTP transport with one persistent connection per thread
+
+    Messages are posted to `<url>/<provider.API_NAME>` (batches to
+    `<url>/<provider.API_NAME>/batch`), encoded with the provider's payload serializer.
+    """
+
+    def __init__(self, url, timeout=5.0):
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port
+        self.prefix = parts.path.rstrip("/")
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = {}  # thread -> its current connection, for close()
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        """Return the connection of the current thread"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+            self._local.connection = connection
+            with self._lock:
+                # a reconnect replaces the closed connection of the thread; exited threads leave theirs behind
+                stale = [thread for thread in self._connections if not thread.is_alive()]
+                stale = [self._connections.pop(thread) for thread in stale]
+                self._connections[threading.current_thread()] = connection
+            for old in stale:
+                old.close()
+        return connection
+
+    def post(self, path, body):
+        """POST JSON bytes and return the decoded response"""
+        connection = self._connection()
+        try:
+            connection.request("POST", self.prefix + path, body, {"Content-Type": "application/json"})
+            response = connection.getresponse()
+            data = response.read()
+        except (OSError, http.client.HTTPException) as exc:
+            # the connection state is unknown - reconnect on the next request
+            connection.close()
+            self._local.connection = None
+            raise errors.TransportError(f"{type(exc).__name__}: {exc}") from exc
+        try:
+            return json.loads(data)
+        except ValueError as exc:
+            raise errors.TransportError(f"Invalid response (HTTP {response.status})") from exc
+
+    def send(self, provider):
+        """Deliver the current message of `provider`"""
+        return self.post("/" + provider.API_NAME, provider.serialize_payload())
+
+    def send_many(self, provider, messages):
+        """Deliver (content, recipient) pairs to the batch endpoint of the provider"""
+        body = serializer_for(provider).encode_many(messages)
+        responses = self.post(f"/{provider.API_NAME}/batch", body)
+        if not isinstance(responses, list):
+            # the whole batch was rejected (e.g. 429) - the status applies to every message
+            return [responses] * len(messages)
+        return responses
+
+    def close(self):
+        """Close the connections of all threads"""
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for connection in connections.values():
+            connection.close()
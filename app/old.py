@@ -1,48 +1,79 @@
-from app import errors
-from app import settings
-from app.fake import fake_primary_external_api, fake_secondary_external_api
+"""Legacy SMS API functions
 
+Thin adapters over the `app.new` providers: they validate with the providers'
+rules (in the legacy order - country, phone number, content), send through
+the same path, hooks and transport as `sms_factory()` providers, and return
+the legacy `(success, response)` tuples. Each thread (or
+`app.new.contexts.provider_context()` block) reuses one provider instance per API.
 
-def sms_primary_api(content, phone, country_code="PL"):
-    """Old Primary SMS API provider"""
-    if country_code and country_code not in settings.COUNTRY_CODES.keys():
-        raise errors.InvalidCountryException("Invalid country code")
-    if not phone.isdigit():
-        raise errors.InvalidPhoneNumber("Invalid phone number")
-    if len(content) > 70:
-        raise errors.InvalidContentLength("Invalid content length")
+Since the country routing table (`app.countries`) replaced the two hardcoded
+country codes, the legacy functions accept every country of the table and
+apply its number length rules - e.g. a PL number must have 9 digits, where
+any digit string used to be sent.
+"""
+from app.new.contexts import current_context
+
+
+def _provider(api):
+    """Return the current context's provider instance for the API"""
+    return current_context().provider(api)
+
+
+def check_sms_primary_api(content, phone, country_code="PL"):
+    """Validate the arguments of `sms_primary_api` without raising - return a `ValidationCode`"""
+    return _provider("primary").check_message(phone, content, country_code)
+
+
+def check_sms_secondary_api(content, phone, country_code="PL"):
+    """Validate the arguments of `sms_secondary_api` without raising - return a `ValidationCode`"""
+    return _provider("secondary").check_message(phone, content, country_code)
 
-    msg = {
-        "content": content,
-        "phone": settings.COUNTRY_CODES[country_code] + phone,
-        "sender": "Alice",
-        "api_key": settings.PRIMARY_API_KEY,
-    }
 
-    response = fake_primary_external_api(msg)
+def _send(api, content, phone, country_code):
+    """Validate and send one message, return (success, response)"""
+    provider = _provider(api)
+    provider.check_message(phone, content, country_code).raise_for()
+    # already validated - skip the validating setters
+    provider.recipient = provider.COUNTRY_CODES[country_code] + str(phone)
+    provider.content = content
+    result = provider.send()
+    return result.success, result.raw
 
-    if response.get("status") == "SENT":
-        return True, response
-    return False, response
+
+def _send_many(api, messages):
+    """Validate all (content, phone[, country_code]) messages, then send them in one request"""
+    provider = _provider(api)
+    batch = []
+    for message in messages:
+        content, phone, country_code = message if len(message) == 3 else (*message, "PL")
+        provider.check_message(phone, content, country_code).raise_for()
+        batch.append((content, provider.COUNTRY_CODES[country_code] + str(phone)))
+    return [(result.success, result.raw) for result in provider.send_batch(batch)]
+
+
+def sms_primary_api(content, phone, country_code="PL"):
+    """Old Primary SMS API provider"""
+    return _send("primary", content, phone, country_code)
 
 
 def sms_secondary_api(content, phone, country_code="PL"):
     """Old Secondary SMS API provider"""
-    if country_code and country_code not in settings.COUNTRY_CODES.keys():
-        raise errors.InvalidCountryException("Invalid country code")
-    if not phone.isdigit():
-        raise errors.InvalidPhoneNumber("Invalid phone number")
-    if len(content) > 160:
-        raise errors.InvalidContentLength("Invalid content length")
+    return _send("secondary", content, phone, country_code)
+
+
+def sms_primary_api_many(messages):
+    """Send many (content, phone[, country_code]) messages through the primary API
 
-    msg = {
-        "body": content,
-        "recipient": settings.COUNTRY_CODES[country_code] + phone,
-        "sender_name": "Alice",
-        "auth_key": settings.SECONDARY_API_KEY,
-    }
+    Every message is validated before anything is sent; the result is a list
+    of `sms_primary_api` tuples in the same order.
+    """
+    return _send_many("primary", messages)
 
-    response = fake_secondary_external_api(msg)
 
-    return response.get("status") == "OK", response
+def sms_secondary_api_many(messages):
+    """Send many (content, phone[, country_code]) messages through the secondary API
 
+    Every message is validated before anything is sent; the result is a list
+    of `sms_secondary_api` tuples in the same order.
+    """
+    return _send_many("secondary", messages)
@@ -1,7 +1,14 @@
+import os
+
 PRIMARY_API_KEY = "alice"
 SECONDARY_API_KEY = "bob"
-COUNTRY_CODES = {
-    "PL": "0048",
-    "DE": "0049",
-}
+# Country routing table - see `app.countries`
+COUNTRIES_FILE = os.path.join(os.path.dirname(__file__), "countries.json")
+
 
+def __getattr__(name):
+    """Load `COUNTRY_CODES` (country -> international prefix) from the routing table on first use"""
+    if name == "COUNTRY_CODES":
+        from app.countries import country_index
+        return country_index().prefixes
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+"""
+Contention benchmark of quota accounting: a global lock per send vs striped counters and leases
+"""
+import argparse
+import statistics
+import threading
+import time
+
+from app.new.accounting import Accountant
+
+
+class LockedAccountant:
+    """Baseline - the same bookkeeping (daily per-tenant limits, sends, spend) under one global lock"""
+
+    def __init__(self, message_limits, segment_limits, prices, clock=time.time):
+        self.message_limits, self.segment_limits, self.prices = message_limits, segment_limits, prices
+        self.used = {}  # (tenant, day) -> [messages, segments], reserved or sent
+        self.sent, self.spend = {}, {}
+        self._clock = clock
+        self._lock = threading.Lock()
+
+    def reserve(self, tenant, api, segments=1):
+        day = int(self._clock() // 86400)
+        with self._lock:
+            used = self.used.setdefault((tenant, day), [0, 0])
+            if used[0] >= self.message_limits.get(tenant, float("inf")):
+                return False
+            if used[1] + segments > self.segment_limits.get(tenant, float("inf")):
+                return False
+            used[0] += 1
+            used[1] += segments
+            return True
+
+    def commit(self, tenant, api, segments=1):
+        with self._lock:
+            sent = self.sent.setdefault((tenant, api), [0, 0])
+            sent[0] += 1
+            sent[1] += segments
+            price = self.prices.get(api)
+            if price:
+                self.spend[api] = self.spend.get(api, 0) + price * segments
+
+
+def run(accountant, threads, per_thread):
+    """Reserve and commit from `threads` threads, return operations per second"""
+    barrier = threading.Barrier(threads + 1)
+
+    def worker():
+        barrier.wait()
+        for _ in range(per_thread):
+            if accountant.reserve("acme", "primary", 1):
+                accountant.commit("acme", "primary", 1)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure quota accounting under contention")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8, 32, 64])
+    parser.add_argument("--operations", type=int, default=400_000, help="Total sends per run")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per variant, the median is reported")
+    args = parser.parse_args()
+
+    limits, prices = {"acme": args.operations * 10}, {"primary": 1}
+    for threads in args.threads:
+        per_thread = args.operations // threads
+        locked = statistics.median(
+            run(LockedAccountant(limits, limits, prices), threads, per_thread) for _ in range(args.repeat)
+        )
+        striped = statistics.median(
+            run(Accountant(limits, limits, prices), threads, per_thread) for _ in range(args.repeat)
+        )
+        print(f"threads {threads:>3}: global lock {locked / 1e6:5.2f} M ops/s, "
+              f"striped {striped / 1e6:5.2f} M ops/s (x{striped / locked:.2f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+Benchmark of a broadcast campaign - one content, many recipients - with and without the content cache
+"""
+import argparse
+import time
+from json.encoder import encode_basestring_ascii as escape
+
+from app.new import content, segments, sms_factory
+from app.new.serializers import serializer_for
+
+
+def timed(label, count, func):
+    """Run func and print the time per message"""
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<44} {elapsed / count * 1e9:7.0f} ns/message  ({elapsed:.2f} s)")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure per-recipient work of a single-content campaign")
+    parser.add_argument("--recipients", type=int, default=1_000_000)
+    parser.add_argument("--batch", type=int, default=1000, help="Messages per bulk request")
+    parser.add_argument("--length", type=int, default=150, help="Content length in characters")
+    args = parser.parse_args()
+
+    text = ("Summer sale: -20% on everything until Sunday [code SUMMER]. Reply STOP to opt out. " * 4)[:args.length]
+    provider = sms_factory("secondary")
+    serializer = serializer_for(provider)
+    pairs = [(text, f"0048{600000000 + index}") for index in range(args.recipients)]
+    batches = [pairs[start:start + args.batch] for start in range(0, len(pairs), args.batch)]
+    head, middle, tail = serializer._head, serializer._middle, serializer._tail
+
+    def uncached():
+        for batch in batches:
+            [segments.segment_count(message) for message, _ in batch]
+            buffer = bytearray(b"[")
+            for message, recipient in batch:
+                if len(buffer) > 1:
+                    buffer += b", "
+                buffer += head
+                buffer += escape(message).encode("ascii")
+                buffer += middle
+                buffer += escape(recipient).encode("ascii")
+                buffer += tail
+            buffer += b"]"
+            bytes(buffer)
+
+    def cached():
+        for batch in batches:
+            [content.segment_count(message) for message, _ in batch]
+            serializer.encode_many(batch)
+
+    timed("segments + payload, recomputed per message", args.recipients, uncached)
+    timed("segments + payload, content cache", args.recipients, cached)
+    print(content.content_info.cache_info())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Thread scaling of senders: one shared provider under a lock, a new provider per message
+and the per-thread provider contexts of `app.new.contexts`
+
+On free-threaded CPython builds (3.13t and later, `python -X gil=0`) the CPU-bound
+sends scale with the cores; with the GIL only the injected I/O latency overlaps.
+"""
+import argparse
+import sys
+import threading
+import time
+
+from app.new import providers, sms_factory
+from app.new.transports import FakeTransport
+
+MODES = ("locked", "factory", "scoped")
+
+
+def _numbers(index, count):
+    start = 600000000 + index * count
+    return range(start, start + count)
+
+
+def run(mode, api, threads, per_thread):
+    """Send from `threads` threads, return messages per second"""
+    barrier = threading.Barrier(threads + 1)
+    shared, lock = sms_factory(api), threading.Lock()
+
+    def locked(index):
+        for number in _numbers(index, per_thread):
+            with lock:
+                shared.set_recipient(number).set_content("Hello").send()
+
+    def factory(index):
+        for number in _numbers(index, per_thread):
+            sms_factory(api).set_recipient(number).set_content("Hello").send()
+
+    def scoped(index):
+        provider = sms_factory(api, scoped=True)
+        for number in _numbers(index, per_thread):
+            provider.set_recipient(number).set_content("Hello").send()
+
+    target = {"locked": locked, "factory": factory, "scoped": scoped}[mode]
+
+    def worker(index):
+        barrier.wait()
+        target(index)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in workers:
+        thread.join()
+    return threads * per_thread / (time.perf_counter() - start)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure sender scaling from 1 to 64 threads")
+    parser.add_argument("--api", default="primary", choices=["primary", "secondary"])
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32, 64])
+    parser.add_argument("--messages", type=int, default=64_000, help="Total messages per run")
+    parser.add_argument("--latency", type=float, default=0.0, help="Injected transport latency in milliseconds")
+    args = parser.parse_args()
+
+    gil = getattr(sys, "_is_gil_enabled", lambda: True)()
+    print(f"Python {sys.version.split()[0]}, GIL {'enabled' if gil else 'disabled'}, latency {args.latency} ms")
+    if args.latency:
+        provider_class = getattr(providers, sms_factory(args.api).__class__.__name__)
+        provider_class.TRANSPORT = FakeTransport(args.latency / 1000)
+    baseline = {}
+    for threads in args.threads:
+        per_thread = max(1, args.messages // threads)
+        rates = {mode: run(mode, args.api, threads, per_thread) for mode in MODES}
+        baseline = baseline or rates
+        print(f"threads {threads:>3}: " + ", ".join(
+            f"{mode} {rates[mode] / 1e3:7.1f} k/s (x{rates[mode] / baseline[mode]:.2f})" for mode in MODES
+        ))
+
+
+if __name__ == "__main__":
+    main()
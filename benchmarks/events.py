@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the send audit log: overhead per send of synchronous logging and of `app.new.events.EventLog`
+"""
+import argparse
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+
+from app.new import sms_factory
+from app.new.events import EventLog
+from app.new.providers import PrimarySmsApiProvider
+from app.new.segments import segment_count
+
+
+class SyncLog:
+    """Baseline: encode and write every event in the send path with `logging`"""
+
+    def __init__(self, path):
+        self.logger = logging.getLogger("benchmark.sends")
+        self.logger.propagate = False
+        self.handler = logging.FileHandler(path)
+        self.logger.addHandler(self.handler)
+
+    def record(self, provider, recipient, content, status, success, latency):
+        self.logger.warning(json.dumps({
+            "ts": time.time(),
+            "provider": provider,
+            "recipient": hashlib.blake2b(recipient.encode(), digest_size=8).hexdigest(),
+            "segments": segment_count(content),
+            "status": status,
+            "success": success,
+            "latency_ms": latency * 1000,
+        }))
+
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+
+def run(messages, event_log):
+    """Send every message with the event log installed, return seconds per send"""
+    PrimarySmsApiProvider.EVENT_LOG = event_log
+    provider = sms_factory("primary").set_content("Your code is 1234")
+    start = time.perf_counter()
+    for phone_number in messages:
+        provider.set_recipient(phone_number).send()
+    elapsed = time.perf_counter() - start
+    PrimarySmsApiProvider.EVENT_LOG = None
+    return elapsed / len(messages)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the overhead of the send audit log")
+    parser.add_argument("--messages", type=int, default=200_000)
+    parser.add_argument("--sample-every", type=int, default=10)
+    args = parser.parse_args()
+
+    messages = [600000000 + index for index in range(args.messages)]
+    with tempfile.TemporaryDirectory() as directory:
+        baseline = run(messages, None)
+        print(f"{'no event log':<36} {baseline * 1e6:6.2f} us/send")
+        candidates = (
+            ("synchronous logging", lambda: SyncLog(os.path.join(directory, "sync.log"))),
+            ("EventLog", lambda: EventLog(os.path.join(directory, "all"))),
+            (f"EventLog (1 in {args.sample_every} successes)",
+             lambda: EventLog(os.path.join(directory, "sampled"), sample_every=args.sample_every)),
+        )
+        for label, factory in candidates:
+            event_log = factory()
+            per_send = run(messages, event_log)
+            start = time.perf_counter()
+            event_log.close()
+            drain = time.perf_counter() - start
+            dropped = getattr(event_log, "stats", {}).get("dropped", 0)
+            print(f"{label:<36} {per_send * 1e6:6.2f} us/send  (+{(per_send - baseline) * 1e6:5.2f} us, "
+                  f"drain {drain:.2f} s, dropped {dropped})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Benchmark of hedged sending: latency percentiles of the primary provider alone and hedged by the secondary one
+"""
+import argparse
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.fake_gateway import parse_latency
+from app.new import sms_factory
+from app.new.hedging import HedgedSender
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.transports import FakeTransport
+
+
+def measure(send, messages, concurrency):
+    """Send every message from `concurrency` threads, return the sorted latencies"""
+    def timed(phone_number):
+        start = time.perf_counter()
+        send(phone_number)
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(concurrency) as pool:
+        return sorted(pool.map(timed, messages))
+
+
+def report(label, latencies):
+    """Print latency percentiles in milliseconds"""
+    def percentile(percent):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * percent / 100))] * 1000
+
+    print(f"{label:<12} p50 {percentile(50):7.1f} ms  p90 {percentile(90):7.1f} ms  "
+          f"p99 {percentile(99):7.1f} ms  max {latencies[-1] * 1000:7.1f} ms")
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure tail latency with and without hedging")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--primary-latency", default="pareto:0.002,1.2", help="Latency spec of the primary API")
+    parser.add_argument("--secondary-latency", default="lognormal:0.004,0.3", help="Latency spec of the secondary API")
+    parser.add_argument("--percentile", type=float, default=95.0)
+    parser.add_argument("--budget", type=float, default=0.1)
+    args = parser.parse_args()
+
+    random.seed(1)
+    PrimarySmsApiProvider.TRANSPORT = FakeTransport(parse_latency(args.primary_latency))
+    SecondarySmsApiProvider.TRANSPORT = FakeTransport(parse_latency(args.secondary_latency))
+    messages = [600000000 + index for index in range(args.messages)]
+
+    def unhedged(phone_number):
+        return sms_factory("primary").set_recipient(phone_number).set_content("Your code is 1234").send()
+
+    report("primary", measure(unhedged, messages, args.concurrency))
+    with HedgedSender(percentile=args.percentile, budget=args.budget, max_workers=args.concurrency * 2) as sender:
+        latencies = measure(lambda phone_number: sender.send(phone_number, "Your code is 1234"), messages,
+                            args.concurrency)
+    report("hedged", latencies)
+    print(sender.stats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the message ID generators against `uuid.uuid4()`
+"""
+import argparse
+import threading
+import time
+import uuid
+
+from app.ids import SnowflakeGenerator, UlidGenerator
+
+
+def run(generate, count, threads):
+    """Generate `count` IDs split across `threads` threads, return IDs per second"""
+    per_thread = count // threads
+
+    def worker():
+        for _ in range(per_thread):
+            generate()
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return per_thread * threads / (time.perf_counter() - start)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compare ID generators with uuid4")
+    parser.add_argument("--count", type=int, default=500_000, help="IDs per run")
+    parser.add_argument("--threads", type=int, nargs="+", default=[1, 8], help="Thread counts")
+    args = parser.parse_args()
+
+    ulid, snowflake = UlidGenerator(), SnowflakeGenerator(worker_id=1)
+    candidates = [
+        ("uuid.uuid4", uuid.uuid4),
+        ("UlidGenerator.new_int", ulid.new_int),
+        ("UlidGenerator.new_id", ulid.new_id),
+        ("SnowflakeGenerator.new_id", snowflake.new_id),
+    ]
+    for threads in args.threads:
+        print(f"threads: {threads}")
+        baseline = None
+        for name, generate in candidates:
+            rate = run(generate, args.count, threads)
+            baseline = baseline or rate
+            print(f"  {name:<28} {rate / 1e6:6.2f} M ids/s  {1e9 / rate:7.0f} ns/id  x{rate / baseline:.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Cold-start benchmark for the `app` package
+Runs `python -X importtime` in fresh interpreters and reports the import cost
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def measure(statement):
+    """Run the statement in a fresh interpreter and return the modules it imported
+
+    Interpreter start-up (everything up to and including `site`) is skipped, so
+    the result is a list of (name, self_us, cumulative_us) for the statement only.
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    modules = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        if name == " site":
+            modules = []
+            continue
+        modules.append((name, int(self_us), int(cumulative_us)))
+    return modules
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the import time of the app package")
+    parser.add_argument("--statement", default="import app.new", help="Python statement to time")
+    parser.add_argument("--runs", type=int, default=20, help="Number of fresh interpreters")
+    parser.add_argument("--max-us", type=int, help="Fail when the median time exceeds this budget")
+    args = parser.parse_args()
+
+    totals, loaded = [], None
+    for _ in range(args.runs):
+        modules = measure(args.statement)
+        totals.append(sum(self_us for _, self_us, _ in modules))
+        loaded = [name.strip() for name, _, _ in modules]
+
+    app_modules = sorted(name for name in loaded if name == "app" or name.startswith("app."))
+    other_modules = sorted(set(loaded) - set(app_modules))
+    median = statistics.median(totals)
+    print(f"statement: {args.statement}")
+    print(f"median import time: {median:.0f} us (min {min(totals)} us, max {max(totals)} us)")
+    print(f"app modules: {', '.join(app_modules)}")
+    print(f"other modules imported: {len(other_modules)}")
+    if args.max_us is not None and median > args.max_us:
+        print(f"✗ import time budget of {args.max_us} us exceeded")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Load generator driving the providers against the fake HTTP gateway
+Reports throughput and latency percentiles
+"""
+import argparse
+import threading
+import time
+
+from app import errors
+from app.fake_gateway import FakeGateway, parse_latency
+from app.new import sms_factory
+from app.new.transports import HttpTransport
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def run_load(url, api, concurrency, messages, timeout):
+    """Send `messages` messages from `concurrency` threads, return (seconds, latencies, outcomes)"""
+    transport = HttpTransport(url, timeout=timeout)
+    per_thread = messages // concurrency
+    latencies = [[] for _ in range(concurrency)]
+    outcomes = {"sent": 0, "rejected": 0, "transport_errors": 0}
+    lock = threading.Lock()
+
+    def worker(out):
+        provider = sms_factory(api)
+        provider.TRANSPORT = transport
+        provider.set_recipient(600123456).set_content("Load test message")
+        counts = dict.fromkeys(outcomes, 0)
+        for _ in range(per_thread):
+            start = time.perf_counter()
+            try:
+                success, _ = provider.send()
+                counts["sent" if success else "rejected"] += 1
+            except errors.TransportError:
+                counts["transport_errors"] += 1
+            out.append(time.perf_counter() - start)
+        with lock:
+            for key, value in counts.items():
+                outcomes[key] += value
+
+    threads = [threading.Thread(target=worker, args=(out,)) for out in latencies]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    transport.close()
+    return elapsed, sorted(value for out in latencies for value in out), outcomes
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Load-test the providers against the fake gateway")
+    parser.add_argument("--url", help="Gateway URL - by default a gateway is started in-process")
+    parser.add_argument("--api", default="primary", choices=["primary", "secondary"])
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--timeout", type=float, default=5.0, help="Client timeout in seconds")
+    parser.add_argument("--latency", help="Gateway latency, e.g. lognormal:0.005,0.5")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit", type=float)
+    args = parser.parse_args()
+
+    gateway = None
+    url = args.url
+    if url is None:
+        gateway = FakeGateway(latency=parse_latency(args.latency), error_rate=args.error_rate,
+                              rate_limit=args.rate_limit)
+        url = gateway.start()
+    try:
+        elapsed, latencies, outcomes = run_load(url, args.api, args.concurrency, args.messages, args.timeout)
+    finally:
+        if gateway is not None:
+            gateway.stop()
+
+    total = len(latencies)
+    print(f"gateway: {url}  api: {args.api}  concurrency: {args.concurrency}")
+    print(f"messages: {total} in {elapsed:.2f} s -> {total / elapsed:.0f} msg/s")
+    print("outcomes: " + ", ".join(f"{key}={value}" for key, value in outcomes.items()))
+    for label, fraction in (("p50", 0.5), ("p90", 0.9), ("p99", 0.99), ("p99.9", 0.999), ("max", 1.0)):
+        print(f"  {label:<6} {percentile(latencies, fraction) * 1e3:8.2f} ms")
+    if gateway is not None:
+        print("gateway stats: " + ", ".join(f"{key}={value}" for key, value in gateway.stats.items()))
+
+
+if __name__ == "__main__":
+    main()
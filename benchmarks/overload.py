@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Overload benchmark: latency and memory of the admitted sender pool of `app.new.admission`
+at 1x to 10x its sustainable load, compared with an unbounded queue
+"""
+import argparse
+import math
+import threading
+import time
+
+from app import errors
+from app.new.admission import HIGH, LOW, NORMAL, AdmissionQueue, AdmittedSender
+from app.new.metrics import Metrics
+from app.new.providers import PrimarySmsApiProvider
+from app.new.transports import FakeTransport
+
+PRIORITIES = (HIGH, NORMAL, NORMAL, LOW, LOW)
+
+
+def _percentile(values, percent):
+    if not values:
+        return float("nan")
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+def run(queue, workers, rate, duration):
+    """Offer `rate` messages/s for `duration` seconds, return the statistics of the run"""
+    latencies, outcomes = [], {"sent": 0, "rejected": 0, "shed": 0}
+    lock = threading.Lock()
+
+    def done(submitted, future):
+        with lock:
+            if future.exception() is None:
+                outcomes["sent"] += 1
+                latencies.append(time.perf_counter() - submitted)
+            else:
+                outcomes["shed"] += 1
+
+    with AdmittedSender("primary", workers, queue) as sender:
+        start = time.perf_counter()
+        offered = 0
+        while (now := time.perf_counter()) - start < duration:
+            # submit everything due by now, in 1 ms steps
+            for _ in range(int((now - start) * rate) - offered):
+                offered += 1
+                submitted = time.perf_counter()
+                try:
+                    future = sender.submit(600000000 + offered, "Hello", priority=PRIORITIES[offered % 5])
+                except errors.Overloaded:
+                    outcomes["rejected"] += 1
+                    continue
+                future.add_done_callback(lambda future, submitted=submitted: done(submitted, future))
+            time.sleep(0.001)
+        intake_end = time.perf_counter()
+    return {
+        "offered": offered, "outcomes": outcomes, "drain": time.perf_counter() - intake_end,
+        "p50": _percentile(latencies, 50), "p99": _percentile(latencies, 99),
+        "max_depth": queue.stats["max_depth"], "memory_peak": queue.stats["memory_peak"],
+    }
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the sender pool under overload")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=2.0, help="Injected send latency in milliseconds")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of offered load per run")
+    parser.add_argument("--load", type=float, nargs="+", default=[1, 2, 5, 10], help="Multiples of the capacity")
+    parser.add_argument("--capacity", type=int, default=10_000, help="Queue capacity with admission control")
+    args = parser.parse_args()
+
+    PrimarySmsApiProvider.TRANSPORT = FakeTransport(args.latency / 1000)
+    capacity = run(AdmissionQueue(math.inf, math.inf, math.inf, metrics=Metrics()), args.workers, 1e5, 0.5)
+    sustainable = capacity["outcomes"]["sent"] / (0.5 + capacity["drain"])
+    print(f"sustainable load ~{sustainable:.0f} messages/s with {args.workers} workers and {args.latency} ms latency")
+    for load in args.load:
+        for name, queue in (
+            ("unbounded", AdmissionQueue(math.inf, math.inf, math.inf, metrics=Metrics())),
+            ("admission", AdmissionQueue(args.capacity, metrics=Metrics())),
+        ):
+            stats = run(queue, args.workers, load * sustainable, args.duration)
+            outcomes = stats["outcomes"]
+            print(
+                f"{load:4.0f}x {name:>9}: offered {stats['offered']:6d}, sent {outcomes['sent']:6d}, "
+                f"rejected {outcomes['rejected']:6d}, shed {outcomes['shed']:5d}, "
+                f"latency p50 {stats['p50'] * 1000:8.1f} ms p99 {stats['p99'] * 1000:8.1f} ms, "
+                f"max queue {stats['max_depth']:6d}, drain {stats['drain']:5.2f} s, "
+                f"RSS peak {stats['memory_peak'] / 2**20:6.1f} MiB"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Benchmark of per-send recipient handling: raw phone numbers vs validated `Recipient` handles
+"""
+import argparse
+import timeit
+
+from app.new import sms_factory
+from app.new.recipients import validate_recipient
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the cost saved by validated recipient handles")
+    parser.add_argument("--api", default="primary", choices=["primary", "secondary"])
+    parser.add_argument("--number", type=int, default=200_000)
+    args = parser.parse_args()
+
+    provider = sms_factory(args.api).set_content("Your code is 123456")
+    recipient = validate_recipient(600123456, "PL")
+    cases = [
+        ("set_recipient(600123456, 'PL')", lambda: provider.set_recipient(600123456, "PL")),
+        ("set_recipient(Recipient)", lambda: provider.set_recipient(recipient)),
+        ("set_recipient(600123456).send()", lambda: provider.set_recipient(600123456, "PL").send()),
+        ("set_recipient(Recipient).send()", lambda: provider.set_recipient(recipient).send()),
+    ]
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=args.number)
+        print(f"{name:<34} {seconds / args.number * 1e9:7.0f} ns/message")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark of scheduled sending: bulk scheduling, wake-up queries and batch release with a simulated clock
+"""
+import argparse
+import random
+import time
+
+from app.new.scheduling import Scheduler
+
+
+class SimulatedClock:
+    """Clock advanced by the benchmark"""
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def timed(label, count, func):
+    """Run func and print the time per item"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / count * 1e9:8.0f} ns/item  ({count} items, {elapsed:.2f} s)")
+    return result
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the scheduled sending queue")
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--span", type=float, default=86400.0, help="Seconds the schedule is spread over")
+    parser.add_argument("--step", type=float, default=60.0, help="Simulated seconds between dispatches")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--path", default=":memory:", help="SQLite file of the queue")
+    args = parser.parse_args()
+
+    start = 1_700_000_000.0
+    clock = SimulatedClock(start)
+    scheduler = Scheduler(args.path, batch_size=args.batch_size, clock=clock)
+    rng = random.Random(1)
+    entries = [(start + rng.random() * args.span, 600000000 + index, "Reminder: your visit is tomorrow")
+               for index in range(args.messages)]
+    timed("schedule_many", args.messages, lambda: scheduler.schedule_many(entries))
+    timed("next_due", 10_000, lambda: [scheduler.next_due() for _ in range(10_000)])
+
+    def release():
+        sent = wakeups = 0
+        while clock.now < start + args.span + args.step:
+            clock.now += args.step
+            sent += scheduler.dispatch_due()
+            wakeups += 1
+        return sent, wakeups
+
+    sent, wakeups = timed("dispatch_due (send_batch)", args.messages, release)
+    print(f"sent: {sent}, wake-ups: {wakeups}, left: {len(scheduler)}")
+    scheduler.close()
+
+
+if __name__ == "__main__":
+    main()
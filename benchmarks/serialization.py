@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Benchmark of payload encoding: `json.dumps` of the payload dict vs `app.new.serializers`
+"""
+import argparse
+import json
+import timeit
+
+from app.new import sms_factory
+from app.new.serializers import serializer_for
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compare payload encoding strategies")
+    parser.add_argument("--api", default="secondary", choices=["primary", "secondary"])
+    parser.add_argument("--number", type=int, default=200_000, help="Messages per measurement")
+    parser.add_argument("--batch", type=int, default=1000, help="Messages per bulk request")
+    args = parser.parse_args()
+
+    provider = sms_factory(args.api).set_recipient(600123456).set_content("Your code is 123456")
+    serializer = serializer_for(provider)
+    content, recipient = provider.content, provider.recipient
+    batch = [(content, recipient)] * args.batch
+    cases = [
+        ("json.dumps(_prepare_payload())", lambda: json.dumps(provider._prepare_payload()).encode()),
+        ("serializer.encode()", lambda: serializer.encode(content, recipient)),
+    ]
+    for name, func in cases:
+        seconds = timeit.timeit(func, number=args.number)
+        print(f"{name:<34} {seconds / args.number * 1e9:7.0f} ns/message")
+
+    batches = max(1, args.number // args.batch)
+    payloads = [provider._prepare_payload() for _ in range(args.batch)]
+    bulk_cases = [
+        ("json.dumps([payloads])", lambda: json.dumps(payloads).encode()),
+        ("serializer.encode_many()", lambda: serializer.encode_many(batch)),
+    ]
+    for name, func in bulk_cases:
+        seconds = timeit.timeit(func, number=batches)
+        print(f"{name:<34} {seconds / (batches * args.batch) * 1e9:7.0f} ns/message (batch of {args.batch})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Recurring campaign benchmark: re-sending a daily contact list to everyone compared with
+sending only the delta found by the list snapshots of `app.new.snapshots`
+"""
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+from app.new import sms_factory
+from app.new.snapshots import ListSnapshot, send_changes
+
+
+def contacts(count, day, churn):
+    """Yield the contact rows of a day: `churn` of the list is replaced and as many change their field"""
+    replaced = int(count * churn)
+    for index in range(count):
+        number = 700000000 + day * count + index if index < replaced else 600000000 + index
+        greeting = f"Hello {index} day {day}" if replaced <= index < 2 * replaced else f"Hello {index}"
+        yield str(number), "PL", greeting
+
+
+def full_send(provider, rows, batch_size):
+    """Validate and send every row"""
+    batch = []
+    for phone_number, country_code, content in rows:
+        batch.append(provider.prepare_message(phone_number, content, country_code))
+        if len(batch) == batch_size:
+            provider.send_batch(batch)
+            batch = []
+    if batch:
+        provider.send_batch(batch)
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure incremental sends of a recurring campaign")
+    parser.add_argument("--contacts", type=int, default=500_000)
+    parser.add_argument("--churn", type=float, default=0.01, help="Share of contacts replaced (and changed) per day")
+    parser.add_argument("--chunk-size", type=int, default=100_000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+
+    provider = sms_factory("secondary")
+    start = time.perf_counter()
+    full_send(provider, contacts(args.contacts, 1, args.churn), args.batch)
+    print(f"full list:  {time.perf_counter() - start:6.2f} s, {args.contacts} messages")
+
+    with tempfile.TemporaryDirectory() as directory:
+        snapshot = ListSnapshot(os.path.join(directory, "campaign.snapshot"), chunk_size=args.chunk_size)
+        with snapshot.update(contacts(args.contacts, 0, args.churn)) as changes:
+            for _ in changes:
+                pass
+        start = time.perf_counter()
+        with snapshot.update(contacts(args.contacts, 1, args.churn)) as changes:
+            stats = send_changes(provider, changes, batch_size=args.batch)
+        elapsed = time.perf_counter() - start
+        diff = dict(snapshot.stats)
+        # a second pass over the same list, traced for memory only
+        tracemalloc.start()
+        with snapshot.update(contacts(args.contacts, 1, args.churn)) as changes:
+            for _ in changes:
+                pass
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        size = os.path.getsize(snapshot.path)
+    print(f"delta only: {elapsed:6.2f} s, {stats['sent']} messages "
+          f"(added {diff['added']}, changed {diff['changed']}, removed {diff['removed']}), "
+          f"diff peak memory {peak / 2**20:.1f} MiB, snapshot {size / 2**20:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the opt-out list: lookup latency and memory per million entries
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from app.new.suppression import SuppressionList
+
+
+def timed(label, keys, contains):
+    """Look up every key and print the time per lookup"""
+    start = time.perf_counter()
+    for key in keys:
+        contains(key)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<40} {elapsed / len(keys) * 1e9:8.0f} ns/lookup")
+
+
+def allocated(func):
+    """Return func() and the bytes it left allocated"""
+    tracemalloc.start()
+    result = func()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the opt-out list")
+    parser.add_argument("--entries", type=int, default=5_000_000)
+    parser.add_argument("--lookups", type=int, default=200_000)
+    parser.add_argument("--bloom-bits", type=int, default=10, help="Bloom filter bits per entry")
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    numbers = rng.sample(range(48500000000, 48800000000), args.entries)
+    hits = [f"00{number}" for number in rng.sample(numbers, args.lookups)]
+    suppressed = set(numbers)
+    misses = []
+    while len(misses) < args.lookups:
+        number = rng.randrange(48500000000, 48800000000)
+        if number not in suppressed:
+            misses.append(f"00{number}")
+    del suppressed
+    millions = args.entries / 1e6
+
+    as_set, set_size = allocated(lambda: set(map(int, map(str, numbers))))  # fresh int objects, as when loaded
+    plain, plain_size = allocated(lambda: SuppressionList(numbers))
+    bloom, bloom_size = allocated(lambda: SuppressionList(numbers, bloom_bits=args.bloom_bits))
+    print(f"{'set of ints':<40} {set_size / millions / 2**20:8.1f} MB/million")
+    print(f"{'sorted array':<40} {plain_size / millions / 2**20:8.1f} MB/million")
+    print(f"{'sorted array + Bloom filter':<40} {bloom_size / millions / 2**20:8.1f} MB/million")
+
+    timed("set (hit)", hits, lambda key: int(key) in as_set)
+    timed("set (miss)", misses, lambda key: int(key) in as_set)
+    for label, suppression in (("sorted array", plain), ("sorted array + Bloom filter", bloom)):
+        timed(f"{label} (hit)", hits, suppression.__contains__)
+        timed(f"{label} (miss)", misses, suppression.__contains__)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "optout.bin")
+        plain.save(path)
+        mapped, mapped_size = allocated(lambda: SuppressionList.open(path))
+        print(f"{'memory-mapped (process heap)':<40} {mapped_size / millions / 2**20:8.1f} MB/million")
+        timed("memory-mapped (hit)", hits, mapped.__contains__)
+        timed("memory-mapped (miss)", misses, mapped.__contains__)
+        mapped.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Benchmark of the delivery tracking store: record, receipt ingestion and lookups at scale
+"""
+import argparse
+import random
+import time
+
+from app.new.tracking import DeliveryStore
+
+
+def timed(label, count, func):
+    """Run func and print the time per item"""
+    start = time.perf_counter()
+    result = func()
+    elapsed = time.perf_counter() - start
+    print(f"{label:<32} {elapsed / count * 1e9:8.0f} ns/item  ({count} items, {elapsed:.2f} s)")
+    return result
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Measure the delivery tracking store")
+    parser.add_argument("--records", type=int, default=1_000_000)
+    parser.add_argument("--max-memory", type=int, default=500_000, help="Records kept in memory before spilling")
+    parser.add_argument("--lookups", type=int, default=100_000)
+    parser.add_argument("--path", default=":memory:", help="SQLite file for spilled records")
+    args = parser.parse_args()
+
+    store = DeliveryStore(args.path, max_memory=args.max_memory)
+    recipients = [f"0048{600000000 + index % 1_000_000}" for index in range(args.records)]
+
+    def record():
+        for index, recipient in enumerate(recipients):
+            store.record_sent("secondary", f"m{index}", recipient, "OK")
+
+    timed("record_sent", args.records, record)
+    rng = random.Random(1)
+    receipts = [(f"m{rng.randrange(args.records)}", "DELIVERED") for _ in range(args.lookups)]
+    timed("ingest_receipts (bulk)", len(receipts), lambda: store.ingest_receipts(receipts))
+    hot = [f"m{rng.randrange(args.records - args.max_memory // 2, args.records)}" for _ in range(args.lookups)]
+    cold = [f"m{rng.randrange(args.records // 2)}" for _ in range(args.lookups)]
+    timed("status (in memory)", len(hot), lambda: [store.status(key) for key in hot])
+    timed("status (spilled)", len(cold), lambda: [store.status(key) for key in cold])
+    sample = rng.sample(recipients, min(args.lookups, len(recipients)))
+    timed("for_recipient", len(sample), lambda: [store.for_recipient(recipient) for recipient in sample])
+    print(f"records: {len(store)}, in memory: {store.in_memory}")
+    store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark of raising validation vs result codes on an import with bad rows
+"""
+import argparse
+import random
+import time
+
+from app import errors
+from app.new import sms_factory
+
+
+def make_rows(count, bad_fraction, seed=1):
+    """Return (phone_number, content, country_code) rows with a fraction of invalid ones"""
+    rng = random.Random(seed)
+    bad_rows = [("600-123-456", "Hello", "PL"), ("600123456", "A" * 200, "PL"), ("600123456", "Hello", "XX")]
+    return [
+        rng.choice(bad_rows) if rng.random() < bad_fraction else (str(600000000 + index), "Hello", "PL")
+        for index in range(count)
+    ]
+
+
+def with_exceptions(provider, rows):
+    """Validate rows with the raising setters"""
+    valid = 0
+    for phone_number, content, country_code in rows:
+        try:
+            provider.set_recipient(phone_number, country_code).set_content(content)
+            valid += 1
+        except errors.BaseError:
+            pass
+    return valid
+
+
+def with_validators(provider, rows):
+    """Validate rows with the raising validators only, without the setters"""
+    valid = 0
+    for phone_number, content, country_code in rows:
+        try:
+            provider._validate_set_recipient(phone_number, country_code)
+            provider._validate_set_content(content)
+            valid += 1
+        except errors.BaseError:
+            pass
+    return valid
+
+
+def with_codes(provider, rows):
+    """Validate rows with the non-raising API"""
+    valid = 0
+    check_message = provider.check_message
+    for phone_number, content, country_code in rows:
+        if not check_message(phone_number, content, country_code):
+            valid += 1
+    return valid
+
+
+def main():
+    """Main function"""
+    parser = argparse.ArgumentParser(description="Compare raising validation with result codes")
+    parser.add_argument("--api", default="primary", choices=["primary", "secondary"])
+    parser.add_argument("--rows", type=int, default=300_000)
+    parser.add_argument("--bad", type=float, nargs="+", default=[0.0, 0.1, 0.2])
+    args = parser.parse_args()
+
+    provider = sms_factory(args.api)
+    for bad_fraction in args.bad:
+        rows = make_rows(args.rows, bad_fraction)
+        print(f"bad rows: {bad_fraction:.0%}")
+        for name, func in (
+            ("setters", with_exceptions), ("validators", with_validators), ("result codes", with_codes)
+        ):
+            start = time.perf_counter()
+            valid = func(provider, rows)
+            elapsed = time.perf_counter() - start
+            print(f"  {name:<12} {elapsed / len(rows) * 1e9:6.0f} ns/row  ({valid} valid)")
+
+
+if __name__ == "__main__":
+    main()
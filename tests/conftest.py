@@ -0,0 +1,21 @@
+"""Shared test fixtures"""
+import pytest
+
+
+class FakeClock:
+    """Manually advanced clock; `sleep` advances it too"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    """Return a fake clock starting at 1000.0"""
+    return FakeClock()
@@ -0,0 +1,139 @@
+"""Tests for quota and spend accounting"""
+import threading
+
+import pytest
+
+from app import errors
+from app.new import sms_factory
+from app.new.accounting import Accountant
+from app.new.segments import GSM7, UCS2, encoding, segment_count
+from app.new.tenants import TenantConfig, TenantRegistry
+
+
+def _run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def test_quota_is_exact_across_threads():
+    """Test that concurrent reservations never exceed the limit, leases of stopped threads come back"""
+    accountant = Accountant(message_limits={"acme": 1000}, lease_size=32)
+    granted = []
+
+    def worker():
+        count = 0
+        for _ in range(200):
+            if accountant.reserve("acme", "primary"):
+                accountant.commit("acme", "primary")
+                count += 1
+        granted.append(count)
+
+    _run_threads(32, worker)
+    assert sum(granted) == 1000
+    assert accountant.usage("acme")["messages"] == 1000
+    accountant.merge()
+    assert accountant.usage("acme")["messages"] == 1000
+    assert accountant.sent("acme", "primary") == (1000, 1000)
+
+
+def test_leases_of_exited_threads_are_reclaimed():
+    """Test that quota leased by a thread that stopped is available to the others"""
+    accountant = Accountant(message_limits={"acme": 100}, lease_size=64)
+    _run_threads(1, lambda: accountant.reserve("acme", "primary") and accountant.commit("acme", "primary"))
+    reserved = 0
+    while accountant.reserve("acme", "primary"):
+        reserved += 1
+    assert reserved == 99
+
+
+def test_release_after_day_rollover():
+    """Test that a reservation released on the next day does not add to that day's quota"""
+    now = [86400 - 1.0]
+    accountant = Accountant(message_limits={"acme": 1}, lease_size=1, clock=lambda: now[0])
+    assert accountant.reserve("acme", "primary")
+    now[0] += 2
+    accountant.release("acme", "primary")
+    assert accountant.reserve("acme", "primary")
+    assert not accountant.reserve("acme", "primary")
+
+
+def test_accountant_daily_limits():
+    """Test message and segment limits per tenant and the day rollover"""
+    now = [0.0]
+    accountant = Accountant(message_limits={"acme": 2}, segment_limits={"acme": 3}, lease_size=1,
+                            clock=lambda: now[0])
+    assert accountant.reserve("acme", "primary", 1)
+    accountant.commit("acme", "primary", 1)
+    assert accountant.reserve("acme", "primary", 2)
+    accountant.commit("acme", "primary", 2)
+    assert not accountant.reserve("acme", "primary", 1)
+    assert accountant.reserve("other", "primary", 1)
+    assert accountant.usage("acme") == {"messages": 2, "segments": 3}
+    now[0] += 86400
+    assert accountant.reserve("acme", "primary", 1)
+    assert accountant.usage("acme") == {"messages": 0, "segments": 0}
+
+
+def test_accountant_spend():
+    """Test that spend is counted per provider and segment"""
+    accountant = Accountant(prices={"primary": 3, "secondary": 2})
+    accountant.commit(None, "primary", 1)
+    accountant.commit(None, "secondary", 2)
+    accountant.commit("acme", "secondary", 1)
+    assert accountant.spend("primary") == 3
+    assert accountant.spend("secondary") == 6
+    assert accountant.sent("acme", "secondary") == (1, 1)
+
+
+def test_provider_send_enforces_quota():
+    """Test that providers reserve and commit quota around sends"""
+    accountant = Accountant(message_limits={None: 1}, prices={"primary": 1}, lease_size=1)
+    provider = sms_factory("primary")
+    provider.ACCOUNTANT = accountant
+    provider.set_recipient(600123456).set_content("Hello")
+    assert provider.send()[0] is True
+    with pytest.raises(errors.QuotaExceeded):
+        provider.send()
+    assert accountant.spend("primary") == 1
+
+
+def test_failed_send_releases_quota():
+    """Test that unsuccessful sends do not use quota"""
+    accountant = Accountant(message_limits={None: 1}, lease_size=1)
+    provider = sms_factory("primary")
+    provider.ACCOUNTANT = accountant
+    provider.API_KEY = "wrong"
+    provider.set_recipient(600123456).set_content("Hello")
+    assert provider.send()[0] is False
+    assert accountant.usage(None)["messages"] == 0
+    provider.API_KEY = "alice"
+    assert provider.send()[0] is True
+
+
+def test_batch_quota_is_all_or_nothing():
+    """Test that a batch over quota sends nothing"""
+    accountant = Accountant(message_limits={"acme": 3}, lease_size=1)
+    registry = TenantRegistry([TenantConfig("acme", {"secondary": "bob"})])
+    provider = registry.provider_class("acme", "secondary")()
+    provider.ACCOUNTANT = accountant
+    assert len(provider.send_many([(600123456, "One"), (600123457, "Two")])) == 2
+    with pytest.raises(errors.QuotaExceeded):
+        provider.send_many([(600123456, "One"), (600123457, "Two")])
+    assert accountant.usage("acme")["messages"] == 2
+    assert provider.send_many([(600123456, "Three")])[0][0] is True
+
+
+def test_segments():
+    """Test encoding detection and segment counts"""
+    assert encoding("Hello {name}") == GSM7
+    assert encoding("Zażółć") == UCS2
+    assert segment_count("A" * 160) == 1
+    assert segment_count("A" * 161) == 2
+    assert segment_count("€" * 80) == 1
+    assert segment_count("€" * 81) == 2
+    assert segment_count("ż" * 70) == 1
+    assert segment_count("ż" * 71) == 2
+    assert segment_count("😀" * 36) == 2
@@ -0,0 +1,168 @@
+"""Tests for adaptive batch sizing"""
+import pytest
+
+from app.fake_gateway import uniform
+from app.new import sms_factory
+from app.new.adaptive import BatchController
+from app.new.dispatch import Dispatcher
+from app.new.metrics import Metrics
+from app.new.providers import PrimarySmsApiProvider
+from app.new.scheduling import Scheduler
+from app.new.transports import FakeTransport
+
+
+@pytest.fixture
+def metrics():
+    return Metrics()
+
+
+def _controller(clock, metrics, **kwargs):
+    options = {"name": "primary", "latency_ceiling": 1.0, "max_size": 100, "step": 10, "max_window": 4}
+    options.update(kwargs)
+    return BatchController(metrics=metrics, clock=clock, **options)
+
+
+def _batch(controller, clock, latency, errors=0, size=None):
+    token = controller.acquire()
+    clock.sleep(latency)
+    return controller.release(token, controller.batch_size if size is None else size, errors)
+
+
+def test_grows_size_then_window(clock, metrics):
+    """Test fast batches grow the batch size additively up to the maximum, then the window"""
+    controller = _controller(clock, metrics)
+    assert (controller.batch_size, controller.window) == (10, 1)
+    decisions = [_batch(controller, clock, 0.1) for _ in range(12)]
+    assert decisions[:9] == ["increase"] * 9
+    assert decisions[9:] == ["widen"] * 3
+    assert (controller.batch_size, controller.window) == (100, 4)
+    assert _batch(controller, clock, 0.1) == "hold"
+
+
+def test_partial_batches_do_not_grow(clock, metrics):
+    """Test a batch smaller than the current size says nothing about the size"""
+    controller = _controller(clock, metrics)
+    assert _batch(controller, clock, 0.1, size=3) == "hold"
+    assert controller.batch_size == 10
+
+
+def test_slow_batch_halves_size_once(clock, metrics):
+    """Test a batch over the ceiling halves the size and batches in flight before do not halve it again"""
+    controller = _controller(clock, metrics, initial_size=90, max_window=2)
+    _batch(controller, clock, 0.1)
+    _batch(controller, clock, 0.1)
+    assert (controller.batch_size, controller.window) == (100, 2)
+    first, second = controller.acquire(), controller.acquire()
+    clock.sleep(1.5)
+    assert controller.release(first, 100) == "decrease"
+    assert controller.release(second, 100) == "hold"
+    assert controller.batch_size == 50
+    assert _batch(controller, clock, 1.5) == "decrease"
+    assert controller.batch_size == 25
+
+
+def test_window_narrows_at_minimal_size(clock, metrics):
+    """Test the window shrinks when smaller batches cannot help any more"""
+    controller = _controller(clock, metrics, min_size=10, initial_size=100)
+    for _ in range(3):
+        _batch(controller, clock, 0.1)
+    assert controller.window == 4
+    decisions = [_batch(controller, clock, 2.0) for _ in range(6)]
+    assert decisions == ["decrease", "decrease", "decrease", "decrease", "narrow", "narrow"]
+    assert (controller.batch_size, controller.window) == (10, 1)
+
+
+def test_errors_back_off(clock, metrics):
+    """Test an error rate over the threshold halves size and window"""
+    controller = _controller(clock, metrics, initial_size=100)
+    for _ in range(3):
+        _batch(controller, clock, 0.1)
+    assert _batch(controller, clock, 0.1, errors=100) == "backoff"
+    assert (controller.batch_size, controller.window) == (50, 2)
+    assert controller.error_rate == pytest.approx(0.3)
+
+
+def test_window_limits_in_flight(clock, metrics):
+    """Test acquire blocks (here: times out) while the window is full"""
+    controller = _controller(clock, metrics)
+    token = controller.acquire()
+    assert controller.acquire(timeout=0.01) is None
+    assert controller.release(None, 1) is None
+    controller.release(token, 1)
+    assert controller.acquire(timeout=0.01) is not None
+
+
+def test_decisions_are_published(clock, metrics):
+    """Test the limits and decisions are visible in the metrics"""
+    controller = _controller(clock, metrics)
+    _batch(controller, clock, 0.25)
+    _batch(controller, clock, 2.0)
+    assert metrics.value("batch_size", provider="primary") == controller.batch_size == 10
+    assert metrics.value("batch_window", provider="primary") == 1
+    assert metrics.value("batch_decisions", provider="primary", decision="increase") == 1
+    assert metrics.value("batch_decisions", provider="primary", decision="decrease") == 1
+    assert metrics.value("batch_latency_seconds", provider="primary") == pytest.approx(0.775)
+    assert controller.stats["increase"] == controller.stats["decrease"] == 1
+
+
+class ShiftingTransport(FakeTransport):
+    """Fake transport recording batch sizes whose per-message latency rises after `shift_after` batches"""
+
+    def __init__(self, shift_after, per_message_after, **kwargs):
+        super().__init__(**kwargs)
+        self.shift_after, self.per_message_after = shift_after, per_message_after
+        self.sizes = []
+
+    def send_many(self, provider, messages):
+        self.sizes.append(len(messages))
+        if len(self.sizes) == self.shift_after:
+            self.per_message = self.per_message_after
+        return super().send_many(provider, messages)
+
+
+def test_scheduler_follows_changing_latency(monkeypatch, clock, metrics):
+    """Test batch sizes track a provider whose per-message latency changes over time"""
+    transport = ShiftingTransport(60, 0.01, latency=0.05, sleep=clock.sleep, per_message=0.002)
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", transport)
+    controller = _controller(clock, metrics, max_size=1000, step=20)
+    scheduler = Scheduler(clock=clock, controller=controller)
+    scheduler.schedule_many([(0, 600000000 + index, "Hello") for index in range(30000)])
+    assert scheduler.dispatch_due(now=0) == 30000
+    scheduler.close()
+    sizes = transport.sizes
+    # 0.05 + 0.002 * size stays under the 0.8 s headroom up to 375 messages
+    assert sizes[:5] == [10, 30, 50, 70, 90]
+    assert 375 <= sizes[59] <= 475
+    # then the 1 s ceiling allows at most 95 messages per batch
+    assert sizes[60] < sizes[59]
+    assert max(sizes[80:]) <= 95
+    assert controller.stats["decrease"] >= 2
+
+
+def test_dispatcher_with_controller(monkeypatch, metrics):
+    """Test the dispatcher sends everything with controller-sized batches and a bounded window"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(uniform(0, 0.002), per_message=0.00002))
+    controller = BatchController(
+        "primary", latency_ceiling=0.05, initial_size=5, max_size=200, max_window=3, metrics=metrics,
+    )
+    sizes, in_flight = [], []
+    original = controller.acquire
+
+    def acquire(timeout=None):
+        token = original(timeout)
+        in_flight.append(controller._in_flight)  # pylint: disable=protected-access
+        return token
+
+    controller.acquire = acquire
+    messages = [(600000000 + index, "Hello") for index in range(5000)]
+    dispatcher = Dispatcher(
+        sms_factory("primary"), messages, workers=4, controller=controller,
+        on_result=lambda position, message, result: sizes.append(result.success),
+    ).start()
+    assert dispatcher.wait(10)
+    dispatcher.stop(1)
+    assert len(sizes) == 5000 and all(sizes)
+    assert dispatcher.stats["sent"] == 5000
+    assert controller.batch_size > 5
+    assert max(in_flight) <= 3
+    assert dispatcher.stats["batches"] < 5000 / 5
@@ -0,0 +1,220 @@
+"""Tests for admission control"""
+import threading
+import time
+
+import pytest
+
+from app import errors
+from app.new.admission import HIGH, LOW, NORMAL, AdmissionQueue, AdmittedSender, rss_bytes
+from app.new.metrics import Metrics
+from app.new.providers import PrimarySmsApiProvider
+from app.new.transports import FakeTransport
+
+
+def _queue(clock, **kwargs):
+    options = {"capacity": 10, "target": 0.005, "interval": 0.1, "memory": None, "metrics": Metrics(), "clock": clock}
+    options.update(kwargs)
+    return AdmissionQueue(**options)
+
+
+def test_bounded(clock):
+    """Test a full queue refuses every priority"""
+    queue = _queue(clock, capacity=3)
+    for index in range(3):
+        queue.put(index, HIGH)
+    with pytest.raises(errors.Overloaded):
+        queue.put(3, HIGH)
+    assert queue.stats["rejected"] == 1
+    assert queue.stats["max_depth"] == 3
+
+
+def test_priority_order(clock):
+    """Test higher priorities are taken first, in arrival order within a priority"""
+    queue = _queue(clock)
+    for item, priority in [("l", LOW), ("n1", NORMAL), ("h", HIGH), ("n2", NORMAL)]:
+        queue.put(item, priority)
+    assert [queue.get(0)[0] for _ in range(4)] == ["h", "n1", "n2", "l"]
+    assert queue.get(0) is None
+
+
+def test_low_priority_rejected_first(clock):
+    """Test low priority goes on delay, normal on a standing queue, high only on a standing high-priority queue"""
+    queue = _queue(clock)
+    queue.put("first")
+    clock.now += 0.01
+    with pytest.raises(errors.Overloaded, match="delay"):
+        queue.put("bulk", LOW)
+    queue.put("normal")
+    assert not queue.overloaded
+    clock.now += 0.095
+    assert queue.overloaded
+    with pytest.raises(errors.Overloaded, match="standing queue"):
+        queue.put("normal")
+    queue.put("otp", HIGH)
+    assert queue.metrics.value("admission_rejected", queue="default", priority="low", reason="delay") == 1
+
+
+def test_recovers_when_queue_drains(clock):
+    """Test admission resumes once the queue delay is back under the target"""
+    queue = _queue(clock)
+    queue.put("first")
+    clock.now += 0.2
+    queue.put("second", HIGH)
+    queue.put("third", HIGH)
+    assert queue.overloaded
+    while queue.get(0) is not None:
+        pass
+    assert not queue.overloaded
+    queue.put("bulk", LOW)
+
+
+def test_stale_messages_shed_while_overloaded(clock):
+    """Test messages that waited longer than the interval are shed instead of sent, except high priority"""
+    shed = []
+    queue = _queue(clock, on_shed=lambda item, exc: shed.append((item, type(exc))))
+    queue.put("stale")
+    queue.put("stale otp", HIGH)
+    clock.now += 0.15
+    with pytest.raises(errors.Overloaded, match="standing queue"):
+        queue.put("late otp", HIGH)
+    assert queue.overloaded
+    assert queue.get(0)[0] == "stale otp"
+    assert queue.get(0) is None
+    assert shed == [("stale", errors.Overloaded)]
+    assert queue.stats["shed"] == 1
+
+
+def test_shed_callback_errors_are_isolated(clock):
+    """Test a failing on_shed neither drops the other shed messages nor the message taken"""
+    shed = []
+
+    def on_shed(item, exc):
+        if item == "bad":
+            raise RuntimeError("callback failed")
+        shed.append(item)
+
+    queue = _queue(clock, on_shed=on_shed)
+    for item in ("bad", "stale", "otp"):
+        queue.put(item, HIGH if item == "otp" else NORMAL)
+    clock.now += 0.15
+    with pytest.raises(errors.Overloaded):
+        queue.put("late")
+    assert queue.get(0)[0] == "otp"
+    assert queue.get(0) is None
+    assert shed == ["stale"]
+    assert queue.stats["callback_errors"] == 1
+
+
+def test_cancelled_future_shed(clock):
+    """Test shedding a message whose future was cancelled does not fail the consumer"""
+    queue = _queue(clock)
+    with AdmittedSender("primary", workers=0, queue=queue) as sender:
+        cancelled = sender.submit(600123456, "Hello")
+        waiting = sender.submit(600123457, "Hello")
+        otp = sender.submit(600123458, "Hello", priority=HIGH)
+        assert cancelled.cancel()
+        clock.now += 0.15
+        with pytest.raises(errors.Overloaded):
+            sender.submit(600123459, "Hello")
+        assert queue.get(0)[0][0] is otp
+        assert queue.get(0) is None
+    assert isinstance(waiting.exception(0), errors.Overloaded)
+    assert queue.stats["shed"] == 2
+    assert queue.stats["callback_errors"] == 0
+
+
+def test_memory_high_water(clock):
+    """Test memory over the high-water mark refuses all but high priority until under the low-water mark"""
+    memory = [100]
+    queue = _queue(clock, memory=lambda: memory[0], memory_high_water=200, memory_low_water=150, memory_interval=0)
+    queue.put("a")
+    memory[0] = 250
+    with pytest.raises(errors.Overloaded, match="memory"):
+        queue.put("b")
+    queue.put("otp", HIGH)
+    memory[0] = 180
+    with pytest.raises(errors.Overloaded, match="memory"):
+        queue.put("c")
+    memory[0] = 120
+    queue.put("d")
+    assert queue.stats["memory_peak"] == 250
+
+
+def test_rss_bytes():
+    """Test the resident set size is a positive number where /proc is available"""
+    rss = rss_bytes()
+    assert rss is None or rss > 0
+
+
+def test_close_wakes_consumers(clock):
+    """Test consumers waiting on an empty queue return after close"""
+    queue = _queue(clock)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(queue.get()))
+    thread.start()
+    queue.close()
+    thread.join(2)
+    assert results == [None]
+    with pytest.raises(RuntimeError):
+        queue.put("late")
+
+
+def test_sender_sends_and_reports():
+    """Test the sender pool resolves futures with results and validates in the caller"""
+    with AdmittedSender("primary", workers=2, queue=AdmissionQueue(metrics=Metrics())) as sender:
+        future = sender.submit(600123456, "Hello")
+        with pytest.raises(errors.InvalidPhoneNumber):
+            sender.submit("600-123", "Hello")
+        assert future.result(2).recipient == "0048600123456"
+
+
+def test_overload_keeps_latency_and_queue_bounded(monkeypatch):
+    """Test ten times the sustainable load keeps the queue delay and depth bounded
+
+    Four workers sending with 2 ms of latency manage about 2000 messages/s;
+    the producers offer about ten times that for half a second.
+    """
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(0.002))
+    queue = AdmissionQueue(capacity=2000, target=0.005, interval=0.05, memory=None, metrics=Metrics())
+    outcomes = {"sent": 0, "rejected": 0, "shed": 0}
+    futures = []
+    lock = threading.Lock()
+
+    def produce(index, sender):
+        deadline = time.monotonic() + 0.5
+        number = 600000000 + index * 100000
+        while time.monotonic() < deadline:
+            for priority in (HIGH, NORMAL, NORMAL, LOW, LOW):
+                number += 1
+                try:
+                    future = sender.submit(number, "Hello", priority=priority)
+                except errors.Overloaded:
+                    with lock:
+                        outcomes["rejected"] += 1
+                    continue
+                with lock:
+                    futures.append((priority, future))
+            time.sleep(0.0005)
+
+    started = time.monotonic()
+    with AdmittedSender("primary", workers=4, queue=queue) as sender:
+        producers = [threading.Thread(target=produce, args=(index, sender)) for index in range(4)]
+        for thread in producers:
+            thread.start()
+        for thread in producers:
+            thread.join()
+    elapsed = time.monotonic() - started
+    high_failures = 0
+    for priority, future in futures:
+        if future.exception() is None:
+            outcomes["sent"] += 1
+        else:
+            outcomes["shed"] += 1
+            high_failures += priority == HIGH
+    offered = sum(outcomes.values())
+    assert offered / 0.5 > 5 * outcomes["sent"] / elapsed
+    assert high_failures == 0
+    assert outcomes["rejected"] > outcomes["sent"]
+    # queued messages are what grows memory - without admission control most of the offered ones would be
+    assert queue.stats["max_depth"] < offered / 10
+    assert queue.stats["max_delay"] < 0.25
@@ -0,0 +1,155 @@
+"""Tests for the batch API path and micro-batching"""
+import threading
+
+import pytest
+
+from app import errors
+from app.fake import fake_primary_external_api_batch, fake_secondary_external_api_batch
+from app.fake_gateway import FakeGateway
+from app.new import sms_factory
+from app.new.batching import MicroBatcher
+from app.new.transports import HttpTransport
+
+
+def test_fake_batch_endpoints():
+    """Test that the batch fakes return one result per message"""
+    primary = fake_primary_external_api_batch([
+        {"content": "A", "phone": "0048600123456", "sender": "Alice", "api_key": "alice"},
+        {"content": "B", "phone": "0049600123456", "sender": "Alice", "api_key": "wrong"},
+    ])
+    assert [result["status"] for result in primary] == ["SENT", "403"]
+    secondary = fake_secondary_external_api_batch([
+        {"body": "A", "recipient": "0048600123456", "sender_name": "Alice", "auth_key": "bob"},
+    ])
+    assert secondary[0]["status"] == "OK"
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+def test_send_many(api):
+    """Test that send_many validates and sends all messages in order"""
+    provider = sms_factory(api)
+    results = provider.send_many([(600123456, "Hello"), ("600123457", "Hi", "DE")])
+    assert [success for success, _ in results] == [True, True]
+    if api == "primary":
+        assert [response["recipient"] for _, response in results] == ["0048600123456", "0049600123457"]
+    assert provider.recipient is None and provider.content is None
+
+
+def test_send_many_validates_messages():
+    """Test that send_many raises the usual validation errors"""
+    with pytest.raises(errors.InvalidContentLength):
+        sms_factory("primary").send_many([(600123456, "A" * 71)])
+    with pytest.raises(errors.InvalidCountryException):
+        sms_factory("secondary").send_many([(600123456, "Hello", "XX")])
+
+
+def test_send_many_empty():
+    """Test that an empty batch does not call the API"""
+    assert sms_factory("primary").send_many([]) == []
+
+
+def test_send_many_missing_responses():
+    """Test that fewer responses than messages fail the batch instead of dropping messages"""
+    provider = sms_factory("primary")
+    provider._call_api_many = lambda payloads: [{"status": "SENT"}] * (len(payloads) - 1)
+    with pytest.raises(errors.TransportError):
+        provider.send_many([(600123456, "Hello"), (600123457, "World")])
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+def test_send_many_over_http(api):
+    """Test that batches go to the batch endpoint of the gateway"""
+    with FakeGateway() as gateway:
+        provider = sms_factory(api)
+        provider.TRANSPORT = HttpTransport(gateway.url)
+        results = provider.send_many([(600123456, "Hello"), (600123457, "World")])
+        assert gateway.stats["requests"] == 1
+    assert [success for success, _ in results] == [True, True]
+
+
+def test_micro_batcher_coalesces_by_size():
+    """Test that full batches are sent as soon as max_items messages arrived"""
+    with MicroBatcher(sms_factory("primary"), max_items=10, max_delay_ms=10_000) as batcher:
+        futures = [batcher.submit(600123000 + index, "Hello") for index in range(30)]
+        results = [future.result(timeout=5) for future in futures]
+    assert batcher.stats == {"batches": 3, "messages": 30}
+    assert [response["recipient"] for _, response in results] == [
+        f"0048{600123000 + index}" for index in range(30)
+    ]
+
+
+def test_micro_batcher_flushes_after_delay():
+    """Test that a partial batch is sent once max_delay_ms expired"""
+    batcher = MicroBatcher(sms_factory("secondary"), max_items=1000, max_delay_ms=20)
+    try:
+        success, response = batcher.submit(600123456, "Hello").result(timeout=5)
+        assert success is True
+        assert response["status"] == "OK"
+        assert batcher.stats["batches"] == 1
+    finally:
+        batcher.close()
+
+
+def test_micro_batcher_many_threads():
+    """Test that results are de-multiplexed to the right callers"""
+    results = {}
+
+    def worker(batcher, thread_index):
+        futures = {index: batcher.submit(600000000 + thread_index * 1000 + index, "Hi") for index in range(50)}
+        results[thread_index] = {index: future.result(timeout=5) for index, future in futures.items()}
+
+    with MicroBatcher(sms_factory("primary"), max_items=64, max_delay_ms=2) as batcher:
+        threads = [threading.Thread(target=worker, args=(batcher, index)) for index in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    for thread_index, thread_results in results.items():
+        for index, (success, response) in thread_results.items():
+            assert success is True
+            assert response["recipient"] == f"0048{600000000 + thread_index * 1000 + index}"
+    assert batcher.stats["messages"] == 400
+    assert batcher.stats["batches"] < 400
+
+
+def test_micro_batcher_validates_on_submit():
+    """Test that invalid messages are rejected in the caller's thread"""
+    with MicroBatcher(sms_factory("primary")) as batcher:
+        with pytest.raises(errors.InvalidPhoneNumber):
+            batcher.submit("600-123-456", "Hello")
+
+
+def test_micro_batcher_propagates_errors():
+    """Test that a failing batch request fails every future of the batch"""
+
+    class BrokenTransport:
+        def send_many(self, provider, messages):
+            raise errors.TransportError("gateway down")
+
+    provider = sms_factory("primary")
+    provider.TRANSPORT = BrokenTransport()
+    with MicroBatcher(provider, max_items=2) as batcher:
+        futures = [batcher.submit(600123456, "Hello"), batcher.submit(600123457, "Hello")]
+    for future in futures:
+        with pytest.raises(errors.TransportError):
+            future.result(timeout=5)
+
+
+def test_micro_batcher_skips_cancelled_futures():
+    """Test that a future cancelled while queued is not sent and does not stop the batcher"""
+    with MicroBatcher(sms_factory("primary"), max_items=100, max_delay_ms=50) as batcher:
+        cancelled = batcher.submit(600123456, "Hello")
+        assert cancelled.cancel()
+        assert batcher.submit(600123457, "Hello").result(timeout=5)[0] is True
+        assert batcher.submit(600123458, "Hello").result(timeout=5)[0] is True
+    assert batcher.stats["messages"] == 2
+
+
+def test_micro_batcher_close_flushes_and_rejects():
+    """Test that close() sends pending messages and refuses new ones"""
+    batcher = MicroBatcher(sms_factory("primary"), max_items=100, max_delay_ms=60_000)
+    future = batcher.submit(600123456, "Hello")
+    batcher.close()
+    assert future.result(timeout=0)[0] is True
+    with pytest.raises(RuntimeError):
+        batcher.submit(600123456, "Hello")
@@ -0,0 +1,45 @@
+"""Tests for the interned content cache"""
+import json
+
+from app.new import content, segments, sms_factory
+from app.new.content import ContentInfo, content_info
+from app.new.serializers import serializer_for
+
+
+def test_info_matches_segments_module():
+    """Test cached values equal the ones computed directly"""
+    for text in ("Hello", "Zażółć gęślą jaźń" * 5, "[code]" * 30, ""):
+        info = content_info(text)
+        assert info.encoding == segments.encoding(text)
+        assert info.length == segments.encoded_length(text)
+        assert info.segments == segments.segment_count(text) == content.segment_count(text)
+        assert info.fragment == json.dumps(text).encode()
+
+
+def test_same_content_is_cached():
+    """Test identical contents share one info"""
+    text = "Broadcast " + "x" * 50
+    assert content_info(text) is content_info("Broadcast " + "x" * 50)
+
+
+def test_cache_is_bounded():
+    """Test the least recently used contents are evicted"""
+    for index in range(content.CACHE_SIZE * 2):
+        content_info(f"message {index}")
+    assert content_info.cache_info().currsize == content.CACHE_SIZE
+
+
+def test_values_are_computed_lazily():
+    """Test nothing is derived before it is asked for"""
+    info = ContentInfo("Hello")
+    assert info._segments is None and info._fragment is None
+    assert info.fragment == b'"Hello"'
+    assert info._segments is None
+
+
+def test_bulk_payload_with_changing_content():
+    """Test reusing the content fragment keeps bulk payloads identical to json.dumps"""
+    provider = sms_factory("primary")
+    batch = [("a", "0048600123456"), ("a", "0048600123457"), ("ż\"", "0048600123458"), ("a", "0048600123459")]
+    payloads = [provider._build_payload(text, recipient) for text, recipient in batch]
+    assert serializer_for(provider).encode_many(batch) == json.dumps(payloads).encode()
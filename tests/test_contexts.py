@@ -0,0 +1,146 @@
+"""Tests for per-thread provider contexts"""
+import asyncio
+import threading
+
+import pytest
+
+from app import old
+from app.new import sms_factory
+from app.new.contexts import ProviderContext, current_context, provider_context
+from app.new.providers import PrimarySmsApiProvider
+from app.new.tenants import TENANTS, TenantConfig
+from app.new.transports import FakeTransport
+
+
+class ClosingTransport(FakeTransport):
+    """Fake transport remembering whether it was closed"""
+    closed = False
+
+    def close(self):
+        self.closed = True
+
+
+def _in_thread(function):
+    result = []
+    thread = threading.Thread(target=lambda: result.append(function()))
+    thread.start()
+    thread.join()
+    return result[0]
+
+
+def test_scoped_provider_is_reused_per_thread():
+    """Test a thread gets the same instance for an API, other threads their own"""
+    provider = sms_factory("primary", scoped=True)
+    assert isinstance(provider, PrimarySmsApiProvider)
+    assert sms_factory("primary", scoped=True) is provider
+    assert sms_factory("secondary", scoped=True) is not provider
+    assert sms_factory("primary") is not provider
+    assert _in_thread(lambda: sms_factory("primary", scoped=True)) is not provider
+
+
+def test_unknown_api_is_not_cached():
+    """Test the factory errors come through and nothing is stored"""
+    for _ in range(2):
+        with pytest.raises(NotImplementedError):
+            sms_factory("tertiary", scoped=True)
+
+
+def test_provider_context_block():
+    """Test a block gets its own context, restored after the block"""
+    outer = current_context()
+    thread_provider = sms_factory("primary", scoped=True)
+    with provider_context() as context:
+        assert current_context() is context
+        assert sms_factory("primary", scoped=True) is not thread_provider
+        with provider_context() as inner:
+            assert current_context() is inner
+        assert current_context() is context
+    assert current_context() is outer
+    assert sms_factory("primary", scoped=True) is thread_provider
+
+
+def test_contexts_per_asyncio_task():
+    """Test tasks running in their own `provider_context` do not share providers"""
+
+    async def task():
+        with provider_context():
+            provider = sms_factory("primary", scoped=True)
+            await asyncio.sleep(0)
+            assert sms_factory("primary", scoped=True) is provider
+            return provider
+
+    async def main():
+        return await asyncio.gather(task(), task(), task())
+
+    providers = asyncio.run(main())
+    assert len({id(provider) for provider in providers}) == 3
+
+
+def test_transport_per_provider():
+    """Test each provider of a context gets its own transport, closed with the context"""
+    with provider_context(ClosingTransport, preload=("primary", "secondary")) as context:
+        assert len(context.transports) == 2
+        primary = sms_factory("primary", scoped=True)
+        assert primary.TRANSPORT is context.transports[0]
+        assert sms_factory("secondary", scoped=True).TRANSPORT is context.transports[1]
+        assert PrimarySmsApiProvider.TRANSPORT is None
+        assert primary.set_recipient(600123456).set_content("Hello").send().success
+        transports = context.transports
+    assert all(transport.closed for transport in transports)
+    assert context.transports == []
+
+
+def test_tenant_reload_replaces_provider():
+    """Test a tenant provider follows a reloaded configuration"""
+    TENANTS.load([TenantConfig("acme", {"primary": "alice"}, "Acme")])
+    try:
+        context = ProviderContext()
+        provider = context.provider("primary", "acme")
+        assert provider.SENDER_NAME == "Acme"
+        assert context.provider("primary", "acme") is provider
+        TENANTS.load([TenantConfig("acme", {"primary": "alice"}, "Acme Corp")])
+        assert context.provider("primary", "acme").SENDER_NAME == "Acme Corp"
+    finally:
+        TENANTS.load([])
+
+
+def test_tenant_reload_closes_replaced_transport():
+    """Test the transport of a provider replaced by a tenant reload is closed and dropped"""
+    TENANTS.load([TenantConfig("acme", {"primary": "alice"}, "Acme")])
+    try:
+        with provider_context(ClosingTransport) as context:
+            old_transport = context.provider("primary", "acme").TRANSPORT
+            TENANTS.load([TenantConfig("acme", {"primary": "alice"}, "Acme Corp")])
+            new_transport = context.provider("primary", "acme").TRANSPORT
+            assert old_transport.closed
+            assert context.transports == [new_transport]
+            assert not new_transport.closed
+    finally:
+        TENANTS.load([])
+
+
+def test_old_api_uses_current_context():
+    """Test the legacy functions use the provider of the current context"""
+    with provider_context() as context:
+        assert old._provider("primary") is context.provider("primary")  # pylint: disable=protected-access
+        success, response = old.sms_primary_api("Hello", "600123456")
+        assert success is True and response["recipient"] == "0048600123456"
+
+
+def test_threads_do_not_share_message_state():
+    """Test concurrent senders with scoped providers never see each other's recipients"""
+    mismatches = []
+
+    def worker(index):
+        provider = sms_factory("primary", scoped=True)
+        for number in range(600000000 + index * 1000, 600000000 + index * 1000 + 300):
+            result = provider.set_recipient(number).set_content("Hello").send()
+            if result.recipient != f"0048{number}":
+                mismatches.append((number, result.recipient))
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert mismatches == []
@@ -0,0 +1,120 @@
+"""Tests for the country routing table"""
+import json
+
+import pytest
+
+from app import errors, settings
+from app.countries import CountryIndex, CountryRule, country_index, load_rules
+from app.errors import ValidationCode
+from app.new import sms_factory, sms_route
+from app.old import check_sms_primary_api
+
+
+@pytest.fixture(name="table")
+def table_fixture(tmp_path):
+    """Write a small routing table and return its path"""
+    path = tmp_path / "countries.json"
+    path.write_text(json.dumps({
+        "version": 1,
+        "columns": ["country", "calling_code", "min_length", "max_length", "preferred_provider"],
+        "countries": [
+            ["US", "1", 10, 10, None],
+            ["CA", "1", 10, 10, None],
+            ["FI", "358", 5, 12, "secondary"],
+            ["AX", "35818", 5, 10, None],
+            ["PL", "48", 9, 9, "primary"],
+        ],
+    }))
+    return str(path)
+
+
+def test_load_rules(table):
+    """Test reading rules by column name"""
+    rules = load_rules(table)
+    assert rules[0] == CountryRule("US", "1", 10, 10, None)
+    assert rules[2].prefix == "00358"
+    assert rules[2].lengths == range(5, 13)
+
+
+def test_index_lookups(table):
+    """Test the country -> prefix and country -> length lookups"""
+    index = CountryIndex(load_rules(table))
+    assert len(index) == 5
+    assert "FI" in index and "XX" not in index
+    assert index.prefixes["PL"] == "0048"
+    assert index.rule("FI").preferred_provider == "secondary"
+    assert index.rule("XX") is None
+    assert index.valid_length("PL", "600123456")
+    assert not index.valid_length("PL", "60012345")
+    assert not index.valid_length("XX", "600123456")
+
+
+@pytest.mark.parametrize(
+    ("number", "country"),
+    [
+        ("0048600123456", "PL"),
+        ("+48600123456", "PL"),
+        ("48600123456", "PL"),
+        ("00358401234567", "FI"),
+        ("0035818123456", "AX"),
+        ("0012025550123", "US"),
+        ("0099123456", None),
+        ("", None),
+    ],
+)
+def test_match_longest_prefix(table, number, country):
+    """Test prefix -> country lookups: the longest calling code wins, shared codes keep the first country"""
+    rule = CountryIndex(load_rules(table)).match(number)
+    assert (rule and rule.country) == country
+
+
+def test_split(table):
+    """Test splitting international numbers"""
+    index = CountryIndex(load_rules(table))
+    assert index.split("+48600123456") == ("PL", "600123456")
+    assert index.split("0035818123456") == ("AX", "123456")
+    assert index.split("0099") is None
+
+
+def test_index_is_memoized(table):
+    """Test that each data file is compiled once"""
+    assert country_index() is country_index()
+    assert country_index(table) is country_index(table)
+    assert country_index(table) is not country_index()
+
+
+def test_settings_country_codes_come_from_table():
+    """Test that `settings.COUNTRY_CODES` is the prefix table of the default data file"""
+    assert settings.COUNTRY_CODES is country_index().prefixes
+    assert settings.COUNTRY_CODES["PL"] == "0048"
+    assert settings.COUNTRY_CODES["DE"] == "0049"
+    with pytest.raises(AttributeError):
+        settings.NOT_A_SETTING  # pylint: disable=pointless-statement
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+@pytest.mark.parametrize(
+    ("phone_number", "country_code", "valid"),
+    [("600123456", "PL", True), ("60012345", "PL", False), ("6001234567", "PL", False), ("20123456", "DK", True)],
+)
+def test_providers_check_number_length(api, phone_number, country_code, valid):
+    """Test that both providers apply the length rules of the table"""
+    provider = sms_factory(api)
+    assert (provider.check_recipient(phone_number, country_code) == ValidationCode.OK) is valid
+    if not valid:
+        with pytest.raises(errors.InvalidPhoneNumber):
+            provider.set_recipient(phone_number, country_code)
+
+
+def test_old_api_checks_number_length():
+    """Test that the legacy functions apply the length rules"""
+    assert check_sms_primary_api("Hello", "600123456", "PL") == ValidationCode.OK
+    assert check_sms_primary_api("Hello", "60012345", "PL") == ValidationCode.INVALID_PHONE_NUMBER
+
+
+def test_route_prefers_country_provider():
+    """Test that routing tries the preferred provider of the country first"""
+    assert sms_route("123456789", "Hello", "GB").API_NAME == "secondary"
+    assert sms_route("123456789", "Hello", "GB").recipient == "0044123456789"
+    assert sms_route("123456789", "Hello", "GB", preference=["primary"]).API_NAME == "primary"
+    assert sms_route("123456789", "A" * 71, "PL").API_NAME == "secondary"
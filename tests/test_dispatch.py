@@ -0,0 +1,209 @@
+"""Tests for bulk dispatch with graceful shutdown"""
+import time
+
+import pytest
+
+from app.fake_gateway import uniform
+from app.new import sms_factory
+from app.new.dispatch import DRAINING, STOPPED, Dispatcher, FileCheckpoint
+from app.new.providers import PrimarySmsApiProvider
+from app.new.transports import FakeTransport
+
+
+def _messages(count):
+    return [(600000000 + index, "Hello") for index in range(count)]
+
+
+def _use_transport(monkeypatch, transport):
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", transport)
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def checkpoint(tmp_path):
+    return FileCheckpoint(str(tmp_path / "campaign.pos"))
+
+
+def test_whole_stream_is_sent(monkeypatch, checkpoint):
+    """Test every message is sent once and the final position is saved"""
+    _use_transport(monkeypatch, FakeTransport(uniform(0, 0.002)))
+    positions = []
+    dispatcher = Dispatcher(
+        sms_factory("primary"), _messages(1000), checkpoint, batch_size=30,
+        on_result=lambda position, message, result: positions.append((position, result.success)),
+    ).start()
+    assert dispatcher.wait(5)
+    assert dispatcher.stop(5)
+    assert sorted(positions) == [(position, True) for position in range(1000)]
+    assert dispatcher.stats["sent"] == 1000
+    assert dispatcher.position == checkpoint.load() == 1000
+    assert dispatcher.state == STOPPED
+
+
+def test_drain_then_resume_sends_nothing_twice(monkeypatch, checkpoint):
+    """Test a drained run checkpoints exactly what was sent and a restart continues from there"""
+    _use_transport(monkeypatch, FakeTransport(0.005))
+    messages, sent = _messages(3000), []
+    first = Dispatcher(
+        sms_factory("primary"), messages, checkpoint, batch_size=20, workers=3,
+        on_result=lambda position, message, result: sent.append(position),
+    ).start()
+    _wait_for(lambda: first.position >= 200)
+    assert first.stop(5)
+    assert first.state == STOPPED
+    assert 200 <= checkpoint.load() == len(sent) < 3000
+    second = Dispatcher(
+        sms_factory("primary"), messages, checkpoint, batch_size=20, workers=3,
+        on_result=lambda position, message, result: sent.append(position),
+    ).start()
+    assert second.wait(10)
+    second.stop()
+    assert sorted(sent) == list(range(3000))
+    assert checkpoint.load() == 3000
+
+
+def test_stop_deadline_drops_queued_batches(monkeypatch, checkpoint):
+    """Test a stop past its deadline drops unsent batches and a restart sends them"""
+    _use_transport(monkeypatch, FakeTransport(0.1))
+    messages, sent = _messages(400), []
+    first = Dispatcher(
+        sms_factory("primary"), messages, checkpoint, batch_size=10, workers=2,
+        on_result=lambda position, message, result: sent.append(position),
+    ).start()
+    _wait_for(lambda: first._queue.full())
+    assert first.stop(0.01) is False
+    _wait_for(lambda: not any(thread.is_alive() for thread in first._threads))
+    assert first.stats["dropped"] > 0
+    assert checkpoint.load() <= len(sent)
+    second = Dispatcher(
+        sms_factory("primary"), messages, checkpoint, batch_size=50, workers=8,
+        on_result=lambda position, message, result: sent.append(position),
+    ).start()
+    assert second.wait(10)
+    second.stop()
+    assert set(sent) == set(range(400))
+    assert len(sent) - 400 <= 2 * 10  # at most the batches in flight at the deadline
+
+
+def test_failed_batches_are_retried(monkeypatch, checkpoint):
+    """Test a batch failing with a transport error is sent again in the same run"""
+    calls = iter(range(1000))
+    _use_transport(monkeypatch, FakeTransport(fail=lambda: next(calls) % 2 == 0))
+    sent = []
+    with Dispatcher(
+        sms_factory("primary"), _messages(100), checkpoint, batch_size=10, workers=1, retry_delay=0,
+        on_result=lambda position, message, result: sent.append(position),
+    ) as dispatcher:
+        assert dispatcher.wait(5)
+    assert sent == list(range(100))
+    assert dispatcher.stats["sent"] == 100 and dispatcher.stats["failed"] == 0
+    assert dispatcher.stats["retries"] == 10
+    assert dispatcher.failed == []
+    assert checkpoint.load() == 100
+
+
+def test_dead_lettered_batch_moves_the_checkpoint(monkeypatch, checkpoint):
+    """Test a batch failing every retry goes to on_error and a restart does not send anything again"""
+    calls = iter(range(1000))
+    # the second batch fails on all three attempts
+    _use_transport(monkeypatch, FakeTransport(fail=lambda: next(calls) in (1, 2, 3)))
+    dead, sent = [], []
+    with Dispatcher(
+        sms_factory("primary"), _messages(40), checkpoint, batch_size=10, workers=1, retries=2, retry_delay=0,
+        on_result=lambda position, message, result: sent.append(position),
+        on_error=lambda position, messages, exc: dead.append((position, len(messages), type(exc).__name__)),
+    ) as dispatcher:
+        assert dispatcher.wait(5)
+    assert dead == [(10, 10, "TransportError")]
+    assert dispatcher.failed == [(10, 20)]
+    assert dispatcher.stats["failed"] == 10 and dispatcher.stats["sent"] == 30
+    assert sent == list(range(10)) + list(range(20, 40))
+    assert checkpoint.load() == 40
+    with Dispatcher(
+        sms_factory("primary"), _messages(40), checkpoint, on_result=lambda *args: sent.append(args[0]),
+    ) as dispatcher:
+        assert dispatcher.wait(5)
+    assert len(sent) == 30
+
+
+def test_stop_drops_batch_waiting_for_retry(monkeypatch, checkpoint):
+    """Test a batch still in backoff when stopping stays below the checkpoint"""
+    _use_transport(monkeypatch, FakeTransport(fail=lambda: True))
+    dispatcher = Dispatcher(
+        sms_factory("primary"), _messages(10), checkpoint, batch_size=10, workers=1, retry_delay=60,
+    ).start()
+    _wait_for(lambda: dispatcher._pending == 1 and not dispatcher._reading)
+    assert dispatcher.stop(0.05) is False
+    _wait_for(lambda: not any(thread.is_alive() for thread in dispatcher._threads))
+    assert dispatcher.stats["dropped"] == 10
+    assert dispatcher.failed == []
+    assert checkpoint.load() == 0
+
+
+def test_on_result_errors_do_not_fail_the_batch(checkpoint):
+    """Test a raising on_result is counted and the sent batch still moves the checkpoint"""
+
+    def on_result(position, message, result):
+        raise RuntimeError("callback bug")
+
+    with Dispatcher(sms_factory("primary"), _messages(20), checkpoint, batch_size=10, on_result=on_result) as dispatcher:
+        assert dispatcher.wait(5)
+    assert dispatcher.stats["sent"] == 20 and dispatcher.stats["failed"] == 0
+    assert dispatcher.stats["callback_errors"] == 20
+    assert checkpoint.load() == 20
+
+
+def test_lifecycle(checkpoint):
+    """Test state transitions and the context manager"""
+    dispatcher = Dispatcher(sms_factory("primary"), [], checkpoint)
+    with pytest.raises(RuntimeError):
+        dispatcher.start().start()
+    assert dispatcher.drain(1)
+    assert dispatcher.state == DRAINING
+    assert dispatcher.stop(1)
+    with Dispatcher(sms_factory("primary"), _messages(5), checkpoint) as dispatcher:
+        assert dispatcher.wait(5)
+    assert dispatcher.state == STOPPED and checkpoint.load() == 5
+
+
+def test_invalid_messages_do_not_fail_their_batch(checkpoint):
+    """Test a malformed message gets a rejected result and the rest of its batch is sent"""
+    messages = _messages(10)
+    messages[3] = ("600-000-003", "Hello")
+    results = []
+    with Dispatcher(
+        sms_factory("primary"), messages, checkpoint, batch_size=10,
+        on_result=lambda position, message, result: results.append((position, result.success, result.status)),
+    ) as dispatcher:
+        assert dispatcher.wait(5)
+    assert sorted(results)[3] == (3, False, "InvalidPhoneNumber")
+    assert sum(success for _, success, _ in results) == 9
+    assert dispatcher.stats["sent"] == 9 and dispatcher.stats["rejected"] == 1
+    assert checkpoint.load() == 10
+
+
+def test_rejected_messages_are_not_errors_for_the_controller(checkpoint):
+    """Test the controller sees only the messages that reached the API"""
+
+    class Controller:
+        batch_size = 10
+        releases = []
+
+        def acquire(self):
+            return object()
+
+        def release(self, token, size, errors=0):
+            self.releases.append((size, errors))
+
+    messages = _messages(10)
+    messages[3] = ("600-000-003", "Hello")
+    controller = Controller()
+    with Dispatcher(sms_factory("primary"), messages, checkpoint, controller=controller) as dispatcher:
+        assert dispatcher.wait(5)
+    assert controller.releases == [(9, 0)]
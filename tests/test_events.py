@@ -0,0 +1,178 @@
+"""Tests for the sampled audit log of sends"""
+import gzip
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from app.errors import TransportError
+from app.new import sms_factory
+from app.new.events import EventLog
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+
+
+def _events(log):
+    """Return every event written by the log, oldest first"""
+    events = []
+    for name in log.files():
+        with gzip.open(os.path.join(log.directory, name), "rt") as file:
+            events.extend(json.loads(line) for line in file)
+    return events
+
+
+@pytest.fixture
+def log(tmp_path):
+    log = EventLog(str(tmp_path / "events"), flush_interval=0.01, salt=b"test")
+    yield log
+    log.close()
+
+
+def test_send_is_logged(log, monkeypatch):
+    """Test single and batch sends write one event each"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "EVENT_LOG", log)
+    monkeypatch.setattr(SecondarySmsApiProvider, "EVENT_LOG", log)
+    sms_factory("primary").set_recipient(600123456).set_content("Zażółć").send()
+    sms_factory("secondary").send_many([(600123457, "ż" * 71), (600123458, "b")])
+    log.close()
+    events = _events(log)
+    assert [(event["provider"], event["segments"]) for event in events] == [
+        ("primary", 1), ("secondary", 2), ("secondary", 1)
+    ]
+    assert all(event["status"] in ("SENT", "OK") and event["success"] for event in events)
+    assert all(event["latency_ms"] >= 0 for event in events)
+    assert "0048600123456" not in json.dumps(events)
+    assert events[0]["recipient"] == log._hash("0048600123456")
+
+
+def test_failures_are_logged(log, monkeypatch):
+    """Test failed responses and transport errors are recorded"""
+
+    def broken(self, payload):
+        raise TransportError("down")
+
+    monkeypatch.setattr(SecondarySmsApiProvider, "EVENT_LOG", log)
+    monkeypatch.setattr(SecondarySmsApiProvider, "API_KEY", "wrong")
+    sms_factory("secondary").set_recipient(600123456).set_content("Hello").send()
+    monkeypatch.setattr(SecondarySmsApiProvider, "_call_api", broken)
+    with pytest.raises(TransportError):
+        sms_factory("secondary").set_recipient(600123456).set_content("Hello").send()
+    log.close()
+    assert [(event["status"], event["success"]) for event in _events(log)] == [
+        ("403", False), ("TransportError", False)
+    ]
+
+
+def test_sampling_keeps_failures_and_slow_sends(tmp_path):
+    """Test head sampling of successes, with failures and slow successes always kept"""
+    log = EventLog(str(tmp_path), sample_every=10, slow_ms=100)
+    for index in range(100):
+        log.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+    log.record("primary", "0048600123456", "hi", "SENT", True, 0.5)
+    log.record("primary", "0048600123456", "hi", "403", False, 0.001)
+    log.close()
+    events = _events(log)
+    assert len(events) == 12
+    assert log.stats["sampled_out"] == 90
+    assert events[-2]["latency_ms"] == 500 and events[-1]["status"] == "403"
+
+
+def test_full_buffer_drops_instead_of_blocking(tmp_path):
+    """Test the send path never waits for the writer"""
+    log = EventLog(str(tmp_path), capacity=10, flush_interval=60)
+    log._wakeup.set = lambda: None  # keep the writer asleep
+    for _ in range(15):
+        log.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+    assert log.stats["dropped"] == 5
+    del log._wakeup.set
+    log.close()
+    assert log.stats["recorded"] == 10
+
+
+def test_rotation(tmp_path):
+    """Test size-based rotation keeps at most max_files files"""
+    log = EventLog(str(tmp_path), max_bytes=1, max_files=3, flush_interval=60)
+    for index in range(5):
+        log.record("primary", f"00486001234{index:02d}", "hi", "SENT", True, 0.001)
+        log.flush()
+    log.close()
+    assert log.files() == [f"sends-{sequence:06d}.jsonl.gz" for sequence in (3, 4, 5)]
+    restarted = EventLog(str(tmp_path), flush_interval=60)
+    restarted.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+    restarted.close()
+    assert restarted.files()[-1] == "sends-000006.jsonl.gz"
+
+
+def test_salt_is_generated_once(tmp_path):
+    """Test a random salt is stored with the logs and reused, an empty one is refused"""
+    first = EventLog(str(tmp_path), flush_interval=60)
+    first.close()
+    second = EventLog(str(tmp_path), flush_interval=60)
+    second.close()
+    assert len(first.salt) == 16
+    assert second.salt == first.salt
+    assert first._hash("0048600123456") == second._hash("0048600123456")
+    assert EventLog(str(tmp_path / "other"), flush_interval=60).salt != first.salt
+    with pytest.raises(ValueError):
+        EventLog(str(tmp_path), salt=b"")
+
+
+def test_bad_salt_file_and_max_files_are_refused(tmp_path):
+    """Test a truncated salt file is an error instead of a weak key, and at least one file is kept"""
+    (tmp_path / "sends.salt").write_bytes(b"")
+    with pytest.raises(ValueError, match="0 bytes"):
+        EventLog(str(tmp_path), flush_interval=60)
+    with pytest.raises(ValueError):
+        EventLog(str(tmp_path / "other"), max_files=0, salt=b"test")
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".tmp")]
+
+
+def test_counters_are_exact_across_threads(tmp_path):
+    """Test sampled-out and dropped events counted from many threads add up"""
+    log = EventLog(str(tmp_path), capacity=0, sample_every=2, flush_interval=60, salt=b"test")
+
+    def record():
+        for _ in range(5000):
+            log.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+
+    threads = [threading.Thread(target=record) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    log.close()
+    assert log.stats["sampled_out"] + log.stats["dropped"] == 40_000
+
+
+def test_unrelated_files_are_ignored(tmp_path):
+    """Test files sharing the prefix but not the name pattern neither break startup nor get rotated"""
+    for name in ("sends-old.jsonl.gz", "sends-000002.jsonl.gz.bak", "sends-backup-000001.jsonl.gz"):
+        (tmp_path / name).write_bytes(b"")
+    log = EventLog(str(tmp_path), max_bytes=1, max_files=1, flush_interval=60)
+    for _ in range(3):
+        log.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+        log.flush()
+    log.close()
+    assert log.files() == ["sends-000003.jsonl.gz"]
+    assert (tmp_path / "sends-old.jsonl.gz").exists()
+
+
+def test_writer_survives_bad_events_and_write_errors(tmp_path):
+    """Test failed events and batches are counted and the writer thread keeps going"""
+    log = EventLog(str(tmp_path), flush_interval=60)
+    opened = log._open
+    log._open = lambda: (_ for _ in ()).throw(OSError("disk full"))
+    log.record("primary", "0048600123456", "hi", object(), True, 0.001)
+    log.record("primary", "0048600123456", "hi", "SENT", True, 0.001)
+    log._wakeup.set()
+    deadline = time.monotonic() + 5
+    while log.stats["failed"] < 2 and time.monotonic() < deadline:
+        time.sleep(0.005)
+    assert log.stats["failed"] == 2
+    assert log._thread.is_alive()
+    log._open = opened
+    log.record("primary", "0048600123457", "hi", "SENT", True, 0.001)
+    log.close()
+    assert log.stats["failed"] == 2
+    assert [event["status"] for event in _events(log)] == ["SENT"]
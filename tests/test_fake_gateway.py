@@ -0,0 +1,145 @@
+"""Tests for the fake HTTP gateway and the HTTP transport"""
+import http.client
+import threading
+
+import pytest
+
+from app import errors
+from app.fake_gateway import FakeGateway, TokenBucket, constant, parse_latency
+from app.new import sms_factory
+from app.new.transports import HttpTransport
+
+
+@pytest.fixture
+def gateway():
+    """Running gateway without latency or errors"""
+    with FakeGateway() as running:
+        yield running
+
+
+def _provider(api, url, **kwargs):
+    provider = sms_factory(api)
+    provider.TRANSPORT = HttpTransport(url, **kwargs)
+    return provider.set_recipient(600123456).set_content("Hello")
+
+
+def test_primary_over_http(gateway):
+    """Test that the primary provider sends through the gateway"""
+    success, response = _provider("primary", gateway.url).send()
+    assert success is True
+    assert response == {"api": "1", "recipient": "0048600123456", "status": "SENT"}
+
+
+def test_secondary_over_http(gateway):
+    """Test that the secondary provider sends through the gateway"""
+    success, response = _provider("secondary", gateway.url).send()
+    assert success is True
+    assert response["status"] == "OK"
+    assert "id" in response
+
+
+def test_invalid_key_over_http(gateway):
+    """Test that the gateway keeps the authentication semantics of the fakes"""
+    provider = _provider("primary", gateway.url)
+    provider.API_KEY = "mallory"
+    success, response = provider.send()
+    assert success is False
+    assert response["status"] == "403"
+
+
+def test_connection_is_reused(gateway):
+    """Test that a thread keeps one persistent connection"""
+    provider = _provider("primary", gateway.url)
+    provider.send()
+    connection = provider.TRANSPORT._connection()
+    provider.send()
+    assert provider.TRANSPORT._connection() is connection
+    assert gateway.stats["requests"] == 2
+
+
+def test_reconnects_replace_the_connection():
+    """Test that reconnecting after errors keeps one tracked connection per thread"""
+    with FakeGateway() as gateway:
+        url = gateway.url
+    provider = _provider("primary", url, timeout=0.5)
+    for _ in range(3):
+        with pytest.raises(errors.TransportError):
+            provider.send()
+    assert len(provider.TRANSPORT._connections) == 1
+
+
+def test_connections_of_exited_threads_are_closed(gateway, monkeypatch):
+    """Test that a new connection closes and forgets the connections of threads that exited"""
+    closed = []
+
+    class Connection(http.client.HTTPConnection):
+        def close(self):
+            closed.append(self)
+            super().close()
+
+    monkeypatch.setattr(http.client, "HTTPConnection", Connection)
+    provider = _provider("primary", gateway.url)
+    transport = provider.TRANSPORT
+    opened = []
+    for _ in range(3):
+        thread = threading.Thread(target=lambda: opened.append(transport._connection()))
+        thread.start()
+        thread.join()
+    assert provider.send().success
+    assert list(transport._connections) == [threading.current_thread()]
+    assert closed == opened
+    transport.close()
+
+
+def test_error_rate():
+    """Test that failing requests are reported as unsuccessful sends"""
+    with FakeGateway(error_rate=1.0) as gateway:
+        success, response = _provider("primary", gateway.url).send()
+    assert success is False
+    assert response["status"] == "500"
+    assert gateway.stats["errors"] == 1
+
+
+def test_rate_limit():
+    """Test that requests over the rate limit are throttled"""
+    with FakeGateway(rate_limit=1) as gateway:
+        provider = _provider("primary", gateway.url)
+        results = [provider.send()[1]["status"] for _ in range(3)]
+    assert results[0] == "SENT"
+    assert "429" in results
+    assert gateway.stats["throttled"] >= 1
+
+
+def test_client_timeout():
+    """Test that a slow gateway raises TransportError on the client"""
+    with FakeGateway(latency=constant(0.5)) as gateway:
+        with pytest.raises(errors.TransportError):
+            _provider("primary", gateway.url, timeout=0.05).send()
+
+
+def test_unreachable_gateway():
+    """Test that connection errors are wrapped in TransportError"""
+    with FakeGateway() as gateway:
+        url = gateway.url
+    with pytest.raises(errors.TransportError):
+        _provider("primary", url, timeout=0.5).send()
+
+
+def test_token_bucket_refills():
+    """Test that the token bucket refills at the configured rate"""
+    now = [0.0]
+    bucket = TokenBucket(rate=2, burst=1, clock=lambda: now[0])
+    assert bucket.acquire() is True
+    assert bucket.acquire() is False
+    now[0] += 0.5
+    assert bucket.acquire() is True
+
+
+def test_parse_latency():
+    """Test parsing of latency specs"""
+    assert parse_latency(None) is None
+    assert parse_latency("constant:0.25")() == 0.25
+    assert 0.1 <= parse_latency("uniform:0.1,0.2")() <= 0.2
+    assert parse_latency("pareto:0.01,2")() >= 0.01
+    with pytest.raises(ValueError):
+        parse_latency("gaussian:1")
@@ -0,0 +1,118 @@
+"""Tests for hedged sending"""
+import itertools
+import threading
+import time
+
+import pytest
+
+from app import errors
+from app.new import sms_factory
+from app.new.hedging import HedgedSender, LatencyTracker
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.transports import FakeTransport
+
+
+def heavy_tail(slow_every=20, fast=0.002, slow=1.0):
+    """Latency script: mostly fast, every Nth call very slow"""
+    counter = itertools.count(1)
+    return lambda: slow if next(counter) % slow_every == 0 else fast
+
+
+@pytest.fixture
+def transports(monkeypatch):
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(heavy_tail()))
+    monkeypatch.setattr(SecondarySmsApiProvider, "TRANSPORT", FakeTransport(0.002))
+
+
+def _p99(latencies):
+    return sorted(latencies)[int(len(latencies) * 0.99)]
+
+
+@pytest.mark.usefixtures("transports")
+def test_hedging_cuts_the_tail():
+    """Test slow primary calls are overtaken by the secondary provider within the budget"""
+    latencies, providers = [], []
+    with HedgedSender(percentile=90, initial_delay=0.02, budget=0.15) as sender:
+        for index in range(200):
+            start = time.perf_counter()
+            result = sender.send(600000000 + index, "Your code is 1234")
+            latencies.append(time.perf_counter() - start)
+            assert result.success
+            providers.append(result.provider)
+    stats = sender.stats
+    # without hedging the slow calls (1 s) would be the p99; the margin is wide for loaded machines
+    assert _p99(latencies) < 0.5
+    assert stats["hedge_wins"] >= 5
+    assert providers.count("secondary") == stats["hedge_wins"]
+    assert stats["hedges"] <= 0.15 * stats["requests"]
+    # only hedges whose primary request was already sent can be delivered twice
+    assert stats["duplicates"] + stats["cancelled"] <= stats["hedges"]
+
+
+@pytest.mark.usefixtures("transports")
+def test_budget_limits_hedges():
+    """Test no hedge is sent without budget"""
+    with HedgedSender(initial_delay=0.001, budget=0.0) as sender:
+        for index in range(20):
+            assert sender.send(600000000 + index, "Hi").provider == "primary"
+    assert sender.stats["hedges"] == 0
+    assert sender.stats["over_budget"] >= 1
+
+
+def test_ineligible_content_is_not_hedged(monkeypatch):
+    """Test messages breaking the secondary provider's rules stay on the primary one"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(0.05))
+
+    class Narrow(SecondarySmsApiProvider):
+        MAX_CONTENT_LENGTH = 5
+
+    with HedgedSender(secondary=Narrow, initial_delay=0.001, budget=1.0) as sender:
+        assert sender.send(600123456, "Your code is 1234").provider == "primary"
+    assert sender.stats["not_eligible"] == 1 and sender.stats["hedges"] == 0
+
+
+def test_message_in_flight_is_hedged_once(monkeypatch):
+    """Test concurrent sends of the same message add at most one hedge"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(0.2))
+    monkeypatch.setattr(SecondarySmsApiProvider, "TRANSPORT", FakeTransport(0.3))
+    with HedgedSender(initial_delay=0.01, budget=1.0) as sender:
+        threads = [threading.Thread(target=sender.send, args=(600123456, "Your code is 1234")) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert sender.stats["hedges"] == 1
+    assert sender.stats["in_flight_skips"] == 1
+
+
+def test_queued_hedge_is_skipped_after_primary_success(monkeypatch):
+    """Test a hedge still waiting for a worker is not sent once the primary request succeeded"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "TRANSPORT", FakeTransport(0.05))
+    hedges_sent = []
+    monkeypatch.setattr(SecondarySmsApiProvider, "TRANSPORT", FakeTransport(lambda: hedges_sent.append(1) or 0.0))
+    with HedgedSender(initial_delay=0.001, budget=1.0, max_workers=1) as sender:
+        assert sender.send(600123456, "Your code is 1234").provider == "primary"
+    assert hedges_sent == []
+    assert sender.stats["hedges"] == 1
+    assert sender.stats["cancelled"] == 1
+    assert sender.stats["duplicates"] == 0
+
+
+def test_validation_errors_are_raised():
+    """Test invalid messages raise like the primary provider"""
+    with HedgedSender() as sender:
+        with pytest.raises(errors.InvalidPhoneNumber):
+            sender.send("abc", "Hi")
+    assert sms_factory("primary").check_message("abc", "Hi")
+
+
+def test_latency_tracker_percentile():
+    """Test the cached percentile follows the window"""
+    tracker = LatencyTracker(window=100, refresh=10)
+    assert tracker.percentile(50) is None
+    for value in range(100):
+        tracker.add(value / 1000)
+    assert tracker.percentile(90) == 0.09
+    for _ in range(100):
+        tracker.add(1.0)
+    assert tracker.percentile(50) == 1.0
@@ -0,0 +1,187 @@
+"""Tests for the message ID generators"""
+import os
+import threading
+import uuid
+
+import pytest
+
+from app.fake import fake_secondary_external_api
+from app.ids import SnowflakeGenerator, UlidGenerator, UuidGenerator
+from app.new import sms_factory
+
+
+class FrozenClock:
+    """Clock returning a fixed time in nanoseconds"""
+
+    def __init__(self, ns):
+        self.ns = ns
+
+    def __call__(self):
+        return self.ns
+
+
+def test_uuid_generator_returns_uuid():
+    """Test that UuidGenerator keeps the external API behaviour"""
+    assert isinstance(UuidGenerator().new_id(), uuid.UUID)
+
+
+def test_ulid_format():
+    """Test that ULIDs are 26 Crockford base32 characters"""
+    ulid = UlidGenerator().new_id()
+    assert len(ulid) == 26
+    assert set(ulid) <= set("0123456789ABCDEFGHJKMNPQRSTVWXYZ")
+
+
+def test_ulid_encodes_timestamp():
+    """Test that the first 48 bits of a ULID are the millisecond timestamp"""
+    generator = UlidGenerator(clock=FrozenClock(1_700_000_000_123_456_789))
+    assert generator.new_int() >> 80 == 1_700_000_000_123
+
+
+def test_ulid_monotonic_within_millisecond():
+    """Test that ULIDs generated in the same millisecond keep increasing"""
+    generator = UlidGenerator(batch_size=4, clock=FrozenClock(1_700_000_000_000_000_000))
+    ids = [generator.new_id() for _ in range(1000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_ulid_monotonic_when_clock_goes_back():
+    """Test that a clock going backwards does not break the ordering"""
+    clock = FrozenClock(1_700_000_000_000_000_000)
+    generator = UlidGenerator(clock=clock)
+    first = generator.new_int()
+    clock.ns -= 5_000_000
+    assert generator.new_int() > first
+
+
+def test_snowflake_layout():
+    """Test the timestamp, worker and sequence fields of snowflake IDs"""
+    clock = FrozenClock((SnowflakeGenerator.EPOCH_MS + 42) * 1_000_000)
+    generator = SnowflakeGenerator(worker_id=7, clock=clock)
+    first, second = generator.new_id(), generator.new_id()
+    assert first >> 22 == 42
+    assert (first >> 12) & 0x3FF == 7
+    assert first & 0xFFF == 0
+    assert second & 0xFFF == 1
+
+
+def test_snowflake_sequence_overflow_borrows_next_millisecond():
+    """Test that an exhausted sequence moves on to the next millisecond"""
+    clock = FrozenClock(SnowflakeGenerator.EPOCH_MS * 1_000_000)
+    generator = SnowflakeGenerator(worker_id=1, clock=clock)
+    ids = [generator.new_id() for _ in range(5000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+
+
+def test_snowflake_invalid_worker_id():
+    """Test that worker IDs must fit in 10 bits"""
+    with pytest.raises(ValueError):
+        SnowflakeGenerator(worker_id=1024)
+
+
+@pytest.mark.parametrize("generator_class", [UlidGenerator, lambda: SnowflakeGenerator(worker_id=5)])
+def test_unique_across_threads(generator_class):
+    """Test that a shared generator never repeats IDs across threads"""
+    generator = generator_class()
+    results = [[] for _ in range(8)]
+
+    def worker(out):
+        out.extend(generator.new_id() for _ in range(2000))
+
+    threads = [threading.Thread(target=worker, args=(out,)) for out in results]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [value for out in results for value in out]
+    assert len(set(ids)) == len(ids)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork()")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_ulid_unique_across_fork():
+    """Test that a forked child does not replay the parent's random pool"""
+    generator = UlidGenerator(clock=FrozenClock(1_700_000_000_000_000_000))
+    generator.new_id()
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        os.write(write_end, generator.new_id().encode())
+        os._exit(0)
+    os.close(write_end)
+    child_id = os.read(read_end, 64).decode()
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    assert child_id != generator.new_id()
+
+
+def _in_child(function):
+    """Return what `function` returns (or raises) in a forked child, as a string"""
+    read_end, write_end = os.pipe()
+    pid = os.fork()
+    if pid == 0:
+        os.close(read_end)
+        try:
+            result = str(function())
+        except Exception as exc:  # pylint: disable=broad-except
+            result = type(exc).__name__
+        os.write(write_end, result.encode())
+        os._exit(0)
+    os.close(write_end)
+    result = os.read(read_end, 64).decode()
+    os.close(read_end)
+    os.waitpid(pid, 0)
+    return result
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork()")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_snowflake_fixed_worker_id_refused_after_fork():
+    """Test that a child does not reuse the fixed worker ID of its parent"""
+    generator = SnowflakeGenerator(worker_id=3)
+    assert _in_child(generator.new_id) == "RuntimeError"
+    assert (generator.new_id() >> 12) & 0x3FF == 3
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="requires fork()")
+@pytest.mark.filterwarnings("ignore:This process .* is multi-threaded:DeprecationWarning")
+def test_snowflake_worker_id_source_called_after_fork():
+    """Test that a worker ID callable is asked again in a forked child"""
+    worker_ids = iter([1, 2])
+    generator = SnowflakeGenerator(worker_id=lambda: next(worker_ids))
+    assert _in_child(lambda: (generator.new_id() >> 12) & 0x3FF) == "2"
+    assert generator.worker_id == 1
+
+
+def test_snowflake_requires_worker_id():
+    """Test that the worker ID is not guessed from the process ID"""
+    with pytest.raises(TypeError):
+        SnowflakeGenerator()  # pylint: disable=no-value-for-parameter
+
+
+def test_fake_secondary_uses_id_generator():
+    """Test that the secondary fake takes IDs from the given generator"""
+    message = {"body": "Hello", "recipient": "0048600123456", "sender_name": "Alice", "auth_key": "bob"}
+    response = fake_secondary_external_api(message, SnowflakeGenerator(worker_id=3))
+    assert isinstance(response["id"], int)
+
+
+def test_provider_id_generator():
+    """Test that the secondary provider passes its generator to the API"""
+    provider = sms_factory("secondary")
+    provider.ID_GENERATOR = UlidGenerator()
+    success, response = provider.set_recipient(600123456).set_content("Hello").send()
+    assert success is True
+    assert len(response["id"]) == 26
+
+
+def test_ulid_string_matches_integer():
+    """Test that the string form is the base32 encoding of the 128-bit value"""
+    generator = UlidGenerator(clock=FrozenClock(1_700_000_000_123_000_000))
+    ulid = generator.new_id()
+    value = int(ulid.translate(str.maketrans("0123456789ABCDEFGHJKMNPQRSTVWXYZ", "0123456789abcdefghijklmnopqrstuv")), 32)
+    assert value + 1 == generator.new_int()
+    assert value >> 80 == 1_700_000_000_123
@@ -0,0 +1,60 @@
+"""Tests for lazy loading of the provider modules"""
+import subprocess
+import sys
+
+import pytest
+
+from app.new import providers
+
+
+def _loaded_modules(statement):
+    """Run the statement in a fresh interpreter and return the loaded modules"""
+    code = statement + "; import sys; print(' '.join(sorted(sys.modules)))"
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    return set(proc.stdout.split())
+
+
+def test_importing_app_new_does_not_load_providers():
+    """Test that `import app.new` loads neither provider modules nor the fakes"""
+    modules = _loaded_modules("import app.new")
+    assert "app.new.providers.primary" not in modules
+    assert "app.new.providers.secondary" not in modules
+    assert "app.fake" not in modules
+    assert "copy" not in modules
+    assert "uuid" not in modules
+
+
+def test_factory_loads_only_requested_provider():
+    """Test that the factory imports only the module of the requested provider"""
+    modules = _loaded_modules("from app.new import sms_factory; sms_factory('primary')")
+    assert "app.new.providers.primary" in modules
+    assert "app.new.providers.secondary" not in modules
+    assert "uuid" not in modules
+
+
+def test_lazy_attribute_is_cached_on_package():
+    """Test that resolved providers are stored on the package"""
+    provider_class = providers.SecondarySmsApiProvider
+    assert providers.__dict__["SecondarySmsApiProvider"] is provider_class
+
+
+def test_unknown_attribute_raises_attribute_error():
+    """Test that unknown names still raise AttributeError"""
+    with pytest.raises(AttributeError):
+        providers.TertiarySmsApiProvider
+
+
+def test_providers_listed_in_dir():
+    """Test that lazily loaded providers are visible in dir()"""
+    assert "PrimarySmsApiProvider" in dir(providers)
+
+
+def test_importing_providers_does_not_load_country_table():
+    """Test the country routing table is read on the first check, not when the providers are imported"""
+    code = (
+        "import app.old; from app.new import sms_factory; from app.countries import country_index; "
+        "provider = sms_factory('primary'); print(country_index.cache_info().currsize); "
+        "provider.check_recipient(600123456, 'PL'); print(country_index.cache_info().currsize)"
+    )
+    proc = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert proc.stdout.split() == ["0", "1"]
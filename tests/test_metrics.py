@@ -0,0 +1,63 @@
+"""Tests for the metrics registry"""
+import threading
+
+from app.new.metrics import Metrics
+
+
+def test_counters_and_gauges():
+    """Test counters add up, gauges are replaced and labels tell series apart"""
+    metrics = Metrics()
+    metrics.increment("sends", provider="primary")
+    metrics.increment("sends", 2, provider="primary")
+    metrics.increment("sends", provider="secondary")
+    metrics.set("batch_size", 10, provider="primary")
+    metrics.set("batch_size", 20, provider="primary")
+    assert metrics.value("sends", provider="primary") == 3
+    assert metrics.value("sends", provider="secondary") == 1
+    assert metrics.value("batch_size", provider="primary") == 20
+    assert metrics.value("batch_size", provider="other") is None
+    assert metrics.snapshot() == {
+        "batch_size{provider=primary}": 20, "sends{provider=primary}": 3, "sends{provider=secondary}": 1,
+    }
+    metrics.clear()
+    assert metrics.snapshot() == {}
+
+
+def test_render():
+    """Test the Prometheus text format"""
+    metrics = Metrics()
+    assert metrics.render() == ""
+    metrics.increment("batch_decisions", decision="increase", provider="primary")
+    metrics.set("batch_window", 2, provider="primary")
+    metrics.set("uptime", 1.5)
+    assert metrics.render() == (
+        "# TYPE batch_decisions counter\n"
+        'batch_decisions{decision="increase",provider="primary"} 1\n'
+        "# TYPE batch_window gauge\n"
+        'batch_window{provider="primary"} 2\n'
+        "# TYPE uptime gauge\n"
+        "uptime 1.5\n"
+    )
+
+
+def test_render_escapes_label_values():
+    """Test backslashes, quotes and newlines in label values are escaped"""
+    metrics = Metrics()
+    metrics.increment("errors", reason='bad "quote"\\path\nline')
+    assert metrics.render() == '# TYPE errors counter\nerrors{reason="bad \\"quote\\"\\\\path\\nline"} 1\n'
+
+
+def test_concurrent_increments():
+    """Test counters do not lose updates across threads"""
+    metrics = Metrics()
+
+    def work():
+        for _ in range(10000):
+            metrics.increment("sends")
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert metrics.value("sends") == 40000
@@ -0,0 +1,38 @@
+"""Tests for the profiling harness"""
+import os
+import pstats
+
+import pytest
+
+from app.new import profile
+
+
+def test_profile_all_passes(tmp_path, capsys):
+    """Test every pass writes its output for a small campaign"""
+    out = str(tmp_path / "out")
+    profile.main(["--provider", "secondary", "--messages", "2000", "--interval", "0.2", "--out", out])
+    stats = pstats.Stats(os.path.join(out, "cpu.pstats"))
+    assert any(name == "_prepare_payload" for _, _, name in stats.stats)
+    with open(os.path.join(out, "stacks.collapsed"), encoding="utf-8") as file:
+        lines = file.read().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and "profile.py:campaign" in stack
+    with open(os.path.join(out, "memory.txt"), encoding="utf-8") as file:
+        assert file.readline().startswith("current ")
+    assert "stacks: " in capsys.readouterr().out
+
+
+def test_batch_campaign_keeps_results():
+    """Test the batch workload sends every message"""
+    results = []
+    profile.campaign("primary", 250, batch_size=100, results=results)
+    assert len(results) == 250 and all(result.success for result in results)
+
+
+def test_unknown_pass_is_rejected(tmp_path, capsys):
+    """Test the pass list is validated"""
+    with pytest.raises(SystemExit):
+        profile.main(["--passes", "cpu,gpu", "--out", str(tmp_path)])
+    assert "unknown passes: gpu" in capsys.readouterr().err
@@ -0,0 +1,86 @@
+"""Tests for validated recipient handles"""
+import pytest
+
+from app import errors
+from app.new import sms_factory
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.recipients import Recipient, validate_recipient
+
+
+def test_validate_recipient_normalizes_address():
+    """Test that the handle carries the normalized address"""
+    recipient = validate_recipient(600123456, "DE")
+    assert recipient.address == "0049600123456"
+    assert str(recipient) == "0049600123456"
+    assert recipient.is_valid_for(PrimarySmsApiProvider)
+    assert recipient.is_valid_for(SecondarySmsApiProvider)
+
+
+def test_validate_recipient_raises_provider_errors():
+    """Test that invalid recipients raise the usual exceptions"""
+    with pytest.raises(errors.InvalidCountryException):
+        validate_recipient(600123456, "XX")
+    with pytest.raises(errors.InvalidPhoneNumber):
+        validate_recipient("600-123-456")
+
+
+def test_validate_recipient_does_not_hide_bugs(monkeypatch):
+    """Test that a validator failing with a non-validation error is not taken as a rejection"""
+
+    def broken(self, phone_number, country_code):
+        raise TypeError("validator bug")
+
+    monkeypatch.setattr(SecondarySmsApiProvider, "_validate_set_recipient", broken)
+    with pytest.raises(TypeError):
+        validate_recipient(600123456)
+
+
+def test_validate_recipient_for_selected_providers():
+    """Test that only the requested providers are recorded"""
+    recipient = validate_recipient(600123456, provider_classes=[SecondarySmsApiProvider])
+    assert not recipient.is_valid_for(PrimarySmsApiProvider)
+    assert recipient.is_valid_for(sms_factory("secondary"))
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+def test_set_recipient_accepts_handle(api):
+    """Test that a handle can be used wherever a phone number is accepted"""
+    recipient = validate_recipient(600123456)
+    success, _ = sms_factory(api).set_recipient(recipient).set_content("Hello").send()
+    assert success is True
+
+
+def test_set_recipient_skips_validation(monkeypatch):
+    """Test that validated handles are not revalidated"""
+    recipient = validate_recipient(600123456)
+
+    def fail(*args):
+        raise AssertionError("revalidated")
+
+    monkeypatch.setattr(PrimarySmsApiProvider, "_validate_set_recipient", fail)
+    provider = sms_factory("primary").set_recipient(recipient)
+    assert provider.recipient == "0048600123456"
+    assert provider.prepare_message(recipient, "Hello") == ("Hello", "0048600123456")
+
+
+def test_set_recipient_validates_foreign_handle():
+    """Test that handles not validated for a provider are checked by it"""
+    recipient = Recipient("600-123-456", "PL", "0048600-123-456", [])
+    with pytest.raises(errors.InvalidPhoneNumber):
+        sms_factory("primary").set_recipient(recipient)
+    with pytest.raises(errors.InvalidPhoneNumber):
+        sms_factory("primary").send_many([(recipient, "Hello")])
+
+
+def test_send_many_accepts_handles():
+    """Test that the batch path accepts handles"""
+    recipient = validate_recipient(600123456, "DE")
+    results = sms_factory("primary").send_many([(recipient, "One"), (recipient, "Two")])
+    assert [response["recipient"] for _, response in results] == ["0049600123456"] * 2
+
+
+def test_recipient_equality():
+    """Test that handles compare by normalized address"""
+    assert validate_recipient(600123456) == validate_recipient("600123456", "PL")
+    assert len({validate_recipient(600123456), validate_recipient(600123456)}) == 1
+    assert validate_recipient(600123456) != validate_recipient(600123456, "DE")
@@ -0,0 +1,57 @@
+"""Tests for normalized send results"""
+from app.ids import SnowflakeGenerator
+from app.new import sms_factory
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.results import SendResult
+
+
+def test_primary_result():
+    """Test the primary API response is normalized"""
+    result = sms_factory("primary").set_recipient(600123456).set_content("Hello").send()
+    assert isinstance(result, SendResult)
+    assert result.success is True
+    assert result.provider == "primary"
+    assert result.recipient == "0048600123456"
+    assert result.message_id is None
+    assert result.status == "SENT"
+
+
+def test_secondary_result(monkeypatch):
+    """Test the secondary API response is normalized, with the recipient it lacks"""
+    monkeypatch.setattr(SecondarySmsApiProvider, "ID_GENERATOR", SnowflakeGenerator(worker_id=1))
+    result = sms_factory("secondary").set_recipient(600123456, "DE").set_content("Hello").send()
+    assert result.success is True
+    assert result.provider == "secondary"
+    assert result.recipient == "0049600123456"
+    assert isinstance(result.message_id, int)
+    assert result.status == "OK"
+
+
+def test_raw_response_is_not_copied():
+    """Test the result references the upstream dict"""
+    response = {"status": "403", "api": "1"}
+    result = PrimarySmsApiProvider()._process_response(response)
+    assert result.raw is response
+    assert result.success is False
+    assert result.recipient is None
+
+
+def test_tuple_compatibility():
+    """Test a result still behaves like the (success, response) pair"""
+    response = {"status": "OK", "id": "m1"}
+    result = SecondarySmsApiProvider()._process_response(response, "0048600123456")
+    success, resp = result
+    assert success is True and resp is response
+    assert result[0] is True and result[-1] is response
+    assert len(result) == 2
+    assert result == (True, response)
+    assert result == SendResult(True, "secondary", response, "0048600123456")
+    assert result != SendResult(True, "primary", response, "0048600123456")
+    assert "message_id='m1'" in repr(result)
+
+
+def test_batch_results():
+    """Test the batch path returns one normalized result per message"""
+    results = sms_factory("secondary").send_many([(600123456, "a"), (600123457, "b", "DE")])
+    assert [result.recipient for result in results] == ["0048600123456", "0049600123457"]
+    assert all(result.success and result.message_id is not None for result in results)
@@ -0,0 +1,82 @@
+"""Tests for the cross-provider rule matrix and routing"""
+import pytest
+
+from app import errors
+from app.new import sms_factory, sms_route
+from app.new.rules import rule_matrix
+
+PRIMARY, SECONDARY = 1, 2
+
+
+@pytest.mark.parametrize(
+    ("phone_number", "content", "country_code", "expected"),
+    [
+        (600123456, "Hello", "PL", PRIMARY | SECONDARY),
+        ("600123456", "A" * 70, "DE", PRIMARY | SECONDARY),
+        (600123456, "A" * 71, "PL", SECONDARY),
+        (600123456, "A" * 160, "PL", SECONDARY),
+        (600123456, "A" * 161, "PL", 0),
+        (600123456, "Hello", "XX", 0),
+        ("600-123-456", "Hello", "PL", 0),
+        (60012345, "Hello", "PL", 0),
+        ("20123456", "Hello", "DK", PRIMARY | SECONDARY),
+    ],
+)
+def test_eligible(phone_number, content, country_code, expected):
+    """Test the eligibility bitmask of messages"""
+    assert rule_matrix().eligible(phone_number, content, country_code) == expected
+
+
+@pytest.mark.parametrize("content", ["Hello", "A" * 70, "A" * 71, "A" * 160, "A" * 161])
+@pytest.mark.parametrize(("phone_number", "country_code"), [(600123456, "PL"), ("600x", "PL"), (600123456, "XX"), (6001234567, "PL"), (600123, "DE")])
+def test_matrix_agrees_with_validators(phone_number, content, country_code):
+    """Test that the matrix gives the same answer as the raising validators"""
+    matrix = rule_matrix()
+    mask = matrix.eligible(phone_number, content, country_code)
+    for api in matrix.names:
+        try:
+            sms_factory(api).set_recipient(phone_number, country_code).set_content(content)
+            valid = True
+        except errors.BaseError:
+            valid = False
+        assert bool(mask & matrix.bits[api]) is valid
+
+
+def test_names_for():
+    """Test translating a mask back to provider names"""
+    assert rule_matrix().names_for(PRIMARY | SECONDARY) == ("primary", "secondary")
+    assert rule_matrix().names_for(SECONDARY) == ("secondary",)
+    assert rule_matrix().names_for(0) == ()
+
+
+def test_matrix_is_memoized():
+    """Test that the matrix is compiled once per registry"""
+    assert rule_matrix() is rule_matrix()
+
+
+def test_route_prefers_registry_order():
+    """Test that routing picks the first eligible provider"""
+    provider = sms_route(600123456, "Hello")
+    assert provider.API_NAME == "primary"
+    assert provider.recipient == "0048600123456"
+    assert provider.send()[0] is True
+
+
+def test_route_falls_back_on_content_length():
+    """Test that long content is routed to the secondary provider"""
+    provider = sms_route(600123456, "A" * 100, "DE")
+    assert provider.API_NAME == "secondary"
+    assert provider.send()[0] is True
+
+
+def test_route_with_preference():
+    """Test routing with an explicit preference order"""
+    assert sms_route(600123456, "Hello", preference=["secondary", "primary"]).API_NAME == "secondary"
+    assert sms_route(600123456, "A" * 100, preference=["primary"]) is None
+
+
+def test_route_rejects_without_raising():
+    """Test that invalid messages return None instead of raising"""
+    assert sms_route("600-123-456", "Hello") is None
+    assert sms_route(600123456, "Hello", "XX") is None
+    assert sms_route(600123456, "A" * 161) is None
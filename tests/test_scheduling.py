@@ -0,0 +1,149 @@
+"""Tests for scheduled sending"""
+import threading
+from datetime import date
+
+import pytest
+
+from app.errors import InvalidPhoneNumber, TransportError
+from app.new.scheduling import Scheduler, at_local_time
+from app.new.suppression import SuppressionList
+from app.new.transports import FakeTransport
+
+
+@pytest.fixture
+def scheduler(clock):
+    scheduler = Scheduler(bucket_seconds=10, batch_size=7, clock=clock)
+    yield scheduler
+    scheduler.close()
+
+
+def test_dispatch_only_due_messages(scheduler, clock):
+    """Test messages are released once their time has come, oldest first"""
+    scheduler.schedule(1100, 600123456, "later")
+    scheduler.schedule(1005, 600123457, "soon", api="secondary")
+    assert scheduler.next_due() == 1005
+    assert scheduler.dispatch_due() == 0
+    released = []
+    clock.now = 1050
+    assert scheduler.dispatch_due(on_result=lambda message, result: released.append((message.content, result[0]))) == 1
+    assert released == [("soon", True)]
+    assert scheduler.next_due() == 1100
+    clock.now = 2000
+    assert scheduler.dispatch_due() == 1
+    assert len(scheduler) == 0
+    assert scheduler.next_due() is None
+
+
+def test_dispatch_in_batches(scheduler, clock):
+    """Test a large backlog is released through send_many in batch_size chunks"""
+    entries = [(1000 + index % 100, 600000000 + index, "hi", "DE" if index % 2 else "PL") for index in range(2000)]
+    assert scheduler.schedule_many(entries) == 2000
+    assert scheduler.schedule_many([(1500, 600123456, "hi")], api="secondary") == 1
+    clock.now = 1049
+    sent = scheduler.dispatch_due()
+    assert sent == 1000
+    assert len(scheduler) == 1001
+    clock.now = 1500
+    assert scheduler.dispatch_due() == 1001
+    assert len(scheduler) == 0
+
+
+def test_invalid_message_rejected_at_schedule_time(scheduler):
+    """Test validation happens before anything is stored"""
+    with pytest.raises(InvalidPhoneNumber):
+        scheduler.schedule_many([(1000, 600123456, "ok"), (1000, "12ab", "bad")])
+    assert len(scheduler) == 0
+
+
+def test_failed_batch_is_kept(clock):
+    """Test messages of a failed batch stay scheduled"""
+    calls = []
+
+    class Failing:
+        def prepare_message(self, *args):
+            return args
+
+        def send_batch(self, messages):
+            calls.append(len(messages))
+            raise RuntimeError("down")
+
+    scheduler = Scheduler(clock=clock, factory=lambda api: Failing())
+    scheduler.schedule(900, 600123456, "hi")
+    with pytest.raises(RuntimeError):
+        scheduler.dispatch_due()
+    assert calls == [1]
+    assert len(scheduler) == 1
+    scheduler.close()
+
+
+def test_messages_invalid_since_scheduling_are_rejected(scheduler, clock, monkeypatch):
+    """Test rows that no longer validate are reported and deleted without holding back their batch"""
+    scheduler.schedule_many([(1000, 600000000 + index, "hi") for index in range(5)])
+    scheduler.schedule(1000, 6000000051, "hi", "DE")
+    provider = scheduler._provider("primary", None)  # pylint: disable=protected-access
+    monkeypatch.setattr(type(provider), "SUPPRESSION", SuppressionList(["0048600000002"]))
+    monkeypatch.setattr(type(provider), "NUMBER_LENGTHS", {"DE": range(9, 10)})
+    results = []
+    assert scheduler.dispatch_due(on_result=lambda message, result: results.append(result)) == 6
+    assert [result.success for result in results] == [True, True, False, True, True, False]
+    assert results[5].status == "InvalidPhoneNumber"
+    assert scheduler.stats["rejected"] == 1
+    assert results[2].status == "RecipientSuppressed"
+    assert len(scheduler) == 0
+
+
+def test_run_survives_transport_errors(monkeypatch):
+    """Test the worker keeps running after a failed dispatch and retries it"""
+    scheduler = Scheduler()
+    provider = scheduler._provider("primary", None)  # pylint: disable=protected-access
+    monkeypatch.setattr(provider, "TRANSPORT", FakeTransport(fail=iter([True, False]).__next__))
+    done, stop, failures = threading.Event(), threading.Event(), []
+    worker = threading.Thread(
+        target=scheduler.run,
+        kwargs={"stop_event": stop, "on_result": lambda message, result: done.set(), "retry_delay": 0.01,
+                "on_error": failures.append},
+    )
+    worker.start()
+    scheduler.schedule(0, 600123456, "hi")
+    assert done.wait(5)
+    stop.set()
+    scheduler.wake()
+    worker.join(5)
+    assert [type(exc) for exc in failures] == [TransportError]
+    assert scheduler.stats["errors"] == 1
+    assert len(scheduler) == 0
+    scheduler.close()
+
+
+def test_persistent(tmp_path, clock):
+    """Test scheduled messages survive a restart"""
+    path = str(tmp_path / "schedule.db")
+    scheduler = Scheduler(path, clock=clock)
+    scheduler.schedule(1200, 600123456, "hi")
+    scheduler.close()
+    scheduler = Scheduler(path, clock=clock)
+    assert scheduler.next_due() == 1200
+    scheduler.close()
+
+
+def test_at_local_time():
+    """Test local times are converted with the time zone rules"""
+    assert at_local_time(date(2024, 1, 15), 9, timezone="Europe/Warsaw") == 1705305600
+    assert at_local_time(date(2024, 7, 15), 9, timezone="Europe/Warsaw") == 1721026800
+
+
+def test_run_wakes_for_new_messages():
+    """Test the worker sleeps until the due time and wakes up for new messages"""
+    scheduler = Scheduler()
+    done = threading.Event()
+    stop = threading.Event()
+    worker = threading.Thread(target=scheduler.run, args=(stop, lambda message, result: done.set()))
+    worker.start()
+    scheduler.schedule(0, 600123456, "hi")
+    assert done.wait(5)
+    stop.set()
+    scheduler.wake()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert len(scheduler) == 0
+    scheduler.close()
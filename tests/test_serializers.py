@@ -0,0 +1,68 @@
+"""Tests for the payload serializers"""
+import json
+
+import pytest
+
+from app import errors
+from app.new import sms_factory
+from app.new.content import content_info
+from app.new.serializers import serializer_for
+
+CONTENTS = [
+    "Hello",
+    "",
+    'Quote " and backslash \\ and slash /',
+    "Tabs\tnew\nlines\r and \x00 control \x1f chars",
+    "Zażółć gęślą jaźń",
+    "Emoji 😀 and CJK 漢字",
+    "  ",
+]
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+@pytest.mark.parametrize("content", CONTENTS)
+def test_encode_matches_json_dumps(api, content):
+    """Test that the serializer output equals json.dumps of the payload dict"""
+    provider = sms_factory(api).set_recipient(600123456, "DE")
+    provider.content = content
+    expected = json.dumps(provider._prepare_payload()).encode()
+    assert provider.serialize_payload() == expected
+
+
+@pytest.mark.parametrize("api", ["primary", "secondary"])
+def test_encode_many_matches_json_dumps(api):
+    """Test that batch encoding equals json.dumps of the list of payloads"""
+    provider = sms_factory(api).set_recipient(600123456)
+    payloads = []
+    for content in CONTENTS:
+        provider.content = content
+        payloads.append(provider._prepare_payload())
+    messages = [(payload.get("content", payload.get("body")), provider.recipient) for payload in payloads]
+    assert serializer_for(provider).encode_many(messages) == json.dumps(payloads).encode()
+
+
+def test_encode_many_empty():
+    """Test that an empty batch is an empty JSON array"""
+    assert serializer_for(sms_factory("primary")).encode_many([]) == b"[]"
+
+
+def test_serializer_is_cached_per_class():
+    """Test that the constant fragment is built once per provider class"""
+    assert serializer_for(sms_factory("primary")) is serializer_for(sms_factory("primary"))
+    assert serializer_for(sms_factory("primary")) is not serializer_for(sms_factory("secondary"))
+
+
+def test_encode_reuses_cached_content():
+    """Test that a single payload splices in the escaped content cached for its content"""
+    content = "Cached content for the single payload path"
+    fragment = content_info(content).fragment
+    hits = content_info.cache_info().hits
+    encoded = serializer_for(sms_factory("primary")).encode(content, "0048600123456")
+    assert content_info.cache_info().hits == hits + 1
+    assert fragment in encoded
+
+
+def test_serialize_payload_requires_content():
+    """Test that serializing validates the message like send() does"""
+    with pytest.raises(errors.ContentNotSet):
+        sms_factory("primary").set_recipient(600123456).serialize_payload()
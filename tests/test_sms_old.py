@@ -2,7 +2,9 @@
 import pytest
 
 from app import errors
-from app.old import sms_primary_api, sms_secondary_api
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.suppression import SuppressionList
+from app.old import sms_primary_api, sms_primary_api_many, sms_secondary_api, sms_secondary_api_many
 
 
 def test_sms_primary_api_success():
@@ -101,3 +103,43 @@ def test_sms_secondary_api_different_country():
     assert response["status"] == "OK"
     assert "id" in response
 
+
+def test_legacy_validation_order():
+    """Test the recipient is validated before the content, like the old implementation"""
+    with pytest.raises(errors.InvalidPhoneNumber):
+        sms_primary_api("A" * 71, "600-123-456")
+    with pytest.raises(errors.InvalidCountryException):
+        sms_secondary_api("A" * 161, "600-123-456", "XX")
+
+
+def test_returns_plain_tuples():
+    """Test the legacy functions return plain (bool, dict) tuples"""
+    result = sms_secondary_api("Hello", "600123456")
+    assert type(result) is tuple
+    assert type(result[1]) is dict
+
+
+def test_sms_primary_api_many():
+    """Test legacy bulk sending through the primary API"""
+    results = sms_primary_api_many([("Hello", "600123456"), ("Hi", "600123457", "DE")])
+    assert [success for success, _ in results] == [True, True]
+    assert [response["recipient"] for _, response in results] == ["0048600123456", "0049600123457"]
+
+
+def test_sms_secondary_api_many_validates_everything_first(monkeypatch):
+    """Test nothing is sent when one message of a legacy batch is invalid"""
+    calls = []
+    monkeypatch.setattr(SecondarySmsApiProvider, "_call_api_many", lambda self, payloads: calls.append(payloads))
+    with pytest.raises(errors.InvalidContentLength):
+        sms_secondary_api_many([("Hello", "600123456"), ("A" * 161, "600123457", "DE")])
+    assert calls == []
+
+
+def test_provider_hooks_apply(monkeypatch):
+    """Test the legacy functions go through the provider hooks"""
+    monkeypatch.setattr(PrimarySmsApiProvider, "SUPPRESSION", SuppressionList(["0048600123456"]))
+    with pytest.raises(errors.RecipientSuppressed):
+        sms_primary_api("Hello", "600123456")
+    results = sms_primary_api_many([("Hello", "600123457"), ("Hello", "600123456")])
+    assert [success for success, _ in results] == [True, False]
+    assert results[1][1] == {"status": "RecipientSuppressed"}
@@ -0,0 +1,173 @@
+"""Tests for recipient list snapshots"""
+import os
+import tracemalloc
+
+import pytest
+
+from app.new import sms_factory
+from app.new.results import SendResult
+from app.new.snapshots import Change, ListSnapshot, read_contacts, send_changes
+from app.new.suppression import SuppressionList
+
+
+@pytest.fixture(name="snapshot", params=[100_000, 3], ids=["in-memory", "external-sort"])
+def snapshot_fixture(request, tmp_path):
+    return ListSnapshot.for_campaign(str(tmp_path / "snapshots"), "daily", chunk_size=request.param)
+
+
+def _update(snapshot, rows):
+    with snapshot.update(rows) as changes:
+        return list(changes)
+
+
+def test_first_import_adds_everyone(snapshot):
+    """Test every contact of the first list is added, in key order"""
+    changes = _update(snapshot, [("600000003", "PL", "Hi"), ("600000001", "PL", "Hi"), ("600000002", "DE", "Hi")])
+    assert [(change.kind, change.recipient) for change in changes] == [
+        ("added", "0048600000001"), ("added", "0048600000003"), ("added", "0049600000002"),
+    ]
+    assert changes[0].row == ("600000001", "PL", "Hi")
+    assert len(snapshot) == 3
+    assert _update(snapshot, [("600000001", "PL", "Hi"), ("600000002", "DE", "Hi"), ("600000003", "PL", "Hi")]) == []
+    assert snapshot.stats["unchanged"] == 3
+
+
+def test_diff(snapshot):
+    """Test added, changed and removed contacts of a new list"""
+    _update(snapshot, [(str(600000000 + index), "PL", f"Hi {index}") for index in range(10)])
+    rows = [(str(600000000 + index), "PL", f"Hi {index}") for index in range(2, 12)]
+    rows[3] = ("600000005", "PL", "Hello 5")
+    changes = _update(snapshot, rows)
+    assert [(change.kind, change.key) for change in changes] == [
+        ("removed", 48600000000), ("removed", 48600000001), ("changed", 48600000005),
+        ("added", 48600000010), ("added", 48600000011),
+    ]
+    assert changes[0] == Change("removed", 48600000000, None)
+    assert changes[2].row == ("600000005", "PL", "Hello 5")
+    assert snapshot.stats == {
+        "added": 2, "changed": 1, "removed": 2, "unchanged": 7, "duplicates": 0, "invalid": 0,
+        "runs": snapshot.stats["runs"],
+    }
+    assert len(snapshot) == 10
+
+
+def test_duplicates_and_invalid_rows(snapshot):
+    """Test repeated recipients keep the first row and malformed ones are dropped"""
+    changes = _update(snapshot, [
+        ("600000001", "PL", "first"), ("600-000-002", "PL", "x"), ("600000001", "PL", "second"),
+        ("600000002", "XX", "x"), ("600000003", "PL", "y"), ("600000004",),
+    ])
+    assert [change.row for change in changes] == [("600000001", "PL", "first"), ("600000003", "PL", "y")]
+    assert snapshot.stats["duplicates"] == 1
+    assert snapshot.stats["invalid"] == 3
+
+
+def test_snapshot_kept_when_block_raises(snapshot):
+    """Test a failed update leaves the previous snapshot in place"""
+    _update(snapshot, [("600000001", "PL", "Hi")])
+    with pytest.raises(RuntimeError):
+        with snapshot.update([("600000002", "PL", "Hi")]) as changes:
+            next(changes)
+            raise RuntimeError("send failed")
+    assert [key for key, _ in snapshot.records()] == [48600000001]
+    assert not os.path.exists(snapshot.path + ".tmp")
+
+
+def test_unconsumed_changes_are_completed(snapshot):
+    """Test the snapshot is complete even when the block reads only some changes"""
+    with snapshot.update([(str(600000000 + index), "PL", "Hi") for index in range(10)]) as changes:
+        next(changes)
+    assert len(snapshot) == 10
+
+
+def test_read_contacts(tmp_path):
+    """Test reading a CSV contact file"""
+    path = tmp_path / "contacts.csv"
+    path.write_text('600000001,PL,"Hello, Ann"\n\n600000002,DE,Hi\n', encoding="utf-8")
+    assert list(read_contacts(str(path))) == [("600000001", "PL", "Hello, Ann"), ("600000002", "DE", "Hi")]
+
+
+def test_send_only_the_delta(snapshot, monkeypatch):
+    """Test only added and changed contacts are sent, rejected ones are skipped"""
+    provider = sms_factory("primary")
+    monkeypatch.setattr(type(provider), "SUPPRESSION", SuppressionList(["0048600000004"]))
+    with snapshot.update([(str(600000000 + index), "PL", "Hi") for index in range(5)]) as changes:
+        assert send_changes(provider, changes, batch_size=2) == {"sent": 4, "failed": 0, "rejected": 1}
+    sent = []
+    rows = [(str(600000000 + index), "PL", "Hi") for index in range(1, 7)]
+    rows[0] = ("600000001", "PL", "A" * 71)
+    with snapshot.update(rows) as changes:
+        stats = send_changes(provider, changes, on_result=lambda change, result: sent.append(result.recipient))
+    assert stats == {"sent": 2, "failed": 0, "rejected": 1}
+    assert sent == ["0048600000005", "0048600000006"]
+    assert snapshot.stats["removed"] == 1
+
+
+def test_failed_messages_sent_again(snapshot, monkeypatch):
+    """Test contacts whose message failed stay out of the snapshot and are sent by the next update"""
+    provider = sms_factory("primary")
+    send_batch = type(provider).send_batch
+
+    def failing(self, messages):
+        return [
+            SendResult(False, self.API_NAME, {"status": "FAILED"}, recipient) if recipient.endswith("2")
+            else result
+            for (_, recipient), result in zip(messages, send_batch(self, messages))
+        ]
+
+    monkeypatch.setattr(type(provider), "send_batch", failing)
+    rows = [(str(600000000 + index), "PL", "Hi") for index in range(4)]
+    with snapshot.update(rows) as changes:
+        assert send_changes(provider, changes, batch_size=3) == {"sent": 3, "failed": 1, "rejected": 0}
+    assert [key for key, _ in snapshot.records()] == [48600000000, 48600000001, 48600000003]
+    monkeypatch.setattr(type(provider), "send_batch", send_batch)
+    with snapshot.update(rows) as changes:
+        assert [(change.kind, change.key) for change in changes] == [("added", 48600000002)]
+    assert len(snapshot) == 4
+
+
+def test_memory_bounded_by_chunk(tmp_path):
+    """Test the diff of a large list keeps about one chunk in memory"""
+    snapshot = ListSnapshot(str(tmp_path / "big.snapshot"), chunk_size=1000)
+
+    def rows(count):
+        return ((str(600000000 + index * 7919 % count), "PL", f"Hello {index}") for index in range(count))
+
+    _update_counts(snapshot, rows(50_000))
+    tracemalloc.start()
+    try:
+        counts = _update_counts(snapshot, rows(50_000))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert counts == {"added": 0, "changed": 0, "removed": 0}
+    assert snapshot.stats["unchanged"] == 50_000
+    assert snapshot.stats["runs"] == 50
+    # the rows of the whole list take about 9 MB
+    assert peak < 2 * 1024 * 1024
+
+
+def test_retried_keys_bounded_by_chunk(tmp_path):
+    """Test contacts to send again are spilled like the list, so an outage of every send keeps memory bounded"""
+    snapshot = ListSnapshot(str(tmp_path / "big.snapshot"), chunk_size=1000)
+    rows = [(str(600000000 + index), "PL", "Hi") for index in range(50_000)]
+    tracemalloc.start()
+    try:
+        with snapshot.update(iter(rows)) as changes:
+            for change in changes:
+                if change.key % 10:
+                    changes.retry(change)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert peak < 2 * 1024 * 1024
+    assert [key for key, _ in snapshot.records()] == [48600000000 + index for index in range(0, 50_000, 10)]
+    assert _update_counts(snapshot, iter(rows)) == {"added": 45_000, "changed": 0, "removed": 0}
+
+
+def _update_counts(snapshot, rows):
+    counts = dict.fromkeys(("added", "changed", "removed"), 0)
+    with snapshot.update(rows) as changes:
+        for change in changes:
+            counts[change.kind] += 1
+    return counts
@@ -0,0 +1,101 @@
+"""Tests for the opt-out (suppression) list"""
+import random
+
+import pytest
+
+from app.errors import RecipientSuppressed
+from app.new import sms_factory
+from app.new.batching import MicroBatcher
+from app.new.providers import PrimarySmsApiProvider
+from app.new.suppression import BloomFilter, SuppressionList
+
+
+@pytest.mark.parametrize("bloom_bits", [0, 10])
+def test_membership(bloom_bits):
+    """Test lookups in every accepted number format"""
+    suppression = SuppressionList(["0048600123456", "+49600123456", 48600000001], bloom_bits=bloom_bits)
+    assert "0048600123456" in suppression
+    assert "0049600123456" in suppression
+    assert 48600000001 in suppression
+    assert "0048600123457" not in suppression
+    assert len(suppression) == 3
+
+
+@pytest.mark.parametrize("bloom_bits", [0, 10])
+def test_incremental_updates_match_a_set(bloom_bits):
+    """Test additions, removals and compaction against a plain set"""
+    rng = random.Random(7)
+    initial = {48600000000 + rng.randrange(10_000) for _ in range(2000)}
+    suppression = SuppressionList(initial, bloom_bits=bloom_bits, compact_threshold=50)
+    expected = set(initial)
+    for _ in range(3000):
+        key = 48600000000 + rng.randrange(10_000)
+        if rng.random() < 0.5:
+            suppression.add(key)
+            expected.add(key)
+        else:
+            suppression.discard(key)
+            expected.discard(key)
+    assert len(suppression) == len(expected)
+    assert all((48600000000 + index in suppression) == (48600000000 + index in expected) for index in range(10_000))
+    suppression.compact()
+    assert list(suppression._state[0]) == sorted(expected)
+
+
+def test_save_and_memory_map(tmp_path):
+    """Test a saved list is memory-mapped back with pending updates applied"""
+    path = str(tmp_path / "optout.bin")
+    suppression = SuppressionList(range(48600000000, 48600001000, 2))
+    suppression.add(48600000001)
+    suppression.save(path)
+    mapped = SuppressionList.open(path)
+    assert len(mapped) == 501
+    assert 48600000001 in mapped and 48600000002 in mapped and 48600000003 not in mapped
+    assert mapped.memory_usage() < 1000
+    mapped.discard(48600000002)
+    assert 48600000002 not in mapped
+    mapped.compact()
+    assert 48600000002 not in mapped and len(mapped) == 500
+    mapped.close()
+
+
+def test_bloom_filter_has_no_false_negatives():
+    """Test the Bloom filter keeps every key and rejects most others"""
+    bloom = BloomFilter(10_000)
+    bloom.update(range(10_000))
+    assert all(key in bloom for key in range(10_000))
+    false_positives = sum(key in bloom for key in range(10_000, 110_000))
+    assert false_positives < 3000
+
+
+def test_filter_bulk_messages():
+    """Test opted-out recipients are dropped from a bulk list"""
+    suppression = SuppressionList.from_lines(["0048600123456\n", "\n", "0049600123456\n"])
+    messages = [(600123456, "hi"), (600123456, "hi", "DE"), (600123457, "hi", "PL")]
+    assert list(suppression.filter(messages)) == [(600123457, "hi", "PL")]
+
+
+def test_filter_passes_malformed_messages_through():
+    """Test malformed recipients are left for validation instead of raising"""
+    suppression = SuppressionList(["0048600123456"])
+    messages = [("600-123-456", "hi"), (600123456, "hi", "XX"), (600123456, "hi")]
+    assert list(suppression.filter(messages)) == messages[:2]
+
+
+@pytest.fixture
+def suppressed(monkeypatch):
+    monkeypatch.setattr(PrimarySmsApiProvider, "SUPPRESSION", SuppressionList(["0048600123456"]))
+
+
+@pytest.mark.usefixtures("suppressed")
+def test_send_path_refuses_suppressed():
+    """Test single sends raise for opted-out recipients, the bulk paths skip them with a rejected result"""
+    provider = sms_factory("primary")
+    with pytest.raises(RecipientSuppressed):
+        provider.set_recipient(600123456).set_content("hi").send()
+    assert provider.set_recipient(600123457).send()[0]
+    results = provider.send_many([(600123457, "hi"), (600123456, "hi"), (600123458, "hi")])
+    assert [result.success for result in results] == [True, False, True]
+    assert results[1].status == "RecipientSuppressed" and results[1].recipient == "0048600123456"
+    with MicroBatcher(provider) as batcher:
+        assert batcher.submit(600123456, "hi").result(2)[0] is False
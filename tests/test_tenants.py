@@ -0,0 +1,100 @@
+"""Tests for multi-tenant provider configuration"""
+import pytest
+
+from app import errors
+from app.new import sms_factory
+from app.new.providers import PrimarySmsApiProvider, SecondarySmsApiProvider
+from app.new.recipients import validate_recipient
+from app.new.serializers import serializer_for
+from app.new.tenants import TENANTS, TenantConfig, TenantRegistry
+
+ACME = TenantConfig("acme", {"primary": "alice", "secondary": "bob"}, "Acme", ["PL"])
+GLOBEX = TenantConfig("globex", {"primary": "globex-key"}, "Globex")
+
+
+@pytest.fixture
+def registry():
+    return TenantRegistry([ACME, GLOBEX])
+
+
+def test_provider_class_binds_tenant(registry):
+    """Test that tenant providers carry the tenant's key, sender and countries"""
+    provider_class = registry.provider_class("acme", "primary")
+    assert issubclass(provider_class, PrimarySmsApiProvider)
+    assert provider_class.SENDER_NAME == "Acme"
+    assert provider_class.API_KEY == "alice"
+    assert dict(provider_class.COUNTRY_CODES) == {"PL": "0048"}
+    assert provider_class.TENANT is ACME
+
+
+def test_provider_class_is_cached(registry):
+    """Test that the per-tenant class is resolved once"""
+    assert registry.provider_class("acme", "secondary") is registry.provider_class("acme", "secondary")
+
+
+def test_tenant_payload(registry):
+    """Test that the payload uses the tenant's configuration"""
+    provider = registry.provider_class("globex", "primary")()
+    provider.set_recipient(600123456, "DE").set_content("Hello")
+    assert provider._prepare_payload() == {
+        "content": "Hello", "phone": "0049600123456", "sender": "Globex", "api_key": "globex-key",
+    }
+    assert b'"sender": "Globex"' in serializer_for(provider).encode("Hello", "0049600123456")
+    assert provider.send()[0] is False  # the fake only knows the default key
+
+
+def test_missing_api_key_falls_back_to_default(registry):
+    """Test that APIs without a tenant key use the default key"""
+    assert registry.provider_class("globex", "secondary").API_KEY == SecondarySmsApiProvider.API_KEY
+
+
+def test_tenant_countries_are_enforced(registry):
+    """Test that countries outside the tenant's list are rejected"""
+    provider = registry.provider_class("acme", "primary")()
+    with pytest.raises(errors.InvalidCountryException):
+        provider.set_recipient(600123456, "DE")
+    with pytest.raises(errors.InvalidCountryException):
+        provider.set_recipient(validate_recipient(600123456, "DE"))
+
+
+def test_unknown_tenant_and_api(registry):
+    """Test errors for unknown tenants and APIs"""
+    with pytest.raises(errors.UnknownTenant):
+        registry.provider_class("initech", "primary")
+    with pytest.raises(NotImplementedError):
+        registry.provider_class("acme", "tertiary")
+
+
+def test_hot_reload(registry):
+    """Test that reloads apply to new providers only and keep unchanged tenants cached"""
+    old_acme = registry.provider_class("acme", "primary")
+    old_globex = registry.provider_class("globex", "primary")
+    in_flight = old_acme().set_recipient(600123456).set_content("Hello")
+    registry.load([ACME, GLOBEX._replace(sender_name="Globex Corp")])
+    assert registry.provider_class("acme", "primary") is old_acme
+    assert registry.provider_class("globex", "primary") is not old_globex
+    assert registry.provider_class("globex", "primary").SENDER_NAME == "Globex Corp"
+    assert in_flight.send()[0] is True
+    registry.load([GLOBEX])
+    with pytest.raises(errors.UnknownTenant):
+        registry.provider_class("acme", "primary")
+
+
+def test_config_from_dict():
+    """Test building configs from plain dicts"""
+    config = TenantConfig.from_dict({"tenant_id": "t1", "api_keys": {"primary": "k"}, "allowed_countries": ["DE"]})
+    assert config.sender_name == "Alice"
+    assert config.allowed_countries == frozenset({"DE"})
+    assert hash(config) == hash(TenantConfig("t1", {"primary": "k"}, "Alice", ["DE"]))
+
+
+def test_sms_factory_with_tenant():
+    """Test that the factory builds tenant providers from the global registry"""
+    TENANTS.load([ACME])
+    try:
+        provider = sms_factory("primary", tenant="acme")
+        assert provider.SENDER_NAME == "Acme"
+        assert provider.set_recipient(600123456).set_content("Hello").send()[0] is True
+        assert type(sms_factory("primary")) is PrimarySmsApiProvider
+    finally:
+        TENANTS.load([])
@@ -0,0 +1,112 @@
+"""Tests for delivery receipt tracking"""
+import pytest
+
+from app.ids import SnowflakeGenerator
+from app.new import sms_factory
+from app.new.tracking import DeliveryStore
+
+
+@pytest.fixture
+def store(clock):
+    store = DeliveryStore(max_memory=10, spill_fraction=0.5, clock=clock)
+    yield store
+    store.close()
+
+
+def test_record_and_lookup(store):
+    """Test lookups by message ID and by recipient"""
+    store.record_sent("secondary", "m1", "0048600123456", "OK")
+    store.record_sent("secondary", "m2", "0048600123456", "OK")
+    store.record_sent("primary", None, "0049600123456", "SENT")
+    assert store.status("m1") == "OK"
+    assert store.get("missing") is None
+    assert [record.message_id for record in store.for_recipient("0048600123456")] == ["m1", "m2"]
+    assert store.for_recipient("0049600123456")[0].provider == "primary"
+    assert len(store) == 3
+
+
+def test_rerecord_moves_recipient(store, clock):
+    """Test that recording a message ID again drops it from its old recipient, also after a spill"""
+    store.record_sent("secondary", "m1", "0048600123456", "OK")
+    store.record_sent("secondary", "m1", "0048600123457", "OK")
+    assert store.for_recipient("0048600123456") == []
+    assert [record.message_id for record in store.for_recipient("0048600123457")] == ["m1"]
+    for index in range(20):
+        clock.now += 1
+        store.record_sent("secondary", f"other{index}", "0048600123458", "OK")
+    assert [record.message_id for record in store.for_recipient("0048600123457")] == ["m1"]
+
+
+def test_rerecord_replaces_spilled_record(clock):
+    """Test that recording a spilled message ID again replaces its SQLite row"""
+    store = DeliveryStore(max_memory=2, spill_fraction=0.5, clock=clock)
+    try:
+        store.record_sent("secondary", "m1", "0048600123456", "OK")
+        store.record_sent("secondary", "m2", "0048600123457", "OK")
+        store.record_sent("secondary", "m3", "0048600123457", "OK")
+        assert store.in_memory == 2
+        store.record_sent("secondary", "m1", "0048600123458", "OK")
+        assert len(store) == 3
+        assert store.for_recipient("0048600123456") == []
+        assert [record.message_id for record in store.for_recipient("0048600123458")] == ["m1"]
+        assert store.get("m1").recipient == "0048600123458"
+    finally:
+        store.close()
+
+
+def test_ingest_receipts(store):
+    """Test bulk ingestion of delivery receipts"""
+    store.record_sent("secondary", "m1", "0048600123456", "OK")
+    store.record_sent("secondary", "m2", "0048600123457", "OK")
+    assert store.ingest_receipts([("m1", "DELIVERED"), ("m2", "FAILED"), ("unknown", "DELIVERED")]) == 2
+    assert store.status("m1") == "DELIVERED"
+    assert store.status("m2") == "FAILED"
+
+
+def test_spill_to_sqlite(store, clock):
+    """Test that old records spill to SQLite and stay queryable"""
+    for index in range(25):
+        clock.now += 1
+        store.record_sent("secondary", f"m{index}", f"00486001234{index % 3:02d}", "OK")
+    assert store.in_memory <= 10
+    assert len(store) == 25
+    assert store.status("m0") == "OK"
+    assert store.ingest_receipts([("m0", "DELIVERED"), ("m24", "DELIVERED")]) == 2
+    assert store.status("m0") == "DELIVERED"
+    assert store.status("m24") == "DELIVERED"
+    records = store.for_recipient("0048600123400")
+    assert [record.message_id for record in records] == [f"m{index}" for index in range(0, 25, 3)]
+
+
+def test_evict_idle(store, clock):
+    """Test eviction of records idle for longer than the given age"""
+    for index in range(15):
+        store.record_sent("secondary", f"m{index}", "0048600123456", "OK")
+    clock.now += 100
+    store.ingest_receipts([("m3", "DELIVERED"), ("m14", "DELIVERED")])
+    clock.now += 10
+    assert store.evict_idle(50) == 13
+    assert len(store) == 2
+    assert store.status("m0") is None
+    assert [record.message_id for record in store.for_recipient("0048600123456")] == ["m3", "m14"]
+
+
+def test_provider_records_sends():
+    """Test that providers record processed responses in their tracker"""
+    store = DeliveryStore()
+    provider = sms_factory("secondary")
+    provider.TRACKER = store
+    provider.ID_GENERATOR = SnowflakeGenerator(worker_id=1)
+    _, response = provider.set_recipient(600123456).set_content("Hello").send()
+    assert store.status(response["id"]) == "OK"
+    assert store.get(response["id"]).recipient == "0048600123456"
+
+
+def test_provider_records_batches():
+    """Test that the batch path records the recipient of each message"""
+    store = DeliveryStore()
+    provider = sms_factory("primary")
+    provider.TRACKER = store
+    provider.send_many([(600123456, "One"), (600123457, "Two", "DE")])
+    assert store.for_recipient("0049600123457")[0].status == "SENT"
+    assert len(store) == 2
@@ -0,0 +1,71 @@
+"""Tests for the non-raising validation API"""
+import pytest
+
+from app import errors
+from app.errors import ValidationCode
+from app.new import sms_factory
+from app.new.recipients import validate_recipient
+from app.old import check_sms_primary_api, check_sms_secondary_api
+
+
+def test_validation_code_exceptions():
+    """Test that every failure code maps to the exception of the raising API"""
+    assert not ValidationCode.OK
+    assert ValidationCode.INVALID_COUNTRY.exception is errors.InvalidCountryException
+    assert ValidationCode.INVALID_PHONE_NUMBER.exception is errors.InvalidPhoneNumber
+    assert ValidationCode.INVALID_CONTENT_LENGTH.exception is errors.InvalidContentLength
+    assert ValidationCode.CONTENT_NOT_SET.exception is errors.ContentNotSet
+    assert ValidationCode.RECIPIENT_NOT_SET.exception is errors.RecipientNotSet
+
+
+def test_raise_for():
+    """Test that raise_for raises only for failures"""
+    ValidationCode.OK.raise_for()
+    with pytest.raises(errors.InvalidPhoneNumber, match="Invalid phone number"):
+        ValidationCode.INVALID_PHONE_NUMBER.raise_for()
+
+
+@pytest.mark.parametrize(
+    ("api", "phone_number", "content", "country_code", "expected"),
+    [
+        ("primary", 600123456, "Hello", "PL", ValidationCode.OK),
+        ("primary", 600123456, "Hello", "XX", ValidationCode.INVALID_COUNTRY),
+        ("primary", "600-123-456", "Hello", "PL", ValidationCode.INVALID_PHONE_NUMBER),
+        ("primary", 600123456, "A" * 71, "PL", ValidationCode.INVALID_CONTENT_LENGTH),
+        ("primary", "600x", "A" * 71, "XX", ValidationCode.INVALID_COUNTRY),
+        ("secondary", 600123456, "A" * 160, "DE", ValidationCode.OK),
+        ("secondary", 600123456, "A" * 161, "DE", ValidationCode.INVALID_CONTENT_LENGTH),
+    ],
+)
+def test_check_message(api, phone_number, content, country_code, expected):
+    """Test the result codes of whole messages"""
+    assert sms_factory(api).check_message(phone_number, content, country_code) is expected
+
+
+def test_check_message_with_recipient_handle():
+    """Test that validated handles only have their content checked"""
+    provider = sms_factory("primary")
+    recipient = validate_recipient(600123456)
+    assert provider.check_message(recipient, "Hello") is ValidationCode.OK
+    assert provider.check_message(recipient, "A" * 71) is ValidationCode.INVALID_CONTENT_LENGTH
+
+
+def test_check_before_sending():
+    """Test the non-raising check of a message before sending"""
+    provider = sms_factory("secondary")
+    assert provider.check_before_sending() is ValidationCode.CONTENT_NOT_SET
+    provider.set_content("Hello")
+    assert provider.check_before_sending() is ValidationCode.RECIPIENT_NOT_SET
+    provider.set_recipient(600123456)
+    assert provider.check_before_sending() is ValidationCode.OK
+
+
+@pytest.mark.parametrize(
+    ("check", "limit"), [(check_sms_primary_api, 70), (check_sms_secondary_api, 160)]
+)
+def test_old_api_checks(check, limit):
+    """Test the non-raising shims of the old API"""
+    assert check("A" * limit, "600123456") is ValidationCode.OK
+    assert check("A" * (limit + 1), "600123456") is ValidationCode.INVALID_CONTENT_LENGTH
+    assert check("Hello", "600123456", "XX") is ValidationCode.INVALID_COUNTRY
+    assert check("Hello", "abc123", "DE") is ValidationCode.INVALID_PHONE_NUMBER